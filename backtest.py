@@ -0,0 +1,429 @@
+"""Replay recorded TradingView alerts through the bot against historical OHLC fills.
+
+Every alert goes through the real /webhook handler (synchronous mode) and the
+real order functions. The exchange is mock_delta.MockDeltaExchange (the bot's
+PaperExchange matching engine) reached in-process through InProcessAdapter, so nothing sleeps and nothing touches the
+network. Between alerts, resting stop orders are filled from the OHLC bars with
+NumPy: the first bar whose high (buy) or low (sell) reaches the trigger fills
+at the trigger, or at the bar's open if it gapped through.
+
+    python backtest.py --alerts alerts.jsonl --ohlc BTCUSD=btcusd_1m.csv
+    python backtest.py --alerts trading_bot.log --ohlc BTCUSD=btcusd_1m.csv --fee-bps 5 --json
+    python backtest.py --signal-feed candles.jsonl --ohlc BTCUSD=btcusd_1m.csv
+
+Alert files are JSON lines, either {"timestamp": ..., "payload": {...}} or the
+payload itself with a "timestamp" field, or a trading_bot.log from which the
+webhook payloads are recovered. --signal-feed instead takes a candle feed
+recorded with SIGNAL_RECORD_PATH and trades what main.SignalEngine signals on
+it. OHLC files are CSV with timestamp, open, high,
+low and close columns, keyed by bar open time; timestamps may be epoch
+seconds, epoch milliseconds or ISO 8601 (naive means UTC).
+
+Market orders fill at the open of the first bar starting at or after the
+alert, as does a stop placed already through that open. Protective stops are placed at their initial level; trailing stops are
+not ratcheted bar by bar.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main  # noqa: E402
+import mock_delta  # noqa: E402
+
+BACKTEST_BASE_URL = 'http://backtest.invalid'
+LOG_LINE = re.compile(r'^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d{3}) - .*?\[(WH_\d+)\] (.*)$')
+ALERT_SUMMARY = re.compile(r'Alert: (\w+)(?: (\S+)@(\S+))?, Price: ([-\d.]+), SL: ([-\d.]+)'
+                           r'(?:, Trail: ([-\d.]+))?, Size: ([-\d.]+)')
+
+
+def parse_timestamp(value):
+    text = str(value).strip()
+    if re.fullmatch(r'\d+(\.\d+)?', text):
+        seconds = float(text)
+        return seconds / 1000.0 if seconds > 1e11 else seconds
+    parsed = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def load_alerts(path, log_utc_offset=0.0):
+    """[(timestamp, payload)] sorted by time, from a JSON-lines file or a bot log"""
+    with open(path, encoding='utf-8', errors='replace') as handle:
+        head = handle.read(1).strip()
+    if head == '{':
+        alerts = load_alerts_jsonl(path)
+    else:
+        alerts = load_alerts_from_log(path, log_utc_offset)
+    alerts.sort(key=lambda alert: alert[0])
+    return alerts
+
+
+def load_alerts_jsonl(path):
+    alerts = []
+    with open(path, encoding='utf-8') as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            timestamp = record.get('timestamp', record.get('time'))
+            payload = record.get('payload') or {key: value for key, value in record.items()
+                                                if key not in ('timestamp', 'time')}
+            alerts.append((parse_timestamp(timestamp), payload))
+    return alerts
+
+
+def load_alerts_from_log(path, utc_offset=0.0):
+    """Recover webhook payloads from trading_bot.log.
+
+    Full payloads come from the "Data:" lines (single-line or the older
+    indented multi-line dumps); webhooks without one fall back to the
+    "Alert:" summary line. Deliveries the bot answered as duplicates are
+    skipped, as the original run did not execute them either.
+    """
+    payloads, summaries, duplicates, order = {}, {}, set(), []
+    pending = None
+
+    with open(path, encoding='utf-8', errors='replace') as handle:
+        for line in handle:
+            if pending is not None:
+                pending[2] += line
+                try:
+                    payloads[pending[0]] = (pending[1], json.loads(pending[2]))
+                    pending = None
+                except ValueError:
+                    if len(pending[2]) > 100000:
+                        pending = None
+                continue
+
+            match = LOG_LINE.match(line.rstrip('\n'))
+            if not match:
+                continue
+            asctime, webhook_id, message = match.groups()
+            timestamp = datetime.strptime(asctime, '%Y-%m-%d %H:%M:%S,%f').replace(
+                tzinfo=timezone.utc).timestamp() - utc_offset * 3600
+
+            if message.startswith('Data: '):
+                order.append(webhook_id)
+                try:
+                    payloads[webhook_id] = (timestamp, json.loads(message[6:]))
+                except ValueError:
+                    pending = [webhook_id, timestamp, message[6:] + '\n']
+            elif message.startswith('Alert: '):
+                summary = ALERT_SUMMARY.match(message)
+                if summary:
+                    alert_type, symbol, account, stop_price, stop_loss, trail_amount, size = summary.groups()
+                    payload = {"alert_type": alert_type, "stop_price": stop_price, "stop_loss": stop_loss,
+                               "lot_size": size}
+                    if symbol:
+                        payload.update(symbol=symbol, account=account)
+                    if trail_amount:
+                        payload["trail_amount"] = trail_amount
+                    order.append(webhook_id)
+                    summaries[webhook_id] = (timestamp, payload)
+            elif message.startswith('Duplicate alert'):
+                duplicates.add(webhook_id)
+
+    alerts = []
+    for webhook_id in dict.fromkeys(order):
+        alert = payloads.get(webhook_id) or summaries.get(webhook_id)
+        if alert and webhook_id not in duplicates:
+            alerts.append(alert)
+    return alerts
+
+
+class OhlcSeries:
+    """Bars for one product as NumPy arrays, keyed by bar open time"""
+
+    def __init__(self, times, opens, highs, lows, closes):
+        self.times = times
+        self.opens = opens
+        self.highs = highs
+        self.lows = lows
+        self.closes = closes
+
+    @classmethod
+    def from_csv(cls, path):
+        with open(path, newline='', encoding='utf-8') as handle:
+            reader = csv.DictReader(handle)
+            columns = {name.strip().lower(): name for name in reader.fieldnames}
+            time_column = next((columns[name] for name in ('timestamp', 'time', 'open_time', 'datetime', 'date')
+                                if name in columns), None)
+            if time_column is None:
+                raise SystemExit(f"{path}: no timestamp column")
+            rows = [(parse_timestamp(row[time_column]), float(row[columns['open']]), float(row[columns['high']]),
+                     float(row[columns['low']]), float(row[columns['close']])) for row in reader]
+        bars = np.array(rows, dtype=float).reshape(-1, 5)
+        bars = bars[np.argsort(bars[:, 0], kind='stable')]
+        return cls(*(np.ascontiguousarray(bars[:, column]) for column in range(5)))
+
+    def __len__(self):
+        return len(self.times)
+
+    def first_bar_at(self, timestamp):
+        """Index of the first bar opening at or after ``timestamp``"""
+        return int(np.searchsorted(self.times, timestamp, side='left'))
+
+    def first_cross(self, side, trigger, start, end):
+        """(bar, fill price) of the first bar in [start, end) that trades through a stop trigger, or None"""
+        if start >= end:
+            return None
+        if side == 'buy':
+            hits = self.highs[start:end] >= trigger
+        else:
+            hits = self.lows[start:end] <= trigger
+        index = int(hits.argmax())
+        if not hits[index]:
+            return None
+        bar = start + index
+        open_price = self.opens[bar]
+        return bar, (max(open_price, trigger) if side == 'buy' else min(open_price, trigger))
+
+
+class BacktestBook(mock_delta.MockOrderBook):
+    """Mock order book that stamps fills with simulated time and keeps every one of them"""
+
+    def __init__(self, products):
+        super().__init__(products)
+        self.now = 0.0
+        self.fill_log = []
+
+    def _fill(self, order):
+        super()._fill(order)
+        if order["state"] == "closed":
+            self.fill_log.append((self.now, order["product_id"], order["side"], order["size"],
+                                  float(order["average_fill_price"])))
+
+    def fill_stop(self, order_id, price):
+        """Trigger a resting stop at ``price``"""
+        with self.lock:
+            order = self.orders.pop(order_id)
+            self.prices[order["product_id"]] = price
+            self._fill(order)
+
+
+class Backtest:
+    def __init__(self, series):
+        self.series = series  # product_id -> OhlcSeries
+        self.book = BacktestBook(backtest_products())
+        self.exchange = mock_delta.MockDeltaExchange(book=self.book)
+        self.order_start = {}  # order_id -> first bar it may fill on
+        self.statuses = Counter()
+        self.alerts = 0
+
+    def setup_bot(self):
+        """Point the bot at the in-process exchange and switch off everything that waits or talks to the outside"""
+        main.BASE_URL = BACKTEST_BASE_URL
+        main.get_http_session().mount(BACKTEST_BASE_URL, mock_delta.InProcessAdapter(self.exchange))
+        main.WEBHOOK_ASYNC = False
+        main.NOTIFY_TELEGRAM = False
+        main.order_journal = None
+        main.shared_state = None
+        main.dedup_cache = main.DedupCache(db_path=None)
+        for account in main.rate_limiters:
+            main.rate_limiters[account] = main.TokenBucket(capacity=10 ** 12, window=1)
+        main.product_cache.refresh()
+
+    def run(self, alerts):
+        client = main.app.test_client()
+        cursors = {product_id: 0 for product_id in self.series}
+
+        for index, (timestamp, payload) in enumerate(alerts):
+            for product_id, bars in self.series.items():
+                end = bars.first_bar_at(timestamp)
+                self.fill_stops(product_id, bars, cursors[product_id], end)
+                cursors[product_id] = end
+                if end < len(bars):
+                    self.book.prices[product_id] = float(bars.opens[end])
+
+            self.book.now = timestamp
+            # Each recorded delivery was a distinct alert, don't let the wall-clock dedup window merge them
+            headers = {} if payload.get('alert_id') else {'X-Alert-Id': f'replay-{index}'}
+            response = client.post('/webhook', json=payload, headers=headers)
+            self.statuses[response.status_code] += 1
+            self.alerts += 1
+            self.protect()
+            self.register_new_orders({product_id: cursors[product_id] for product_id in self.series})
+
+        for product_id, bars in self.series.items():
+            self.fill_stops(product_id, bars, cursors[product_id], len(bars))
+
+    def fill_stops(self, product_id, bars, start, end):
+        """Fill the product's resting stops over bars [start, end), earliest trigger first"""
+        while True:
+            earliest = None
+            for order in list(self.book.orders.values()):
+                if order["product_id"] != product_id or order["state"] != "pending":
+                    continue
+                first_bar = max(start, self.order_start.get(order["id"], start))
+                hit = bars.first_cross(order["side"], float(order["stop_price"]), first_bar, end)
+                if hit and (earliest is None or hit[0] < earliest[0]):
+                    earliest = (hit[0], hit[1], order["id"])
+            if earliest is None:
+                return
+
+            bar, price, order_id = earliest
+            self.book.now = float(bars.times[bar])
+            self.book.fill_stop(order_id, float(price))
+            # The bot reacts to the fill; whatever it places can only fill from the next bar on
+            self.protect()
+            self.register_new_orders({product_id: bar + 1})
+
+    def protect(self):
+        """Run the stop manager's convergence pass synchronously, as its worker would after an event"""
+        for state in list(main.instrument_states.values()):
+            if state.protection is not None or main._protective_stop(state)[0] is not None:
+                main.stop_manager._converge((state.account, state.symbol))
+        main.stop_manager.dirty.clear()
+
+    def register_new_orders(self, first_bars):
+        for order_id, order in list(self.book.orders.items()):
+            if order_id not in self.order_start:
+                self.order_start[order_id] = first_bars.get(order["product_id"], 0)
+
+
+def backtest_products():
+    """Mock products for every configured instrument (unknown ones get BTCUSD's tick and contract value)"""
+    products = {product["id"]: dict(product) for product in mock_delta.DEFAULT_PRODUCTS}
+    for symbol, instrument in main.INSTRUMENTS.items():
+        if instrument['product_id'] not in products:
+            products[instrument['product_id']] = {"id": instrument['product_id'], "symbol": symbol,
+                                                  "tick_size": "0.5", "contract_value": "0.001"}
+    return list(products.values())
+
+
+def summarize(fills, contract_values, fee_bps, last_prices):
+    """Realized/unrealized PnL, round-trip trades and drawdown from the fill list"""
+    positions = {}
+    realized = fees = peak = max_drawdown = 0.0
+    trades = []
+
+    for _, product_id, side, contracts, price in fills:
+        contract_value = contract_values[product_id]
+        signed = contracts if side == 'buy' else -contracts
+        fees += contracts * contract_value * price * fee_bps / 10000.0
+        size, average, trade_pnl = positions.get(product_id, (0, 0.0, 0.0))
+
+        if size == 0 or (size > 0) == (signed > 0):
+            average = (average * abs(size) + price * abs(signed)) / (abs(size) + abs(signed))
+            size += signed
+        else:
+            closing = min(abs(size), abs(signed))
+            pnl = closing * contract_value * (price - average) * (1 if size > 0 else -1)
+            realized += pnl
+            trade_pnl += pnl
+            flipped = abs(signed) > abs(size)
+            size += signed
+            if size == 0 or flipped:
+                trades.append(trade_pnl)
+                trade_pnl = 0.0
+                average = price if flipped else 0.0
+        positions[product_id] = (size, average, trade_pnl)
+
+        equity = realized - fees
+        peak = max(peak, equity)
+        max_drawdown = max(max_drawdown, peak - equity)
+
+    unrealized = sum(size * contract_values[product_id] * (last_prices[product_id] - average)
+                     for product_id, (size, average, _) in positions.items() if size and product_id in last_prices)
+    trades = np.array(trades, dtype=float)
+    return {
+        "fills": len(fills),
+        "trades": int(trades.size),
+        "win_rate": float((trades > 0).mean()) if trades.size else None,
+        "average_trade": float(trades.mean()) if trades.size else None,
+        "realized_pnl": realized,
+        "fees": fees,
+        "net_pnl": realized - fees,
+        "unrealized_pnl": unrealized,
+        "max_drawdown": max_drawdown,
+        "open_positions": {product_id: size for product_id, (size, _, _) in positions.items() if size},
+    }
+
+
+def run(args):
+    series, symbols = {}, []
+    for spec in args.ohlc:
+        symbol, _, path = spec.rpartition('=')
+        symbol = symbol or main.SYMBOL
+        if symbol not in main.INSTRUMENTS:
+            raise SystemExit(f"Unknown symbol for --ohlc: {symbol}")
+        series[main.INSTRUMENTS[symbol]['product_id']] = OhlcSeries.from_csv(path)
+        symbols.append(symbol)
+    if args.signal_feed:
+        alerts = main.replay_feed(args.signal_feed, symbols=symbols)
+    else:
+        alerts = load_alerts(args.alerts, args.log_utc_offset)
+
+    backtest = Backtest(series)
+    backtest.setup_bot()
+    started = time.perf_counter()
+    backtest.run(alerts)
+    elapsed = time.perf_counter() - started
+
+    exchange = backtest.exchange
+    contract_values = {product_id: float(product["contract_value"]) for product_id, product in exchange.products.items()}
+    last_prices = {product_id: float(bars.closes[-1]) for product_id, bars in series.items() if len(bars)}
+    report = {
+        "alerts": backtest.alerts,
+        "bars": sum(len(bars) for bars in series.values()),
+        "http_status": dict(backtest.statuses),
+        "exchange_calls": exchange.call_count(),
+        "exchange_calls_per_alert": exchange.call_count() / max(1, backtest.alerts),
+        "elapsed_s": elapsed,
+        "alerts_per_s": backtest.alerts / elapsed if elapsed else None,
+    }
+    report.update(summarize(backtest.book.fill_log, contract_values, args.fee_bps, last_prices))
+    return report
+
+
+def print_report(report):
+    print(f"alerts: {report['alerts']}  bars: {report['bars']}  http status: {report['http_status']}")
+    print(f"replayed in {report['elapsed_s']:.2f}s ({report['alerts_per_s'] or 0:.0f} alerts/s), "
+          f"{report['exchange_calls_per_alert']:.2f} exchange calls per alert")
+    win_rate = '-' if report['win_rate'] is None else f"{report['win_rate']:.1%}"
+    print(f"fills: {report['fills']}  round trips: {report['trades']}  win rate: {win_rate}")
+    print(f"realized PnL: {report['realized_pnl']:.2f}  fees: {report['fees']:.2f}  net: {report['net_pnl']:.2f}  "
+          f"unrealized: {report['unrealized_pnl']:.2f}")
+    print(f"max drawdown: {report['max_drawdown']:.2f}  open positions: {report['open_positions'] or 'none'}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--alerts', help="alert JSON-lines file or trading_bot.log")
+    source.add_argument('--signal-feed', help="recorded candle feed to generate alerts from with the signal engine")
+    parser.add_argument('--ohlc', action='append', required=True, metavar='[SYMBOL=]CSV',
+                        help=f"OHLC bars per symbol, repeatable (symbol defaults to {main.SYMBOL})")
+    parser.add_argument('--fee-bps', type=float, default=0.0, help="fee per fill in basis points of notional")
+    parser.add_argument('--log-utc-offset', type=float, default=0.0,
+                        help="hours the log's timestamps are ahead of UTC")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    parser.add_argument('--verbose', action='store_true', help="keep the bot's logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        # Cancels of stops that already filled are expected without a private stream, keep the report readable
+        logging.getLogger().setLevel(logging.CRITICAL)
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
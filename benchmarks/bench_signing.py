@@ -0,0 +1,97 @@
+"""Micro-benchmark: cost of building and signing one order request.
+
+Compares the original per-call path (dict + json.dumps, re-keyed HMAC,
+fresh header dict) against the precomputed fast path in main.py.
+
+    python benchmarks/bench_signing.py [--iterations N] [--min-speedup X]
+
+With --min-speedup the script exits non-zero when the fast path is not at
+least X times faster, so the reduction can be enforced in CI.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import main  # noqa: E402
+
+API_KEY = main.API_KEY
+API_SECRET = main.API_SECRET
+PATH = '/v2/orders'
+
+
+def legacy_build_and_sign():
+    """The request-building steps as they were before the fast path"""
+    order_data = {
+        "product_id": main.PRODUCT_ID,
+        "size": 5,
+        "side": "buy",
+        "order_type": "market_order",
+        "stop_order_type": "stop_loss_order",
+        "stop_price": "65000.5",
+        "stop_trigger_method": "last_traded_price",
+        "client_order_id": "0123456789abcdef0123456789abcdef"
+    }
+    payload = json.dumps(order_data)
+    timestamp = str(int(time.time()))
+    url = f'{main.BASE_URL}{PATH}'
+    signature_data = 'POST' + timestamp + PATH + '' + payload
+    signature = hmac.new(bytes(API_SECRET, 'utf-8'), bytes(signature_data, 'utf-8'), hashlib.sha256).hexdigest()
+    headers = {
+        'api-key': API_KEY,
+        'timestamp': timestamp,
+        'signature': signature,
+        'User-Agent': 'delta-trading-bot/4.0',
+        'Content-Type': 'application/json'
+    }
+    return url, headers, payload
+
+
+def fast_build_and_sign():
+    """The same request built through main.py's templates and cached signer"""
+    payload = main.build_order_payload(main.PRODUCT_ID, 'buy', 5, '0123456789abcdef0123456789abcdef',
+                                       stop_price='65000.5')
+    timestamp = str(int(time.time()))
+    url = main.BASE_URL + PATH
+    signature = main.get_signer(API_SECRET).sign('POST' + timestamp + PATH + payload)
+    headers = main.signed_headers(main.DEFAULT_ACCOUNT, main.ACCOUNTS[main.DEFAULT_ACCOUNT], timestamp, signature)
+    return url, headers, payload
+
+
+def measure(func, iterations, repeat=5):
+    """Best-of-``repeat`` cost per call in microseconds"""
+    return min(timeit.repeat(func, number=iterations, repeat=repeat)) / iterations * 1e6
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--min-speedup', type=float, default=None)
+    args = parser.parse_args()
+    main.order_journal = None
+
+    # Both paths must produce the same request
+    legacy, fast = legacy_build_and_sign(), fast_build_and_sign()
+    assert json.loads(legacy[2]) == json.loads(fast[2]), "payloads differ"
+    assert legacy[0] == fast[0] and set(legacy[1]) == set(fast[1]), "url/headers differ"
+
+    before = measure(legacy_build_and_sign, args.iterations)
+    after = measure(fast_build_and_sign, args.iterations)
+    speedup = before / after
+
+    print(f"build+sign per order  before: {before:6.2f} µs  after: {after:6.2f} µs  speedup: {speedup:.2f}x")
+
+    if args.min_speedup is not None and speedup < args.min_speedup:
+        print(f"FAIL: speedup {speedup:.2f}x below required {args.min_speedup:.2f}x")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
@@ -0,0 +1,276 @@
+"""Load test: fire TradingView-style alert mixes at the bot against a local mock Delta exchange.
+
+Starts mock_delta.MockDeltaExchange (or, with --exchange paper, the bot's
+in-memory PaperExchange) and MockTelegram, serves main.app on a local port, posts alerts from a pool of client threads and waits until every
+queued job has finished. Reports throughput, webhook ack and alert-to-order
+latency percentiles, and exchange round-trips per alert.
+
+    python benchmarks/load_test.py --alerts 500 --concurrency 16 --latency-ms 20
+    python benchmarks/load_test.py --mix LONG_ENTRY=1,LONG_EXIT=1 --error-rate 0.02 --json
+    python benchmarks/load_test.py --exchange paper --alerts 20000 --concurrency 32
+    python benchmarks/load_test.py --profile 5    # also print the 5 slowest profiled jobs
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from werkzeug.serving import make_server
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import main  # noqa: E402
+import mock_delta  # noqa: E402
+
+DEFAULT_MIX = 'LONG_ENTRY=4,SHORT_ENTRY=4,LONG_EXIT=1,SHORT_EXIT=1'
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        alert_type, _, weight = part.partition('=')
+        if alert_type not in main.VALID_ALERT_TYPES:
+            raise SystemExit(f"Unknown alert type in --mix: {alert_type}")
+        mix[alert_type] = float(weight or 1)
+    return mix
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def build_alerts(count, mix, symbols, rng):
+    """Pre-generate alert payloads so payload construction is not part of the measurement"""
+    alert_types = list(mix)
+    weights = [mix[alert_type] for alert_type in alert_types]
+    alerts = []
+    for _ in range(count):
+        alert_type = rng.choices(alert_types, weights)[0]
+        alert = {"alert_type": alert_type, "symbol": rng.choice(symbols), "alert_id": uuid.uuid4().hex}
+        if alert_type.endswith('ENTRY'):
+            offset = rng.uniform(50, 500)
+            alert["stop_price"] = f"{50000 + offset if alert_type == 'LONG_ENTRY' else 50000 - offset:.2f}"
+        alerts.append(alert)
+    return alerts
+
+
+class AppServer:
+    """Runs the Flask app on a background werkzeug server"""
+
+    def __init__(self, app):
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        return False
+
+
+def configure_bot(exchange, telegram, args):
+    """Point the bot at the backend under test and return it (the mock or a PaperExchange)"""
+    main.TELEGRAM_API_URL = telegram.api_url()
+    main.WEBHOOK_ASYNC = not args.sync
+    main.order_journal = None
+    main.execution_engine.coalesce = not args.no_coalesce
+    if args.profile:
+        main.profiler.configure(enabled=True, reset=True)
+    main.execution_engine.history_limit = max(main.execution_engine.history_limit, args.alerts)
+    if args.queue_size is None:
+        main.execution_engine.queue_size = max(main.execution_engine.queue_size, args.alerts)
+    elif args.queue_size:
+        main.execution_engine.queue_size = args.queue_size
+    if not args.rate_limit:
+        for account in main.rate_limiters:
+            main.rate_limiters[account] = main.TokenBucket(capacity=10 ** 9, window=1)
+
+    # Route extra symbols to the mock's products
+    for product in mock_delta.DEFAULT_PRODUCTS:
+        if product['symbol'] in args.symbols and product['symbol'] not in main.INSTRUMENTS:
+            main.INSTRUMENTS[product['symbol']] = {'product_id': product['id'], 'lot_size': main.LOT_SIZE,
+                                                   'tick_size': product['tick_size'],
+                                                   'contract_value': product['contract_value']}
+
+    if exchange is None:
+        exchange = main.exchange = main.PaperExchange(prices={symbol: 50000.0 for symbol in args.symbols})
+        exchange.start()
+        main.product_cache.refresh()
+        return exchange
+
+    main.BASE_URL = exchange.base_url
+    main.product_cache.refresh()
+    main.warm_up_connections(min(args.concurrency, main.HTTP_POOL_SIZE))
+    return exchange
+
+
+def wait_for_jobs(job_ids, timeout):
+    deadline = time.time() + timeout
+    pending = set(job_ids)
+    while pending and time.time() < deadline:
+        pending = {job_id for job_id in pending
+                   if (main.execution_engine.get_job(job_id) or {}).get('status') not in ('completed', 'failed', 'superseded')}
+        if pending:
+            time.sleep(0.01)
+    return pending
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    mock = None
+    if args.exchange == 'mock':
+        mock = mock_delta.MockDeltaExchange(latency=args.latency_ms / 1000.0, error_rate=args.error_rate,
+                                            seed=args.seed).start()
+    telegram = mock_delta.MockTelegram(latency=args.telegram_latency_ms / 1000.0).start()
+    exchange = configure_bot(mock, telegram, args)
+    alerts = build_alerts(args.alerts, parse_mix(args.mix), args.symbols, rng)
+
+    local = threading.local()
+    acks = []
+    acks_lock = threading.Lock()
+
+    with AppServer(main.app) as app_url:
+        webhook_url = f"{app_url}/webhook"
+
+        def fire(alert):
+            session = getattr(local, 'session', None)
+            if session is None:
+                session = local.session = requests.Session()
+            sent = time.perf_counter()
+            response = session.post(webhook_url, json=alert, timeout=60)
+            elapsed = time.perf_counter() - sent
+            body = response.json()
+            with acks_lock:
+                acks.append((response.status_code, elapsed, body.get('job_id'), alert['alert_type']))
+
+        calls_before = exchange.call_count()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(fire, alerts))
+        acked = time.perf_counter()
+
+        job_ids = [job_id for _, _, job_id, _ in acks if job_id]
+        unfinished = wait_for_jobs(job_ids, args.timeout)
+        finished = time.perf_counter()
+        main.telegram_notifier.flush(timeout=10)
+
+    calls = exchange.calls(calls_before)
+    jobs = [main.execution_engine.get_job(job_id) for job_id in job_ids]
+    done_jobs = [job for job in jobs if job and job['status'] == 'completed']
+    if args.sync:
+        alert_to_order = [elapsed for status, elapsed, _, _ in acks if status == 200]
+    else:
+        alert_to_order = [job['finished_at'] - job['received_at'] for job in done_jobs]
+    ack_latencies = [elapsed for _, elapsed, _, _ in acks]
+    statuses = Counter(status for status, _, _, _ in acks)
+    telegram_stats = main.telegram_notifier.stats()
+    slowest = main.profiler.report(kind='job', limit=args.profile)['slowest'] if args.profile else []
+
+    if mock is not None:
+        mock.stop()
+    telegram.stop()
+
+    return {
+        "alerts": len(alerts),
+        "concurrency": args.concurrency,
+        "mode": "sync" if args.sync else "async",
+        "symbols": args.symbols,
+        "exchange": args.exchange,
+        "exchange_latency_ms": args.latency_ms if mock else 0.0,
+        "error_rate": args.error_rate,
+        "ack_throughput_per_s": len(alerts) / (acked - started),
+        "throughput_per_s": len(alerts) / (finished - started),
+        "ack_p50_ms": percentile(ack_latencies, 50) * 1000,
+        "ack_p99_ms": percentile(ack_latencies, 99) * 1000,
+        "alert_to_order_p50_ms": percentile(alert_to_order, 50) * 1000,
+        "alert_to_order_p99_ms": percentile(alert_to_order, 99) * 1000,
+        "exchange_calls": len(calls),
+        "exchange_calls_per_alert": len(calls) / len(alerts),
+        "exchange_calls_by_endpoint": dict(Counter(f"{method} {main.endpoint_label(path)}"
+                                                  for method, path in calls)),
+        "http_status": dict(statuses),
+        "jobs_failed": sum(1 for job in jobs if job and job['status'] == 'failed'),
+        "jobs_superseded": sum(1 for job in jobs if job and job['status'] == 'superseded'),
+        "jobs_unfinished": len(unfinished),
+        "telegram_messages": telegram_stats['sent'],
+        "telegram_requests": len(telegram.messages),
+        "slowest_jobs": slowest,
+    }
+
+
+def print_report(report):
+    print(f"alerts: {report['alerts']}  concurrency: {report['concurrency']}  mode: {report['mode']}  "
+          f"symbols: {','.join(report['symbols'])}")
+    print(f"exchange: {report['exchange']}  latency: {report['exchange_latency_ms']} ms  "
+          f"error rate: {report['error_rate']:.1%}")
+    print(f"throughput:        {report['throughput_per_s']:8.1f} alerts/s "
+          f"(acks {report['ack_throughput_per_s']:.1f}/s)")
+    print(f"webhook ack:       p50 {report['ack_p50_ms']:8.2f} ms   p99 {report['ack_p99_ms']:8.2f} ms")
+    print(f"alert-to-order:    p50 {report['alert_to_order_p50_ms']:8.2f} ms   "
+          f"p99 {report['alert_to_order_p99_ms']:8.2f} ms")
+    print(f"exchange calls:    {report['exchange_calls']} ({report['exchange_calls_per_alert']:.2f} per alert)")
+    for endpoint, count in sorted(report['exchange_calls_by_endpoint'].items()):
+        print(f"  {endpoint:<45} {count}")
+    print(f"http status:       {report['http_status']}  failed jobs: {report['jobs_failed']}  "
+          f"superseded: {report['jobs_superseded']}  unfinished: {report['jobs_unfinished']}")
+    print(f"telegram:          {report['telegram_messages']} messages in {report['telegram_requests']} requests")
+    for job in report['slowest_jobs']:
+        stages = ' '.join(f"{stage}={ms:.1f}" for stage, ms in sorted(job['stages_ms'].items()))
+        print(f"slow job {job['request_id'][:8]} {job['alert_type']:<11} {job['total_ms']:8.1f} ms "
+              f"({job['bound']}, cpu {job['cpu_ms']:.1f} ms, queued {job['queue_wait_ms']:.1f} ms) {stages}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--alerts', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"weighted alert mix (default {DEFAULT_MIX})")
+    parser.add_argument('--symbols', default=main.SYMBOL, type=lambda text: text.split(','),
+                        help="comma-separated symbols to spread alerts over (mock knows BTCUSD, ETHUSD)")
+    parser.add_argument('--exchange', choices=('mock', 'paper'), default='mock',
+                        help="mock: HTTP mock Delta server, paper: the bot's in-memory PaperExchange (no network)")
+    parser.add_argument('--latency-ms', type=float, default=10.0, help="latency injected per exchange call")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of exchange calls answered 503")
+    parser.add_argument('--telegram-latency-ms', type=float, default=50.0)
+    parser.add_argument('--sync', action='store_true', help="execute alerts inside the webhook request")
+    parser.add_argument('--no-coalesce', action='store_true', help="run every queued alert instead of its net effect")
+    parser.add_argument('--rate-limit', action='store_true', help="keep the client-side rate limiter enabled")
+    parser.add_argument('--queue-size', type=int, default=None,
+                        help="order queue bound (default: large enough for every alert, 0 keeps the bot's own)")
+    parser.add_argument('--timeout', type=float, default=120.0, help="max seconds to wait for queued jobs")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--profile', type=int, default=0, metavar='N',
+                        help="enable request profiling and report the N slowest jobs")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    parser.add_argument('--verbose', action='store_true', help="keep the bot's INFO logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        for name in ('', 'werkzeug'):
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0 if not report['jobs_unfinished'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
@@ -1,24 +1,143 @@
 import hashlib
 import hmac
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 import time
 import json
-from flask import Flask, request, jsonify
+import math
+from flask import Flask, request, jsonify, Response
 import logging
+import logging.handlers
+import atexit
 from datetime import datetime
 import threading
+import queue
+import uuid
+import random
+import itertools
+from collections import OrderedDict, deque
 import traceback
-from typing import Dict, Any, Optional, Tuple
+import re
+import os
+import sys
+import heapq
+import signal
+import sqlite3
+from typing import Dict, Any, Optional, Tuple, NamedTuple
+from decimal import Decimal, ROUND_HALF_UP
+
+try:
+    import websocket  # websocket-client, optional: without it positions come from REST
+except ImportError:
+    websocket = None
+
+try:
+    import fcntl  # POSIX only, needed for cross-process instrument locks (STATE_DIR)
+except ImportError:
+    fcntl = None
+
+try:
+    from gunicorn.app.base import BaseApplication  # optional: multi-process serving, see serve()
+except ImportError:
+    BaseApplication = None
+
+from werkzeug.serving import make_server
+
+PROCESS_STARTED_AT = time.time()  # Reference point for startup and time-to-first-alert
 
 # Enhanced logging configuration
-logging.basicConfig(
-    level=logging.INFO, 
-    format='%(asctime)s - %(name)s - %(levelname)s - [%(funcName)s:%(lineno)d] - %(message)s',
-    handlers=[
-        logging.FileHandler('trading_bot.log'),
-        logging.StreamHandler()
-    ]
-)
+LOG_FILE = 'trading_bot.log'
+LOG_LEVEL = logging.INFO  # DEBUG adds per-attempt lines and full webhook payload dumps
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(funcName)s:%(lineno)d] - %(message)s'
+LOG_JSON = False  # Write the log file as structured JSON lines
+LOG_ROTATE_BYTES = 10 * 1024 * 1024  # Size-based rotation (ignored when LOG_ROTATE_WHEN is set)
+LOG_ROTATE_WHEN = None  # Time-based rotation, e.g. 'midnight' or 'H'
+LOG_BACKUP_COUNT = 5
+LOG_QUEUE_SIZE = 10000  # Records beyond this are dropped instead of blocking the caller
+
+class JsonLineFormatter(logging.Formatter):
+    """One JSON object per line for log shippers"""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "func": record.funcName,
+            "line": record.lineno,
+            "thread": record.threadName,
+            "message": record.getMessage()
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the background writer without formatting or blocking.
+
+    Only the message itself is rendered here (so lazily-formatted arguments are
+    evaluated once and only for records that pass the level check); timestamps,
+    formatting and disk I/O happen on the listener thread.
+    """
+
+    dropped = 0
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            AsyncQueueHandler.dropped += 1
+
+class LazyJson:
+    """Defers json.dumps until a log record is actually emitted"""
+
+    __slots__ = ('value', 'indent')
+
+    def __init__(self, value, indent=2):
+        self.value = value
+        self.indent = indent
+
+    def __str__(self):
+        return json.dumps(self.value, indent=self.indent, default=str)
+
+def setup_logging():
+    """Route all records through a queue to a background rotating-file + console writer"""
+    if LOG_ROTATE_WHEN:
+        file_handler = logging.handlers.TimedRotatingFileHandler(
+            LOG_FILE, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(
+            LOG_FILE, maxBytes=LOG_ROTATE_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    file_handler.setFormatter(JsonLineFormatter() if LOG_JSON else logging.Formatter(LOG_FORMAT))
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler,
+                                              respect_handler_level=True)
+    listener.start()
+    # Flush whatever is still queued when the process exits
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.handlers = [AsyncQueueHandler(log_queue)]
+    return listener
+
+log_listener = setup_logging()
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
@@ -29,6 +148,12 @@ BASE_URL = 'https://api.india.delta.exchange'
 API_KEY = 'NWczUdbI9vVbBlCASC0rRFolMpPM32'  # 🔑 Replace with your actual API key
 API_SECRET = 'YTN79e7x2vuLSYzGW7YUBMnZNJEXTDPxsMaEpH0ZwXptQRwl9zjEby0Z8oAp'  # 🔑 Replace with your actual API secret
 
+# Exchange backend (see ExchangeAdapter)
+EXCHANGE = 'delta'  # 'paper' trades against the in-memory PaperExchange: no network, no credentials used
+PAPER_TICK_SIZE = '0.5'  # Product defaults for paper trading, INSTRUMENTS entries may override them
+PAPER_CONTRACT_VALUE = '0.001'
+PAPER_ORDER_HISTORY = 10000  # Closed paper orders kept for client_order_id lookups
+
 # Telegram Configuration  
 TELEGRAM_BOT_TOKEN = '8068558939:AAHcsThdbt0J1uzI0mT140H9vJXbcaVZ9Jk'  # 🤖 Replace with your bot token
 TELEGRAM_CHAT_ID = '871704959'  # 💬 Replace with your chat ID
@@ -39,17 +164,573 @@ SYMBOL = 'BTCUSD'
 PRODUCT_ID = 27
 LOT_SIZE = 0.005
 
+# Routing: webhooks may carry "symbol" and "account", defaulting to SYMBOL / DEFAULT_ACCOUNT
+DEFAULT_ACCOUNT = 'default'
+ACCOUNTS = {
+    DEFAULT_ACCOUNT: {'api_key': API_KEY, 'api_secret': API_SECRET},
+}
+INSTRUMENTS = {
+    SYMBOL: {'product_id': PRODUCT_ID, 'lot_size': LOT_SIZE},
+}
+
 # Enhanced Configuration
 MAX_RETRIES = 3
-RETRY_DELAY = 1
+RETRY_DELAY = 0.25  # Base delay, doubled per attempt with full jitter
+RETRY_MAX_DELAY = 2
+REQUEST_DEADLINE = 10  # Total time budget for one make_api_request call, retries included
 REQUEST_TIMEOUT = (5, 30)
+MIN_ATTEMPT_TIMEOUT = 0.1  # Floor for an attempt's timeout when little of the deadline is left
+AMBIGUOUS_SETTLE_DELAY = 0.5  # Minimum wait before checking whether a timed-out order went through
+CIRCUIT_FAILURE_THRESHOLD = 5  # Consecutive server-side failures before an endpoint fails fast
+CIRCUIT_RESET_TIMEOUT = 30  # Seconds before a tripped endpoint is probed again
+
+# HTTP connection pool configuration
+HTTP_POOL_SIZE = 10  # Max keep-alive connections held per host
+HTTP_POOL_BLOCK = False  # Open extra connections instead of waiting when the pool is exhausted
+HTTP_WARM_CONNECTIONS = 2  # Connections opened to BASE_URL at startup
+
+# Client-side rate limiting (Delta meters request weight per account over a rolling window)
+RATE_LIMIT_CAPACITY = 10000
+RATE_LIMIT_WINDOW = 300  # Seconds for a full bucket to refill
+RATE_LIMIT_PRIORITIES = ('critical', 'normal', 'low')
+RATE_LIMIT_RESERVE_CRITICAL = 0.1  # Share of the quota only order calls may use
+RATE_LIMIT_RESERVE_LOW = 0.3  # Share of the quota /status, /test and polls may not touch
+RATE_LIMIT_MAX_WAIT = {'critical': 5.0, 'normal': 2.0, 'low': 0.0}  # Queueing budget before shedding
+DEFAULT_ENDPOINT_WEIGHT = 5
+ENDPOINT_WEIGHTS = {
+    ('GET', '/products'): 3,
+    ('GET', '/products/{id}'): 1,
+    ('GET', '/positions'): 3,
+    ('GET', '/positions/margined'): 3,
+    ('GET', '/orders'): 3,
+    ('GET', '/orders/client_order_id/{id}'): 1,
+    ('GET', '/history/candles'): 3,
+    ('POST', '/orders'): 5,
+    ('PUT', '/orders'): 5,
+    ('DELETE', '/orders'): 5,
+    ('DELETE', '/orders/all'): 10,
+    ('POST', '/orders/batch'): 25,
+    ('PUT', '/orders/batch'): 25,
+    ('DELETE', '/orders/batch'): 25,
+}
+
+# Order execution engine configuration
+WEBHOOK_ASYNC = True  # Ack webhooks immediately and execute orders on a worker
+ORDER_WORKERS = 4  # Alerts for one instrument always run in order, different instruments run in parallel
+JOB_QUEUE_SIZE = 100
+JOB_HISTORY_LIMIT = 500  # Finished jobs kept for /jobs/<id> lookups
+COALESCE_ALERTS = True  # Alerts queued behind a running one for the same instrument are folded into their net effect
+VALID_ALERT_TYPES = ('LONG_ENTRY', 'SHORT_ENTRY', 'LONG_EXIT', 'SHORT_EXIT')
+
+# Serving configuration (see create_app / serve)
+SERVER_HOST = '0.0.0.0'
+SERVER_PORT = 5000
+WEB_WORKERS = 1  # Worker processes, more than one requires STATE_DIR
+WEB_THREADS = 8  # Request threads per worker process
+SHUTDOWN_DRAIN_TIMEOUT = 25  # Seconds a stopping worker waits for queued and running orders
+STATE_DIR = None  # e.g. 'state': instrument locks/state and webhook dedup shared by all workers, one runs the streams
+STARTUP_SYNC_WAIT = 30  # Seconds a synchronous (WEBHOOK_ASYNC = False) alert waits for startup before a 503
+
+# /status snapshot cache (see StatusCache)
+STATUS_REFRESH_INTERVAL = 5  # Seconds between background rebuilds of the /status snapshot
+STATUS_MAX_STALENESS = 30  # A snapshot older than this is rebuilt before answering
+
+# Metrics configuration
+METRICS_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Request profiling (opt-in, also switchable at runtime through POST /debug/slow)
+PROFILING = False  # Time the stages of every webhook and order job, keep the slowest at /debug/slow
+PROFILE_SLOW_KEEP = 50  # Slowest profiled requests kept
+PROFILE_SAMPLE_INTERVAL = 0.005  # Stack sampling period (seconds) for profiled requests, 0 disables sampling
+PROFILE_HOT_FRAMES = 10  # Most-sampled frames kept per request
+DEBUG_TOKEN = ''  # Required in the X-Debug-Token header of POST /debug/slow, empty refuses every POST
+
+# Webhook idempotency configuration
+DEDUP_TTL = 600  # Seconds a delivered alert is remembered
+DEDUP_MAX_ENTRIES = 10000
+DEDUP_WINDOW = 60  # Alerts without alert_id repeating the last payload for their symbol within this many seconds are duplicates
+DEDUP_DB_PATH = None  # e.g. 'webhook_dedup.sqlite3' to survive restarts (defaults into STATE_DIR when set)
+DEDUP_CLAIM_TIMEOUT = 120  # In-flight claims older than this are treated as abandoned by a dead worker
+
+# Order journal configuration (crash recovery, see OrderJournal)
+JOURNAL_PATH = None  # e.g. 'order_journal.sqlite3' to recover orders after a crash (defaults into STATE_DIR when set)
+JOURNAL_COMPACT_EVERY = 1000  # Events between folding the log into the snapshot table
+
+# Private WebSocket configuration (orders/positions state stream)
+WS_URL = 'wss://socket.india.delta.exchange'
+USE_PRIVATE_STREAM = True
+WS_AUTH_TYPE = 'key-auth'
+WS_RECV_TIMEOUT = 40  # Heartbeats arrive every ~30s, silence longer than this means a dead socket
+WS_RECONNECT_MAX_DELAY = 30
+FINAL_ORDER_STATES = ('closed', 'cancelled', 'filled', 'rejected')
+
+# Protective stop manager configuration (bracket SL / trailing stops, see StopManager)
+TICKER_STREAM = True  # Mark prices from the public v2/ticker channel drive trailing stops
+TRAIL_MIN_EDIT_INTERVAL = 1.0  # Seconds between edits of one stop, price moves in between are coalesced
+TRAIL_MIN_STEP_TICKS = 2  # Trailing moves smaller than this many ticks are not sent
+MONITOR_POLL_INTERVAL = 5  # REST position check for protected instruments while the private stream is down
+
+# Signal engine configuration (entries computed in-process from the candle stream, see SignalEngine)
+SIGNAL_ENGINE = False  # Trade fast/slow EMA crosses from the public candle feed, no webhook round-trip
+SIGNAL_SYMBOLS = None  # Symbols traded on signals, None means every entry in INSTRUMENTS
+SIGNAL_ACCOUNT = DEFAULT_ACCOUNT
+SIGNAL_RESOLUTION = '1m'  # Subscribes to candlestick_<resolution>
+SIGNAL_FAST_EMA = 9
+SIGNAL_SLOW_EMA = 21
+SIGNAL_ATR_PERIOD = 14
+SIGNAL_ENTRY_ATR = 0.0  # Entry stop this many ATRs beyond the signal candle, 0 enters at market
+SIGNAL_STOP_ATR = 2.0  # Protective stop this many ATRs from the close, 0 places none
+SIGNAL_HISTORY = 500  # Candles of REST history the indicators are warmed up with
+SIGNAL_RECORD_PATH = None  # e.g. 'candles.jsonl': append raw candle messages for offline replay (replay_feed)
+
+# Product metadata cache configuration
+PRODUCT_CACHE_TTL = 3600  # Seconds between background /products refreshes
+PRODUCT_PAGE_SIZE = 500
+PRODUCT_MISS_TTL = 30  # Seconds a failed single-product lookup is remembered, orders for it fail fast meanwhile
+
+# Telegram notifier configuration
+NOTIFY_TELEGRAM = True  # False keeps notifications in the log only (backtests, local runs)
+TELEGRAM_QUEUE_SIZE = 200  # Messages beyond this are dropped and summarized
+TELEGRAM_BATCH_WINDOW = 0.5  # Seconds to collect messages into one sendMessage
+TELEGRAM_MAX_MESSAGE_LENGTH = 4000  # Telegram rejects texts over 4096 chars
+TELEGRAM_MAX_ATTEMPTS = 3
+TELEGRAM_MAX_BACKOFF = 30  # Cap on a single 429 retry_after wait
+
+# Per-instrument trading state (see get_instrument_state)
+instrument_states = {}
+_instrument_states_lock = threading.Lock()
+
+# Shared HTTP sessions (created lazily, see get_http_session)
+_http_session = None
+_telegram_session = None
+_http_session_lock = threading.Lock()
+_request_timing = threading.local()
+
+class _TimedConnectionMixin:
+    """Records how long the TCP (+TLS) connect took for the current thread"""
+
+    def connect(self):
+        connect_start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _request_timing.connect_time = time.perf_counter() - connect_start
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """Keep-alive adapter whose connections report their connect time"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool
+        }
+
+def _create_session(pool_size):
+    """Build a keep-alive session with a sized connection pool"""
+    session = requests.Session()
+    adapter = PooledHTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=pool_size,
+        pool_block=HTTP_POOL_BLOCK,
+        max_retries=0
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'User-Agent': 'delta-trading-bot/4.0',
+        'Connection': 'keep-alive'
+    })
+    return session
+
+def get_http_session():
+    """Return the shared keep-alive session used for all exchange calls"""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                _http_session = _create_session(HTTP_POOL_SIZE)
+    return _http_session
+
+def get_telegram_session():
+    """Return the keep-alive session used for Telegram (one connection is enough)"""
+    global _telegram_session
+    if _telegram_session is None:
+        with _http_session_lock:
+            if _telegram_session is None:
+                _telegram_session = _create_session(1)
+    return _telegram_session
+
+def warm_up_connections(count=None):
+    """Open keep-alive connections to BASE_URL so the order path skips the handshake"""
+    count = HTTP_WARM_CONNECTIONS if count is None else min(count, HTTP_POOL_SIZE)
+    session = get_http_session()
+    results = []
+
+    def _open():
+        try:
+            response = session.head(BASE_URL, timeout=REQUEST_TIMEOUT)
+            response.close()
+            results.append(True)
+        except Exception as e:
+            logger.warning(f"⚠️ Connection warm-up failed: {str(e)}")
+            results.append(False)
+
+    # Concurrent requests force the pool to open distinct connections
+    threads = [threading.Thread(target=_open, daemon=True) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    warmed = sum(results)
+    logger.info(f"🔥 Warmed {warmed}/{count} connections to {BASE_URL}")
+    return warmed
+
+class Counter:
+    """Monotonic counter with optional labels, rendered in Prometheus text format"""
 
-# Global variables
-current_position = None
-active_orders = {}
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(label, '')) for label in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Gauge:
+    """Last-set value with optional labels"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def set(self, value, **labels):
+        key = tuple(str(labels.get(label, '')) for label in self.labelnames)
+        with self.lock:
+            self.values[key] = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket latency histogram with optional labels"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=METRICS_LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(label, '')) for label in self.labelnames)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][index] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def time(self, **labels):
+        """Context manager that observes the elapsed wall time of its block"""
+        return _HistogramTimer(self, labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, series in sorted(self.series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket"
+                                 f"{_format_labels(self.labelnames + ('le',), key + (repr(float(bound)),))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames + ('le',), key + ('+Inf',))} "
+                             f"{series['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series['sum']}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series['count']}")
+        return lines
+
+class _HistogramTimer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+def endpoint_label(endpoint):
+    """Collapse ids in an endpoint path so metric label cardinality stays bounded"""
+    path = re.sub(r'/client_order_id/[^/]+', '/client_order_id/{id}', endpoint.split('?', 1)[0])
+    return re.sub(r'/\d+', '/{id}', path)
+
+# Metrics registry, exposed at /metrics
+WEBHOOK_DURATION = Histogram('deltabot_webhook_duration_seconds',
+                             'Total /webhook handling time until the response is sent', ['status'])
+WEBHOOK_STAGE_DURATION = Histogram('deltabot_webhook_stage_duration_seconds',
+                                   'Time spent in each webhook stage', ['stage'])
+ALERT_EXECUTION_DURATION = Histogram('deltabot_alert_execution_seconds',
+                                     'Exchange-side execution time of an alert', ['alert_type', 'symbol'])
+ALERT_TO_ORDER_DURATION = Histogram('deltabot_alert_to_order_seconds',
+                                    'Time from webhook receipt until its orders are done', ['alert_type', 'symbol'])
+SIGNATURE_DURATION = Histogram('deltabot_signature_duration_seconds', 'Request signing time')
+EXCHANGE_REQUEST_DURATION = Histogram('deltabot_exchange_request_duration_seconds',
+                                      'Duration of each exchange request attempt',
+                                      ['method', 'endpoint', 'attempt', 'outcome'])
+EXCHANGE_RETRIES = Counter('deltabot_exchange_retries_total', 'Exchange request retries', ['method', 'endpoint'])
+EXCHANGE_ERRORS = Counter('deltabot_exchange_errors_total', 'Failed exchange request attempts by kind',
+                          ['method', 'endpoint', 'kind'])
+TELEGRAM_SEND_DURATION = Histogram('deltabot_telegram_send_duration_seconds',
+                                   'Telegram sendMessage time including 429 backoff', ['outcome'])
+ALERTS_COALESCED = Counter('deltabot_alerts_coalesced_total',
+                           'Queued alerts superseded by a later alert for the same instrument', ['symbol'])
+SIGNALS_TOTAL = Counter('deltabot_signals_total', 'Orders signalled by the in-process signal engine',
+                        ['alert_type', 'symbol'])
+STARTUP_STEP_SECONDS = Gauge('deltabot_startup_step_seconds', 'Duration of each startup step', ['step'])
+STARTUP_READY_SECONDS = Gauge('deltabot_startup_ready_seconds', 'Time from process start until orders execute')
+FIRST_ALERT_SECONDS = Gauge('deltabot_first_alert_seconds', 'Time from process start until the first accepted alert')
+METRICS = [
+    WEBHOOK_DURATION, WEBHOOK_STAGE_DURATION, ALERT_EXECUTION_DURATION, ALERT_TO_ORDER_DURATION,
+    SIGNATURE_DURATION, EXCHANGE_REQUEST_DURATION, EXCHANGE_RETRIES, EXCHANGE_ERRORS, TELEGRAM_SEND_DURATION,
+    ALERTS_COALESCED, SIGNALS_TOTAL, STARTUP_STEP_SECONDS, STARTUP_READY_SECONDS, FIRST_ALERT_SECONDS
+]
+
+class RequestProfile:
+    """Timings collected for one webhook request or order job on the thread running it"""
+
+    def __init__(self, kind, request_id):
+        self.kind = kind
+        self.request_id = request_id
+        self.fields = {}
+        self.stages = {}
+        self.exchange_calls = []
+        self.samples = {}
+        self.depth = 0  # Open stages, only the outermost one is counted
+        self.thread_id = threading.get_ident()
+        self.started = time.perf_counter()
+        self.cpu_started = time.thread_time()
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+class _ProfileStage:
+    def __init__(self, profile, stage, call=None):
+        self.profile = profile
+        self.stage = stage
+        self.call = call
+
+    def __enter__(self):
+        if self.profile is not None:
+            self.profile.depth += 1
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        profile = self.profile
+        if profile is not None:
+            profile.depth -= 1
+            if profile.depth == 0:
+                elapsed = time.perf_counter() - self.start
+                profile.add(self.stage, elapsed)
+                if self.call:
+                    profile.exchange_calls.append((self.call, round(elapsed * 1000, 3)))
+        return False
+
+class RequestProfiler:
+    """Opt-in latency profiler for the webhook path.
+
+    While enabled, each webhook request and order job carries a
+    RequestProfile on its thread. It records stage times (parse, dedup,
+    validate, enqueue, lookup, cancel, place, edit, notify), every exchange
+    call, a job's queue wait, and CPU time next to wall time, so a slow
+    request shows whether it burned Python CPU or waited on the network;
+    time outside any stage is reported as ``other_ms``. A sampler thread
+    snapshots the stacks of profiled threads every ``sample_interval`` to
+    name the hot frames. Only the ``keep`` slowest requests are retained.
+    """
+
+    def __init__(self, enabled=PROFILING, keep=PROFILE_SLOW_KEEP, sample_interval=PROFILE_SAMPLE_INTERVAL):
+        self.enabled = enabled
+        self.keep = keep
+        self.sample_interval = sample_interval
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.active = {}  # thread id -> RequestProfile
+        self.slowest = []  # Min-heap of (total seconds, sequence, record)
+        self.sequence = itertools.count()
+        self.profiled = 0
+        self.sampler = None
+
+    def begin(self, kind, request_id=None):
+        """Start profiling the current thread's request, returns None when profiling is off"""
+        if not self.enabled:
+            return None
+        profile = RequestProfile(kind, request_id)
+        self.local.profile = profile
+        with self.lock:
+            self.active[profile.thread_id] = profile
+            if self.sample_interval and (self.sampler is None or not self.sampler.is_alive()):
+                self.sampler = threading.Thread(target=self._sample_loop, name="profile-sampler", daemon=True)
+                self.sampler.start()
+        return profile
+
+    def current(self):
+        return getattr(self.local, 'profile', None)
+
+    def annotate(self, **fields):
+        profile = getattr(self.local, 'profile', None)
+        if profile is not None:
+            profile.fields.update(fields)
+
+    def stage(self, name, call=None):
+        """Context manager timing a stage of the current profile (no-op without one)"""
+        return _ProfileStage(getattr(self.local, 'profile', None), name, call)
+
+    def end(self, profile, **fields):
+        """Finish a profile and keep it if it ranks among the slowest"""
+        if profile is None:
+            return
+        total = time.perf_counter() - profile.started
+        cpu = min(total, time.thread_time() - profile.cpu_started)
+        if getattr(self.local, 'profile', None) is profile:
+            self.local.profile = None
+
+        profile.fields.update(fields)
+        staged = sum(profile.stages.values())
+        hot = sorted(profile.samples.items(), key=lambda item: item[1], reverse=True)[:PROFILE_HOT_FRAMES]
+        record = dict(profile.fields, **{
+            "kind": profile.kind,
+            "request_id": profile.request_id,
+            "finished_at": time.time(),
+            "total_ms": round(total * 1000, 3),
+            "cpu_ms": round(cpu * 1000, 3),
+            "wait_ms": round((total - cpu) * 1000, 3),
+            # CPU here is this thread's Python/GIL-holding time, the rest is network, locks and queues
+            "bound": "cpu" if cpu >= total / 2 else "wait",
+            "stages_ms": {stage: round(seconds * 1000, 3) for stage, seconds in profile.stages.items()},
+            "other_ms": round(max(0.0, total - staged) * 1000, 3),
+            "exchange_calls": profile.exchange_calls,
+            "samples": sum(profile.samples.values()),
+            "hot_frames": [{"frame": frame, "samples": count} for frame, count in hot],
+        })
+
+        with self.lock:
+            self.active.pop(profile.thread_id, None)
+            self.profiled += 1
+            entry = (total, next(self.sequence), record)
+            if len(self.slowest) < self.keep:
+                heapq.heappush(self.slowest, entry)
+            elif total > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, entry)
+
+    def configure(self, enabled=None, keep=None, sample_interval=None, reset=False):
+        with self.lock:
+            if enabled is not None:
+                self.enabled = bool(enabled)
+            if sample_interval is not None:
+                self.sample_interval = max(0.0, float(sample_interval))
+            if keep is not None:
+                self.keep = max(1, int(keep))
+                self.slowest = heapq.nlargest(self.keep, self.slowest)
+                heapq.heapify(self.slowest)
+            if reset:
+                self.slowest = []
+                self.profiled = 0
+
+    def report(self, kind=None, limit=None):
+        with self.lock:
+            records = [record for _, _, record in sorted(self.slowest, reverse=True)
+                       if kind is None or record["kind"] == kind]
+            return {
+                "enabled": self.enabled,
+                "keep": self.keep,
+                "sample_interval": self.sample_interval,
+                "profiled": self.profiled,
+                "in_flight": len(self.active),
+                "slowest": records[:limit] if limit else records
+            }
+
+    def _sample_loop(self):
+        own_file = os.path.abspath(__file__)
+        while self.enabled and self.sample_interval:
+            time.sleep(self.sample_interval)
+            with self.lock:
+                active = list(self.active.items())
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for thread_id, profile in active:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                leaf = f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})"
+                # Name the bot function the leaf was reached from, e.g. a socket read inside make_api_request
+                caller = frame
+                while caller is not None and os.path.abspath(caller.f_code.co_filename) != own_file:
+                    caller = caller.f_back
+                key = leaf if caller is None or caller is frame else f"{leaf} <- {caller.f_code.co_name}:{caller.f_lineno}"
+                profile.samples[key] = profile.samples.get(key, 0) + 1
+
+profiler = RequestProfiler()
+
+# Profile stage per exchange call method
+PROFILE_STAGES = {'GET': 'lookup', 'POST': 'place', 'PUT': 'edit', 'DELETE': 'cancel'}
+
+def render_metrics():
+    """All registered metrics in Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
 
 def send_telegram_message(message):
-    """Enhanced Telegram messaging with error handling"""
+    """Enhanced Telegram messaging with error handling and 429 backoff"""
     try:
         if TELEGRAM_BOT_TOKEN == 'your_telegram_bot_token_here':
             return False
@@ -63,18 +744,164 @@ def send_telegram_message(message):
             'parse_mode': 'Markdown'
         }
 
-        response = requests.post(TELEGRAM_API_URL, json=payload, timeout=10)
-        if response.status_code == 200:
-            logger.info("✅ Telegram message sent successfully")
-            return True
-        else:
+        session = get_telegram_session()
+        send_start = time.perf_counter()
+        for attempt in range(TELEGRAM_MAX_ATTEMPTS):
+            response = session.post(TELEGRAM_API_URL, json=payload, timeout=10)
+            if response.status_code == 400 and 'parse_mode' in payload:
+                # An unbalanced _, * or [ in alert text fails Markdown parsing; resend the batch as plain text
+                logger.warning("⚠️ Telegram rejected the Markdown, resending as plain text")
+                del payload['parse_mode']
+                response = session.post(TELEGRAM_API_URL, json=payload, timeout=10)
+            if response.status_code == 200:
+                TELEGRAM_SEND_DURATION.observe(time.perf_counter() - send_start, outcome="ok")
+                logger.info("✅ Telegram message sent successfully")
+                return True
+
+            if response.status_code == 429 and attempt < TELEGRAM_MAX_ATTEMPTS - 1:
+                retry_after = _telegram_retry_after(response)
+                telegram_notifier.record("rate_limited")
+                logger.warning(f"⏳ Telegram rate limited, retrying in {retry_after}s")
+                time.sleep(retry_after)
+                continue
+
+            TELEGRAM_SEND_DURATION.observe(time.perf_counter() - send_start, outcome=f"http_{response.status_code}")
             logger.warning(f"⚠️ Telegram failed: {response.status_code}")
             return False
+
+        return False
         
     except Exception as e:
         logger.error(f"❌ Telegram error: {str(e)}")
         return False
 
+def _telegram_retry_after(response):
+    """Seconds to wait after a 429, from the body or the Retry-After header"""
+    retry_after = None
+    try:
+        retry_after = response.json().get('parameters', {}).get('retry_after')
+    except Exception:
+        pass
+    if retry_after is None:
+        retry_after = response.headers.get('Retry-After', 1)
+    try:
+        retry_after = float(retry_after)
+    except (TypeError, ValueError):
+        retry_after = 1
+    return min(max(retry_after, 0), TELEGRAM_MAX_BACKOFF)
+
+class TelegramNotifier:
+    """Single background worker that batches queued messages into one sendMessage"""
+
+    def __init__(self, queue_size=TELEGRAM_QUEUE_SIZE, batch_window=TELEGRAM_BATCH_WINDOW,
+                 max_length=TELEGRAM_MAX_MESSAGE_LENGTH):
+        self.batch_window = batch_window
+        self.max_length = max_length
+        self.message_queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pending_drops = 0
+        self.counters = {
+            "queued": 0,
+            "sent": 0,
+            "batches": 0,
+            "dropped": 0,
+            "failed": 0,
+            "rate_limited": 0
+        }
+
+    def start(self):
+        """Start the worker thread (idempotent)"""
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._worker, name="telegram-notifier", daemon=True)
+                self.thread.start()
+
+    def notify(self, message):
+        """Queue a message without blocking, returns False if it was dropped"""
+        if not NOTIFY_TELEGRAM:
+            return False
+        self.start()
+        try:
+            self.message_queue.put_nowait(message)
+            self.record("queued")
+            return True
+        except queue.Full:
+            with self.lock:
+                self.pending_drops += 1
+                self.counters["dropped"] += 1
+            return False
+
+    def record(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] += amount
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        stats["queue_depth"] = self.message_queue.qsize()
+        return stats
+
+    def flush(self, timeout=5):
+        """Wait until queued messages have been handed to Telegram"""
+        deadline = time.time() + timeout
+        while self.message_queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.05)
+        return not self.message_queue.unfinished_tasks
+
+    def _collect_batch(self):
+        batch = [self.message_queue.get()]
+        deadline = time.time() + self.batch_window
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.message_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _split(self, messages):
+        """Join messages into (text, message_count) chunks that fit Telegram's length limit"""
+        chunks, current, count = [], "", 0
+        for message in messages:
+            if len(message) > self.max_length:
+                message = message[:self.max_length - 3] + "..."
+            candidate = f"{current}\n\n{message}" if current else message
+            if len(candidate) > self.max_length:
+                chunks.append((current, count))
+                candidate, count = message, 0
+            current = candidate
+            count += 1
+        if current:
+            chunks.append((current, count))
+        return chunks
+
+    def _worker(self):
+        while True:
+            batch = self._collect_batch()
+            queued = len(batch)
+            try:
+                with self.lock:
+                    dropped, self.pending_drops = self.pending_drops, 0
+                if dropped:
+                    batch.insert(0, f"⚠️ {dropped} notification(s) dropped under load")
+
+                for text, count in self._split(batch):
+                    if send_telegram_message(text):
+                        self.record("batches")
+                        self.record("sent", count)
+                    else:
+                        self.record("failed", count)
+            except Exception as e:
+                logger.error(f"❌ Telegram notifier error: {str(e)}")
+            finally:
+                for _ in range(queued):
+                    self.message_queue.task_done()
+
+telegram_notifier = TelegramNotifier()
+
 def log_and_notify(message, level="info", request_id=None):
     """Enhanced logging with request tracking"""
     log_message = f"[{request_id}] {message}" if request_id else message
@@ -88,236 +915,1490 @@ def log_and_notify(message, level="info", request_id=None):
     elif level == "critical":
         logger.critical(log_message)
     
-    # Send to Telegram (async to avoid blocking)
-    threading.Thread(target=send_telegram_message, args=(message,), daemon=True).start()
+    # Send to Telegram (batched on a background worker to avoid blocking)
+    with profiler.stage("notify"):
+        telegram_notifier.notify(message)
 
-def generate_signature(secret, message):
-    """Generate HMAC signature for Delta Exchange API"""
-    try:
-        message = bytes(message, 'utf-8')
-        secret = bytes(secret, 'utf-8')
-        hash_obj = hmac.new(secret, message, hashlib.sha256)
-        return hash_obj.hexdigest()
-    except Exception as e:
-        logger.error(f"❌ Signature generation failed: {str(e)}")
-        raise
+class InstrumentState:
+    """Trading state for one symbol on one account; ``lock`` serializes its alerts"""
 
-def make_api_request(method, endpoint, payload='', params=None) -> Tuple[bool, Optional[Dict]]:
-    """Enhanced API request with comprehensive error handling"""
-    request_id = f"REQ_{int(time.time() * 1000)}"
-    
-    logger.info(f"🚀 [{request_id}] {method} {endpoint}")
-    
-    timestamp = str(int(time.time()))
-    path = f'/v2{endpoint}'
-    url = f'{BASE_URL}{path}'
+    def __init__(self, account, symbol, product_id, lot_size):
+        self.account = account
+        self.symbol = symbol
+        self.product_id = product_id
+        self.lot_size = lot_size
+        self.current_position = None
+        self.active_orders = {}
+        self.protection = None  # Armed stop-loss / trailing plan, see StopManager
+        self.lock = threading.Lock()
 
-    query_string = ''
-    if params:
-        query_string = '&'.join([f'{k}={v}' for k, v in params.items()])
-        if query_string:
-            query_string = '?' + query_string
+    def snapshot(self):
+        return {
+            "account": self.account,
+            "symbol": self.symbol,
+            "product_id": self.product_id,
+            "current_position": self.current_position,
+            "active_orders": len(self.active_orders),
+            "protected": self.protection is not None,
+            "busy": self.lock.locked()
+        }
 
-    signature_data = method + timestamp + path + query_string + payload
-    
-    try:
-        signature = generate_signature(API_SECRET, signature_data)
-    except Exception as e:
-        logger.error(f"❌ [{request_id}] Signature generation failed: {str(e)}")
-        return False, {"error": "Signature generation failed", "details": str(e)}
+def get_instrument_state(symbol=SYMBOL, account=DEFAULT_ACCOUNT):
+    """Return (creating on first use) the state for a configured symbol/account pair"""
+    if symbol not in INSTRUMENTS:
+        raise ValueError(f"Unknown symbol: {symbol}")
+    if account not in ACCOUNTS:
+        raise ValueError(f"Unknown account: {account}")
 
-    headers = {
-        'api-key': API_KEY,
-        'timestamp': timestamp,
-        'signature': signature,
-        'User-Agent': 'delta-trading-bot/4.0',
-        'Content-Type': 'application/json'
-    }
+    key = (account, symbol)
+    state = instrument_states.get(key)
+    if state is None:
+        with _instrument_states_lock:
+            state = instrument_states.get(key)
+            if state is None:
+                instrument = INSTRUMENTS[symbol]
+                state = InstrumentState(account, symbol, instrument['product_id'],
+                                        instrument.get('lot_size', LOT_SIZE))
+                instrument_states[key] = state
+    return state
 
-    # Retry mechanism
-    for attempt in range(MAX_RETRIES):
-        try:
-            logger.info(f"🔄 [{request_id}] Attempt {attempt + 1}/{MAX_RETRIES}")
-            
-            if method == 'GET':
-                response = requests.get(url, headers=headers, params=params, timeout=REQUEST_TIMEOUT)
-            elif method == 'POST':
-                response = requests.post(url, headers=headers, data=payload, timeout=REQUEST_TIMEOUT)
-            elif method == 'DELETE':
-                response = requests.delete(url, headers=headers, data=payload, timeout=REQUEST_TIMEOUT)
-            else:
-                logger.error(f"❌ [{request_id}] Unsupported method: {method}")
-                return False, {"error": "Unsupported HTTP method"}
+class SharedStateStore:
+    """Instrument state shared by all worker processes through STATE_DIR.
 
-            logger.info(f"📥 [{request_id}] Status: {response.status_code}")
-            
-            if response.status_code == 200:
-                try:
-                    response_data = response.json()
-                    logger.info(f"✅ [{request_id}] Request successful")
-                    return True, response_data
-                except json.JSONDecodeError as e:
-                    logger.error(f"❌ [{request_id}] JSON decode error: {str(e)}")
-                    return False, {"error": "Invalid JSON response", "raw_response": response.text}
-            
-            else:
-                error_data = {
-                    "statuscode": response.status_code,
-                    "reason": response.reason,
-                    "rawresponse": response.text
-                }
-                
-                try:
-                    error_json = response.json()
-                    error_data.update(error_json)
-                except:
-                    pass
-                
-                logger.error(f"❌ [{request_id}] HTTP Error {response.status_code}: {response.text}")
-                
-                # Don't retry on client errors (4xx)
-                if 400 <= response.status_code < 500:
-                    return False, error_data
-                
-                # Retry on server errors (5xx)
-                if attempt < MAX_RETRIES - 1:
-                    logger.warning(f"⏳ [{request_id}] Retrying in {RETRY_DELAY}s...")
-                    time.sleep(RETRY_DELAY)
-                    continue
-                
-                return False, error_data
+    ``hold(state)`` flock()s a per-instrument lock file for the whole alert
+    and loads current_position / active_orders / protection from SQLite,
+    writing them back on exit. Whichever worker runs the next alert for that
+    instrument sees what the previous one left behind.
+    """
 
-        except requests.exceptions.Timeout as e:
-            logger.error(f"⏰ [{request_id}] Timeout error: {str(e)}")
-            if attempt < MAX_RETRIES - 1:
-                time.sleep(RETRY_DELAY)
-                continue
-            return False, {"error": "Request timeout", "details": str(e)}
+    def __init__(self, state_dir):
+        if fcntl is None:
+            raise RuntimeError("Shared worker state needs fcntl (POSIX)")
+        os.makedirs(state_dir, exist_ok=True)
+        self.state_dir = state_dir
+        self.db_path = os.path.join(state_dir, 'instruments.sqlite3')
+        self.lock = threading.Lock()
+        self.db = None
 
-        except requests.exceptions.ConnectionError as e:
-            logger.error(f"🔌 [{request_id}] Connection error: {str(e)}")
-            if attempt < MAX_RETRIES - 1:
-                time.sleep(RETRY_DELAY)
-                continue
-            return False, {"error": "Connection error", "details": str(e)}
+    def _connect(self):
+        # Opened lazily so each worker process gets its own connection after fork
+        if self.db is None:
+            self.db = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS instrument_state (account TEXT, symbol TEXT, "
+                            "current_position TEXT, active_orders TEXT, updated_at REAL, protection TEXT, "
+                            "PRIMARY KEY (account, symbol))")
+            columns = [row[1] for row in self.db.execute("PRAGMA table_info(instrument_state)")]
+            if 'protection' not in columns:
+                self.db.execute("ALTER TABLE instrument_state ADD COLUMN protection TEXT")
+        return self.db
 
-        except Exception as e:
-            logger.error(f"💥 [{request_id}] Unexpected error: {str(e)}")
-            if attempt < MAX_RETRIES - 1:
-                time.sleep(RETRY_DELAY)
-                continue
-            return False, {"error": "Unexpected error", "details": str(e)}
+    def hold(self, state):
+        return _SharedStateLease(self, state)
 
-    return False, {"error": "Max retries exceeded"}
+    def load(self, state):
+        with self.lock:
+            row = self._connect().execute(
+                "SELECT current_position, active_orders, protection FROM instrument_state "
+                "WHERE account = ? AND symbol = ?", (state.account, state.symbol)).fetchone()
+        if row:
+            state.current_position = row[0]
+            state.active_orders = {order_id: order for order_id, order in json.loads(row[1])}
+            state.protection = _merge_protection(json.loads(row[2]) if row[2] else None, state.protection)
 
-def cancel_all_orders():
-    """Cancel all open orders using Delta Exchange API"""
-    try:
-        log_and_notify("❎ Cancelling all open orders...")
-        
-        # Use the correct Delta Exchange API format
-        payload = json.dumps({
-            "product_id": PRODUCT_ID,
-            "cancel_limit_orders": "true",
-            "cancel_stop_orders": "true",
-            "cancel_reduce_only_orders": "true"
-        })
-        
-        success, result = make_api_request('DELETE', '/orders/all', payload)
-        
-        if success and result and result.get('success'):
-            log_and_notify("✅ All open orders cancelled successfully.")
-            return True
-        else:
-            error_details = result.get('error', result) if result else 'No response'
-            log_and_notify(f"⚠️ Cancel orders response: {error_details}", level="warning")
-            return False
-            
-    except Exception as e:
-        log_and_notify(f"❌ ERROR cancelling orders: {str(e)}", level="error")
+    def save(self, state):
+        # Orders are stored as pairs so integer order ids survive the JSON round-trip
+        active_orders = json.dumps(list(state.active_orders.items()))
+        protection = json.dumps(state.protection) if state.protection else None
+        with self.lock:
+            self._connect().execute("INSERT OR REPLACE INTO instrument_state VALUES (?, ?, ?, ?, ?, ?)",
+                                    (state.account, state.symbol, state.current_position, active_orders,
+                                     time.time(), protection))
+
+    def reset(self):
+        self.db = None
+
+class _SharedStateLease:
+    def __init__(self, store, state):
+        self.store = store
+        self.state = state
+        self.lock_file = None
+
+    def __enter__(self):
+        path = os.path.join(self.store.state_dir, f"{self.state.account}-{self.state.symbol}.lock")
+        self.lock_file = open(path, 'a')
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        try:
+            self.store.load(self.state)
+        except Exception:
+            self._release()
+            raise
+        return self.state
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.store.save(self.state)
+        except Exception as e:
+            logger.error(f"❌ Failed to save shared state for {self.state.symbol}: {str(e)}")
+        finally:
+            self._release()
         return False
 
-def place_stop_market_order(side, trigger_price, size, request_id=None):
-    """Place stop-market order (Delta Exchange compatible)"""
-    try:
-        contracts = max(1, int(size * 1000))  # Convert BTC to contracts
-        trigger_price = float(trigger_price)
-        formatted_trigger = f"{trigger_price:.1f}"  # Delta uses 0.5 tick size
-        
-        # Ensure price is aligned to tick size (0.5)
-        aligned_price = round(trigger_price * 2) / 2
-        formatted_trigger = f"{aligned_price:.1f}"
-        
-        order_data = {
-            "product_id": PRODUCT_ID,
-            "size": contracts,
-            "side": side.lower(),
-            "order_type": "market_order",
-            "stop_order_type": "stop_loss_order",
-            "stop_price": formatted_trigger,
-            "stop_trigger_method": "last_traded_price"
-        }
+    def _release(self):
+        fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+        self.lock_file.close()
 
-        log_and_notify(f"📈 Placing {side.upper()} STOP-MARKET order\n"
-                      f"🔫 Trigger: ${formatted_trigger}\n"
-                      f"📏 Size: {size} BTC ({contracts} contracts)", 
-                      request_id=request_id)
+def _merge_protection(saved, local):
+    """Saved plan, keeping the best price and last edit this process has seen for the same plan.
 
-        payload = json.dumps(order_data)
-        success, result = make_api_request('POST', '/orders', payload)
+    Only the worker running the ticker stream ratchets best_price between
+    leases, a reload must not roll that progress back.
+    """
+    if not saved or not local or saved.get("armed_at") != local.get("armed_at"):
+        return saved
+    merged = dict(saved, last_edit=max(saved["last_edit"], local["last_edit"]))
+    prices = [price for price in (saved["best_price"], local["best_price"]) if price is not None]
+    if prices:
+        merged["best_price"] = max(prices) if saved["side"] == 'long' else min(prices)
+    return merged
 
-        if success and result and result.get('success'):
-            order_id = result['result']['id']
-            order_state = result['result'].get('state', 'unknown')
-            
-            log_and_notify(
-                f"✅ {side.upper()} STOP-MARKET ORDER PLACED\n"
-                f"🆔 Order ID: {order_id}\n"
-                f"🔫 Trigger: ${formatted_trigger}\n"
-                f"📏 Size: {contracts} contracts\n"
-                f"📊 State: {order_state}",
-                request_id=request_id
-            )
-            return order_id
-        else:
-            error_details = result if result else 'No response'
-            error_msg = f"❌ FAILED TO PLACE {side.upper()} ORDER\n" \
-                       f"🚨 Error: Unknown error\n" \
-                       f"📋 Full Response: {json.dumps(error_details, indent=2)}"
-            log_and_notify(error_msg, "error", request_id=request_id)
-            return None
+shared_state = SharedStateStore(STATE_DIR) if STATE_DIR else None
 
-    except Exception as e:
-        error_msg = f"❌ STOP-MARKET ORDER ERROR\n" \
-                   f"🚨 Error: {str(e)}"
-        log_and_notify(error_msg, "error", request_id=request_id)
-        return None
+class hold_instrument:
+    """``with hold_instrument(state):`` takes the instrument's lock and, with STATE_DIR, its shared lease"""
 
-def place_market_order(side, size, request_id=None):
-    """Place immediate market order"""
-    try:
-        contracts = max(1, int(size * 1000))
-        
-        order_data = {
-            "product_id": PRODUCT_ID,
-            "size": contracts,
-            "side": side.lower(),
-            "order_type": "market_order"
-        }
-        
-        log_and_notify(f"⚡ Placing {side.upper()} MARKET order\n"
-                      f"📏 Size: {size} BTC ({contracts} contracts)", 
-                      request_id=request_id)
+    def __init__(self, state):
+        self.state = state
+        self.lease = None
 
-        payload = json.dumps(order_data)
-        success, result = make_api_request('POST', '/orders', payload)
+    def __enter__(self):
+        self.state.lock.acquire()
+        try:
+            if shared_state is not None:
+                self.lease = shared_state.hold(self.state)
+                self.lease.__enter__()
+        except Exception:
+            self.state.lock.release()
+            raise
+        return self.state
 
-        if success and result and result.get('success'):
-            order_id = result['result']['id']
-            order_state = result['result'].get('state', 'unknown')
-            filled_size = result['result'].get('size', 0)
-            avg_price = result['result'].get('average_fill_price', 'N/A')
-            
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self.lease is not None:
+                self.lease.__exit__(exc_type, exc, tb)
+        finally:
+            self.state.lock.release()
+        return False
+
+class ServiceLeader:
+    """Elects the one worker process that runs a service for everyone sharing STATE_DIR.
+
+    Leadership is an exclusive flock() on ``<name>.lock``; the kernel drops it
+    when the leader exits, and a follower blocked in wait() takes over.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lock_file = None
+
+    def acquire(self, blocking=False):
+        """True when this process leads (always when STATE_DIR is unset)"""
+        if shared_state is None:
+            return True
+        self.lock_file = open(os.path.join(shared_state.state_dir, f'{self.name}.lock'), 'a')
+        try:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            self.lock_file.close()
+            self.lock_file = None
+            return False
+
+    def run(self, start):
+        """Call ``start`` now if this process leads, else once it takes over; returns whether it ran now"""
+        if self.acquire():
+            start()
+            return True
+        threading.Thread(target=self._start_when_leader, args=(start,), name=f"{self.name}-leader",
+                         daemon=True).start()
+        return False
+
+    def _start_when_leader(self, start):
+        self.acquire(blocking=True)
+        logger.info(f"👑 Worker {os.getpid()} took over {self.name.replace('_', ' ')}")
+        start()
+
+class OrderJournal:
+    """Append-only journal of instrument state changes for crash recovery.
+
+    ``record(state)`` diffs an instrument against what was last journaled and
+    queues the difference as idempotent events (position, order_open,
+    order_closed). A background thread appends them to SQLite (WAL) in
+    batches, and every ``compact_every`` events folds the log into a
+    snapshot table and truncates it so replay stays short.
+    """
+
+    def __init__(self, path, compact_every=JOURNAL_COMPACT_EVERY):
+        self.path = path
+        self.compact_every = compact_every
+        self.events = queue.Queue()
+        self.journaled = {}  # (account, symbol) -> (current_position, active_orders) as last recorded
+        self.lock = threading.Lock()
+        self.db_lock = threading.Lock()
+        self.db = None
+        self.thread = None
+        self.since_compaction = 0
+        self.counters = {"recorded": 0, "written": 0, "compactions": 0, "failed": 0}
+
+    def _connect(self):
+        if self.db is None:
+            self.db = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS journal (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                            "ts REAL, account TEXT, symbol TEXT, event TEXT, data TEXT)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS journal_snapshot (account TEXT, symbol TEXT, "
+                            "current_position TEXT, active_orders TEXT, PRIMARY KEY (account, symbol))")
+        return self.db
+
+    def start(self):
+        """Start the writer thread (idempotent)"""
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._worker, name="order-journal", daemon=True)
+                self.thread.start()
+
+    def record(self, state):
+        """Queue whatever changed on ``state`` since it was last journaled"""
+        key = (state.account, state.symbol)
+        current_position = state.current_position
+        active_orders = {order_id: dict(order) for order_id, order in state.active_orders.items()}
+        now = time.time()
+
+        with self.lock:
+            journaled_position, journaled_orders = self.journaled.get(key, (None, {}))
+            events = []
+            if current_position != journaled_position:
+                events.append(("position", {"current_position": current_position}))
+            for order_id, order in active_orders.items():
+                if journaled_orders.get(order_id) != order:
+                    events.append(("order_open", {"order_id": order_id, "order": order}))
+            for order_id in journaled_orders:
+                if order_id not in active_orders:
+                    events.append(("order_closed", {"order_id": order_id}))
+            self.journaled[key] = (current_position, active_orders)
+            self.counters["recorded"] += len(events)
+
+        if events:
+            self.start()
+            for event, data in events:
+                self.events.put((now, state.account, state.symbol, event, json.dumps(data)))
+        return len(events)
+
+    def replay(self):
+        """Fold snapshot and journal into {(account, symbol): {current_position, active_orders}}"""
+        with self.db_lock:
+            db = self._connect()
+            db.execute("BEGIN")
+            try:
+                states, _, pending = self._fold(db)
+            finally:
+                db.execute("COMMIT")
+        with self.lock:
+            for key, saved in states.items():
+                self.journaled[key] = (saved["current_position"], dict(saved["active_orders"]))
+            self.since_compaction = pending
+        return states
+
+    def compact(self):
+        """Fold the journal into the snapshot table and drop the folded events"""
+        with self.db_lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                states, last_seq, _ = self._fold(db)
+                db.executemany("INSERT OR REPLACE INTO journal_snapshot VALUES (?, ?, ?, ?)",
+                               [(account, symbol, saved["current_position"],
+                                 json.dumps(list(saved["active_orders"].items())))
+                                for (account, symbol), saved in states.items()])
+                db.execute("DELETE FROM journal WHERE seq <= ?", (last_seq,))
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        self.since_compaction = 0
+        self.counters["compactions"] += 1
+
+    def _fold(self, db):
+        states = {}
+        for account, symbol, current_position, active_orders in db.execute(
+                "SELECT account, symbol, current_position, active_orders FROM journal_snapshot"):
+            # Orders are stored as pairs so integer order ids survive the JSON round-trip
+            states[(account, symbol)] = {"current_position": current_position,
+                                         "active_orders": {order_id: order
+                                                           for order_id, order in json.loads(active_orders)}}
+        last_seq = 0
+        pending = 0
+        for seq, account, symbol, event, data in db.execute(
+                "SELECT seq, account, symbol, event, data FROM journal ORDER BY seq"):
+            saved = states.setdefault((account, symbol), {"current_position": None, "active_orders": {}})
+            data = json.loads(data)
+            if event == "position":
+                saved["current_position"] = data["current_position"]
+            elif event == "order_open":
+                saved["active_orders"][data["order_id"]] = data["order"]
+            elif event == "order_closed":
+                saved["active_orders"].pop(data["order_id"], None)
+            last_seq = seq
+            pending += 1
+        return states, last_seq, pending
+
+    def flush(self, timeout=5):
+        """Wait until queued events are on disk"""
+        deadline = time.time() + timeout
+        while self.events.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+        return not self.events.unfinished_tasks
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        stats["queue_depth"] = self.events.qsize()
+        return stats
+
+    def _worker(self):
+        while True:
+            batch = [self.events.get()]
+            # Everything that queued up during the last write goes out in one transaction
+            while True:
+                try:
+                    batch.append(self.events.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                with self.db_lock:
+                    db = self._connect()
+                    db.execute("BEGIN")
+                    try:
+                        db.executemany("INSERT INTO journal (ts, account, symbol, event, data) "
+                                       "VALUES (?, ?, ?, ?, ?)", batch)
+                        db.execute("COMMIT")
+                    except Exception:
+                        db.execute("ROLLBACK")
+                        raise
+                self.counters["written"] += len(batch)
+                self.since_compaction += len(batch)
+            except Exception as e:
+                self.counters["failed"] += len(batch)
+                logger.error(f"❌ Order journal write failed: {str(e)}")
+            finally:
+                for _ in batch:
+                    self.events.task_done()
+
+            if self.since_compaction >= self.compact_every:
+                try:
+                    self.compact()
+                except Exception as e:
+                    logger.error(f"❌ Order journal compaction failed: {str(e)}")
+
+if JOURNAL_PATH:
+    order_journal = OrderJournal(os.path.join(STATE_DIR, JOURNAL_PATH) if STATE_DIR else JOURNAL_PATH)
+else:
+    order_journal = None
+
+def journal_state(state):
+    if order_journal is not None:
+        order_journal.record(state)
+
+class RequestSigner:
+    """HMAC-SHA256 signer keyed once; each signature copies the keyed state"""
+
+    __slots__ = ('_keyed',)
+
+    def __init__(self, secret):
+        self._keyed = hmac.new(secret.encode('utf-8'), digestmod=hashlib.sha256)
+
+    def sign(self, message):
+        digest = self._keyed.copy()
+        digest.update(message.encode('utf-8'))
+        return digest.hexdigest()
+
+_signers = {}
+
+def get_signer(secret):
+    """Cached signer for an API secret"""
+    signer = _signers.get(secret)
+    if signer is None:
+        signer = _signers[secret] = RequestSigner(secret)
+    return signer
+
+def generate_signature(secret, message):
+    """Generate HMAC signature for Delta Exchange API"""
+    try:
+        return get_signer(secret).sign(message)
+    except Exception as e:
+        logger.error(f"❌ Signature generation failed: {str(e)}")
+        raise
+
+_header_templates = {}
+
+def signed_headers(account, credentials, timestamp, signature):
+    """Copy the account's static header template and add the per-request fields"""
+    template = _header_templates.get(account)
+    if template is None or template['api-key'] != credentials['api_key']:
+        template = _header_templates[account] = {
+            'api-key': credentials['api_key'],
+            'User-Agent': 'delta-trading-bot/4.0',
+            'Content-Type': 'application/json'
+        }
+    headers = template.copy()
+    headers['timestamp'] = timestamp
+    headers['signature'] = signature
+    return headers
+
+class OrderPayloadTemplate:
+    """Pre-serialized JSON for one product/side/order kind; only size, stop price and client id vary"""
+
+    __slots__ = ('prefix', 'stop')
+
+    def __init__(self, product_id, side, stop=False, reduce_only=False):
+        fixed = {"product_id": product_id, "side": side, "order_type": "market_order"}
+        if stop:
+            fixed["stop_order_type"] = "stop_loss_order"
+            fixed["stop_trigger_method"] = "last_traded_price"
+        if reduce_only:
+            fixed["reduce_only"] = True
+        self.prefix = json.dumps(fixed)[:-1]
+        self.stop = stop
+
+    def render(self, contracts, client_order_id, stop_price=None):
+        # contracts is an int, stop_price a tick-aligned decimal string and client_order_id hex,
+        # so none of them need JSON escaping
+        if self.stop:
+            return (f'{self.prefix}, "size": {int(contracts)}, "stop_price": "{stop_price}", '
+                    f'"client_order_id": "{client_order_id}"}}')
+        return f'{self.prefix}, "size": {int(contracts)}, "client_order_id": "{client_order_id}"}}'
+
+_order_templates = {}
+
+def build_order_payload(product_id, side, contracts, client_order_id, stop_price=None, reduce_only=False):
+    """JSON body for a market (or, with stop_price, stop-market) order"""
+    key = (product_id, side, stop_price is not None, reduce_only)
+    template = _order_templates.get(key)
+    if template is None:
+        template = _order_templates[key] = OrderPayloadTemplate(product_id, side, stop=stop_price is not None,
+                                                                reduce_only=reduce_only)
+    return template.render(contracts, client_order_id, stop_price)
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by a per-call deadline"""
+
+    def __init__(self, max_attempts=MAX_RETRIES, base_delay=RETRY_DELAY, max_delay=RETRY_MAX_DELAY,
+                 deadline=REQUEST_DEADLINE):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+class CircuitBreaker:
+    """Fails fast after repeated server-side failures on an endpoint, probing again after a cool-down"""
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.time() - self.opened_at >= self.reset_timeout else 'open'
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.probing:
+                # Let exactly one probe through, owned by the calling thread until it is settled
+                self.probing = threading.get_ident()
+                return True
+            return False
+
+    def release(self):
+        """Give back this thread's probe slot if its call ended without recording an outcome"""
+        with self.lock:
+            if self.probing == threading.get_ident():
+                self.probing = False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.time()
+            self.probing = False
+
+circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+def get_circuit_breaker(method, endpoint):
+    key = f"{method} {endpoint_label(endpoint)}"
+    breaker = circuit_breakers.get(key)
+    if breaker is None:
+        with _circuit_breakers_lock:
+            breaker = circuit_breakers.setdefault(key, CircuitBreaker())
+    return breaker
+
+class TokenBucket:
+    """Client-side copy of the exchange's request-weight quota for one account.
+
+    Critical (order) calls may drain the bucket; normal calls must leave
+    RATE_LIMIT_RESERVE_CRITICAL and low-priority calls RATE_LIMIT_RESERVE_LOW
+    untouched, so polling is shed long before order placement is starved.
+    """
+
+    def __init__(self, capacity=RATE_LIMIT_CAPACITY, window=RATE_LIMIT_WINDOW):
+        self.capacity = float(capacity)
+        self.refill_rate = capacity / float(window)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.condition = threading.Condition()
+        self.shed = {priority: 0 for priority in RATE_LIMIT_PRIORITIES}
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_rate)
+        self.updated_at = now
+
+    def _floor(self, priority):
+        if priority == 'critical':
+            return 0.0
+        reserve = RATE_LIMIT_RESERVE_LOW if priority == 'low' else RATE_LIMIT_RESERVE_CRITICAL
+        return reserve * self.capacity
+
+    def acquire(self, weight, priority='normal', timeout=None):
+        """Take ``weight`` tokens, waiting up to ``timeout`` seconds; False means the call was shed"""
+        if timeout is None:
+            timeout = RATE_LIMIT_MAX_WAIT[priority]
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens - weight >= self._floor(priority):
+                    self.tokens -= weight
+                    return True
+
+                missing = weight + self._floor(priority) - self.tokens
+                wait = max(self.blocked_until - now, missing / self.refill_rate, 0.001)
+                if now + wait > deadline:
+                    self.shed[priority] += 1
+                    return False
+                self.condition.wait(wait)
+
+    def sync(self, remaining=None, reset_seconds=None):
+        """Align with the exchange's view from rate-limit response headers"""
+        with self.condition:
+            self._refill(time.monotonic())
+            if remaining is not None:
+                self.tokens = min(self.tokens, float(remaining))
+            if reset_seconds is not None:
+                self.tokens = 0.0
+                self.blocked_until = max(self.blocked_until, time.monotonic() + reset_seconds)
+            self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            self._refill(time.monotonic())
+            return {"tokens": round(self.tokens, 1), "capacity": self.capacity, "shed": dict(self.shed)}
+
+# Each worker process meters its share of the account quota
+rate_limiters = {account: TokenBucket(capacity=RATE_LIMIT_CAPACITY / max(1, WEB_WORKERS)) for account in ACCOUNTS}
+_request_priority = threading.local()
+
+class request_priority:
+    """Context manager tagging exchange calls made by the current thread with a priority"""
+
+    def __init__(self, priority):
+        self.priority = priority
+
+    def __enter__(self):
+        self.previous = getattr(_request_priority, 'value', None)
+        _request_priority.value = self.priority
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _request_priority.value = self.previous
+        return False
+
+def endpoint_weight(method, endpoint):
+    return ENDPOINT_WEIGHTS.get((method, endpoint_label(endpoint)), DEFAULT_ENDPOINT_WEIGHT)
+
+def _sync_rate_limit(account, response):
+    """Feed X-RATE-LIMIT-* headers back into the account's bucket"""
+    remaining = response.headers.get('X-RATE-LIMIT-REMAINING')
+    try:
+        remaining = float(remaining) if remaining is not None else None
+    except ValueError:
+        remaining = None
+    reset_seconds = _rate_limit_delay(response) if response.status_code == 429 else None
+    if remaining is not None or reset_seconds is not None:
+        rate_limiters[account].sync(remaining, reset_seconds)
+
+def new_client_order_id():
+    """Unique id attached to every new order so ambiguous POSTs can be checked before resending"""
+    return uuid.uuid4().hex  # Delta allows up to 32 characters
+
+def _rate_limit_delay(response):
+    """Seconds until the exchange quota resets, from X-RATE-LIMIT-RESET (ms) or Retry-After (s)"""
+    reset_ms = response.headers.get('X-RATE-LIMIT-RESET')
+    try:
+        if reset_ms is not None:
+            return max(0.0, float(reset_ms) / 1000.0)
+        return max(0.0, float(response.headers.get('Retry-After', 1)))
+    except (TypeError, ValueError):
+        return 1.0
+
+def find_order_by_client_id(client_order_id, account=DEFAULT_ACCOUNT):
+    """Look up an order by client_order_id: (True, order), (True, None) if absent, (False, None) if unknown"""
+    success, result = make_api_request('GET', f'/orders/client_order_id/{client_order_id}',
+                                       account=account, retry_policy=RetryPolicy(max_attempts=2))
+    if success and result and result.get('success'):
+        return True, result.get('result')
+    if result and result.get('statuscode') == 404:
+        return True, None
+    return False, None
+
+def make_api_request(method, endpoint, payload='', params=None, account=DEFAULT_ACCOUNT,
+                     client_order_id=None, retry_policy=None) -> Tuple[bool, Optional[Dict]]:
+    """Send a Delta v2 call (endpoint without /v2, JSON body string) to the configured exchange backend"""
+    if profiler.current() is None:
+        return exchange.request(method, endpoint, payload, params, account, client_order_id, retry_policy)
+    with profiler.stage(PROFILE_STAGES.get(method, method.lower()), call=f"{method} {endpoint_label(endpoint)}"):
+        return exchange.request(method, endpoint, payload, params, account, client_order_id, retry_policy)
+
+def delta_rest_request(method, endpoint, payload='', params=None, account=DEFAULT_ACCOUNT,
+                       client_order_id=None, retry_policy=None) -> Tuple[bool, Optional[Dict]]:
+    """Enhanced API request with comprehensive error handling, signed with the account's keys.
+
+    Retries 5xx, 429 and network errors with jittered backoff inside the
+    policy's deadline. When ``client_order_id`` is given (order creation),
+    an ambiguous failure is resolved by looking the order up before any
+    resend, so a live order is never duplicated.
+    """
+    request_id = f"REQ_{int(time.time() * 1000)}"
+    policy = retry_policy or DEFAULT_RETRY_POLICY
+    call_start = time.time()
+    
+    logger.info(f"🚀 [{request_id}] {method} {endpoint}")
+
+    credentials = ACCOUNTS.get(account)
+    if not credentials:
+        logger.error(f"❌ [{request_id}] Unknown account: {account}")
+        return False, {"error": "Unknown account", "account": account}
+    
+    path = f'/v2{endpoint}'
+    url = BASE_URL + path
+
+    query_string = ''
+    if params:
+        query_string = '&'.join([f'{k}={v}' for k, v in params.items()])
+        if query_string:
+            query_string = '?' + query_string
+
+    metric_endpoint = endpoint_label(endpoint)
+    signer = get_signer(credentials['api_secret'])
+    signed_prefix = method
+    signed_suffix = path + query_string + payload
+    breaker = get_circuit_breaker(method, endpoint)
+    limiter = rate_limiters[account]
+    weight = endpoint_weight(method, endpoint)
+    priority = getattr(_request_priority, 'value', None) or ('normal' if method == 'GET' else 'critical')
+    session = get_http_session()
+    ambiguous = False
+    last_error = {"error": "Max retries exceeded"}
+
+    # Retry mechanism; a probe slot taken from the breaker is always given back
+    try:
+        for attempt in range(policy.max_attempts):
+            if ambiguous and client_order_id:
+                # The previous attempt may have created the order; check before resending
+                lookup_ok, order = find_order_by_client_id(client_order_id, account)
+                if not lookup_ok:
+                    logger.error(f"❓ [{request_id}] Order {client_order_id} state unknown, not resending")
+                    return False, {"error": "Order state unknown", "client_order_id": client_order_id}
+                if order:
+                    logger.info(f"🔎 [{request_id}] Order {client_order_id} already live, not resending")
+                    return True, {"success": True, "result": order}
+
+            remaining = policy.deadline - (time.time() - call_start)
+            if remaining <= 0:
+                break
+
+            if not limiter.acquire(weight, priority, timeout=min(RATE_LIMIT_MAX_WAIT[priority], remaining)):
+                logger.warning(f"🚦 [{request_id}] Local rate limit: shed {priority} {method} {metric_endpoint}")
+                EXCHANGE_ERRORS.inc(method=method, endpoint=metric_endpoint, kind='rate_limited_locally')
+                return False, {"error": "Rate limited locally", "priority": priority}
+            # Only ask the breaker once the call will really be sent, so a shed call never holds the probe slot
+            if not breaker.allow():
+                logger.error(f"🚫 [{request_id}] Circuit open for {method} {metric_endpoint}, failing fast")
+                EXCHANGE_ERRORS.inc(method=method, endpoint=metric_endpoint, kind='circuit_open')
+                return False, {"error": "Circuit open", "endpoint": metric_endpoint}
+            remaining = policy.deadline - (time.time() - call_start)
+
+            # Sign per attempt so the timestamp stays fresh across backoff sleeps
+            timestamp = str(int(time.time()))
+            try:
+                with SIGNATURE_DURATION.time():
+                    signature = signer.sign(signed_prefix + timestamp + signed_suffix)
+            except Exception as e:
+                logger.error(f"❌ [{request_id}] Signature generation failed: {str(e)}")
+                return False, {"error": "Signature generation failed", "details": str(e)}
+
+            headers = signed_headers(account, credentials, timestamp, signature)
+            timeout = tuple(max(MIN_ATTEMPT_TIMEOUT, min(limit, remaining)) for limit in REQUEST_TIMEOUT)
+            retry_delay = policy.backoff(attempt)
+
+            _request_timing.connect_time = 0.0
+            attempt_start = time.perf_counter()
+
+            try:
+                logger.debug("🔄 [%s] Attempt %d/%d", request_id, attempt + 1, policy.max_attempts)
+            
+                if method == 'GET':
+                    response = session.get(url, headers=headers, params=params, timeout=timeout)
+                elif method == 'POST':
+                    response = session.post(url, headers=headers, data=payload, timeout=timeout)
+                elif method == 'PUT':
+                    response = session.put(url, headers=headers, data=payload, timeout=timeout)
+                elif method == 'DELETE':
+                    response = session.delete(url, headers=headers, data=payload, timeout=timeout)
+                else:
+                    logger.error(f"❌ [{request_id}] Unsupported method: {method}")
+                    return False, {"error": "Unsupported HTTP method"}
+
+                _sync_rate_limit(account, response)
+                outcome = 'ok' if response.status_code == 200 else f'http_{response.status_code // 100}xx'
+                EXCHANGE_REQUEST_DURATION.observe(time.perf_counter() - attempt_start, method=method,
+                                                  endpoint=metric_endpoint, attempt=attempt + 1, outcome=outcome)
+
+                # elapsed covers connect + send + server time until headers arrive
+                connect_time = getattr(_request_timing, 'connect_time', 0.0)
+                server_time = max(0.0, response.elapsed.total_seconds() - connect_time)
+                logger.info(f"📥 [{request_id}] Status: {response.status_code} "
+                            f"(connect: {connect_time * 1000:.1f}ms, server: {server_time * 1000:.1f}ms)")
+            
+                if response.status_code == 200:
+                    breaker.record_success()
+                    try:
+                        response_data = response.json()
+                        logger.info(f"✅ [{request_id}] Request successful")
+                        return True, response_data
+                    except json.JSONDecodeError as e:
+                        logger.error(f"❌ [{request_id}] JSON decode error: {str(e)}")
+                        return False, {"error": "Invalid JSON response", "raw_response": response.text}
+            
+                else:
+                    error_data = {
+                        "statuscode": response.status_code,
+                        "reason": response.reason,
+                        "rawresponse": response.text
+                    }
+                
+                    try:
+                        error_json = response.json()
+                        error_data.update(error_json)
+                    except:
+                        pass
+                
+                    logger.error(f"❌ [{request_id}] HTTP Error {response.status_code}: {response.text}")
+                    EXCHANGE_ERRORS.inc(method=method, endpoint=metric_endpoint, kind=outcome)
+                    last_error = error_data
+
+                    # Rate limited: the request was rejected, so waiting for the reset and resending is safe
+                    if response.status_code == 429:
+                        breaker.record_success()
+                        retry_delay = max(retry_delay, _rate_limit_delay(response))
+                        if priority == 'low':
+                            return False, error_data
+                
+                    # Don't retry on other client errors (4xx)
+                    elif 400 <= response.status_code < 500:
+                        breaker.record_success()
+                        return False, error_data
+
+                    # Server errors (5xx) may have been applied
+                    else:
+                        breaker.record_failure()
+                        ambiguous = True
+
+            except requests.exceptions.ConnectTimeout as e:
+                # Never reached the exchange, safe to resend
+                logger.error(f"⏰ [{request_id}] Connect timeout: {str(e)}")
+                _record_failed_attempt(method, metric_endpoint, attempt, 'timeout', attempt_start)
+                breaker.record_failure()
+                last_error = {"error": "Request timeout", "details": str(e)}
+
+            except requests.exceptions.Timeout as e:
+                logger.error(f"⏰ [{request_id}] Timeout error: {str(e)}")
+                _record_failed_attempt(method, metric_endpoint, attempt, 'timeout', attempt_start)
+                breaker.record_failure()
+                ambiguous = True
+                last_error = {"error": "Request timeout", "details": str(e)}
+
+            except requests.exceptions.ConnectionError as e:
+                logger.error(f"🔌 [{request_id}] Connection error: {str(e)}")
+                _record_failed_attempt(method, metric_endpoint, attempt, 'connection_error', attempt_start)
+                breaker.record_failure()
+                ambiguous = True
+                last_error = {"error": "Connection error", "details": str(e)}
+
+            except Exception as e:
+                logger.error(f"💥 [{request_id}] Unexpected error: {str(e)}")
+                _record_failed_attempt(method, metric_endpoint, attempt, 'error', attempt_start)
+                breaker.release()
+                ambiguous = True
+                last_error = {"error": "Unexpected error", "details": str(e)}
+
+            if attempt >= policy.max_attempts - 1:
+                break
+            if ambiguous and client_order_id:
+                # Give a request that is still in flight time to land before the lookup
+                retry_delay = max(retry_delay, AMBIGUOUS_SETTLE_DELAY)
+            if time.time() - call_start + retry_delay >= policy.deadline:
+                logger.error(f"⌛ [{request_id}] Deadline of {policy.deadline}s reached, giving up")
+                last_error = dict(last_error, deadline_exceeded=True)
+                break
+
+            logger.warning(f"⏳ [{request_id}] Retrying in {retry_delay:.2f}s...")
+            EXCHANGE_RETRIES.inc(method=method, endpoint=metric_endpoint)
+            time.sleep(retry_delay)
+    finally:
+        breaker.release()
+
+    return False, last_error
+
+def _record_failed_attempt(method, endpoint, attempt, kind, attempt_start):
+    EXCHANGE_REQUEST_DURATION.observe(time.perf_counter() - attempt_start, method=method,
+                                      endpoint=endpoint, attempt=attempt + 1, outcome=kind)
+    EXCHANGE_ERRORS.inc(method=method, endpoint=endpoint, kind=kind)
+
+class ExchangeAdapter:
+    """Backend behind make_api_request.
+
+    Every backend speaks Delta v2: the same endpoints, JSON bodies and
+    result shapes, so the order builders and response handling above don't
+    change with the backend. ``remote`` backends need the network
+    (connection warm-up, the authenticated private stream).
+    """
+
+    name = None
+    remote = True
+
+    def request(self, method, endpoint, payload='', params=None, account=DEFAULT_ACCOUNT,
+                client_order_id=None, retry_policy=None) -> Tuple[bool, Optional[Dict]]:
+        raise NotImplementedError
+
+    def on_price(self, symbol, price):
+        """Mark price update from the ticker stream, only simulated backends use it"""
+
+    def start(self):
+        """Start background work the backend needs (idempotent)"""
+
+class DeltaRestAdapter(ExchangeAdapter):
+    """Delta Exchange REST API at BASE_URL (see delta_rest_request)"""
+
+    name = 'delta'
+
+    def request(self, method, endpoint, payload='', params=None, account=DEFAULT_ACCOUNT,
+                client_order_id=None, retry_policy=None):
+        return delta_rest_request(method, endpoint, payload, params, account, client_order_id, retry_policy)
+
+class PaperExchange(ExchangeAdapter):
+    """In-memory Delta v2 matching engine for paper trading and soak tests.
+
+    Products come from INSTRUMENTS (optional 'tick_size' / 'contract_value'
+    keys, else PAPER_TICK_SIZE / PAPER_CONTRACT_VALUE) unless a product list
+    is given. Market orders fill at
+    once at the symbol's last price. Stop orders rest as ``pending`` until
+    on_price() crosses their trigger, or fill on placement when the price is
+    already through it. Reduce-only orders are trimmed to the position and
+    cancelled when it is flat. Nothing sleeps, signs or touches the network.
+
+    Once started it also stands in for the private stream: order and
+    position changes are applied to the state stores from a background
+    thread, shortly after the REST answer, as the real stream would.
+    """
+
+    name = 'paper'
+    remote = False
+
+    def __init__(self, prices=None, products=None):
+        if products is None:
+            products = [{"id": instrument['product_id'],
+                         "symbol": symbol,
+                         "tick_size": str(instrument.get('tick_size', PAPER_TICK_SIZE)),
+                         "contract_value": str(instrument.get('contract_value', PAPER_CONTRACT_VALUE))}
+                        for symbol, instrument in INSTRUMENTS.items()]
+        self.products = {product["id"]: dict(product) for product in products}
+        self.product_ids = {product["symbol"]: product_id for product_id, product in self.products.items()}
+        self.prices = {}  # product_id -> last price
+        self.orders = {}  # order_id -> resting order
+        self.history = deque(maxlen=PAPER_ORDER_HISTORY)  # Filled/cancelled orders, for client_order_id lookups
+        self.positions = {}  # (account, product_id) -> {"size", "entry_price", "realized_pnl"}
+        self.request_log = []
+        self.fills = 0
+        self.lock = threading.RLock()
+        self._ids = itertools.count(1)
+        self.events = queue.Queue()
+        self.thread = None
+        for symbol, price in (prices or {}).items():
+            self.on_price(symbol, price)
+
+    def request(self, method, endpoint, payload='', params=None, account=DEFAULT_ACCOUNT,
+                client_order_id=None, retry_policy=None):
+        if account not in ACCOUNTS:
+            return False, {"error": "Unknown account", "account": account}
+        logger.debug("📝 [paper] %s %s", method, endpoint)
+        with self.lock:
+            self.request_log.append((method, f'/v2{endpoint}'))
+        return self.dispatch(method, endpoint, payload, params, account)
+
+    def dispatch(self, method, endpoint, payload='', params=None, account=DEFAULT_ACCOUNT):
+        """Apply one v2 call (endpoint without the /v2 prefix) to the book, answers like request()"""
+        try:
+            body = json.loads(payload) if payload else {}
+        except ValueError:
+            return self._error("invalid_json")
+        route = endpoint_label(endpoint.split('?', 1)[0])
+        handler = {
+            ('GET', '/products'): self._list_products,
+            ('GET', '/products/{id}'): self._get_product,
+            ('GET', '/positions'): self._get_position,
+            ('GET', '/positions/margined'): self._list_positions,
+            ('GET', '/orders'): self._list_orders,
+            ('GET', '/orders/client_order_id/{id}'): self._get_by_client_id,
+            ('POST', '/orders'): self._create_order,
+            ('PUT', '/orders'): self._edit_order,
+            ('DELETE', '/orders'): self._cancel_order,
+            ('DELETE', '/orders/all'): self._cancel_all,
+            ('POST', '/orders/batch'): self._batch_create,
+            ('PUT', '/orders/batch'): self._batch_edit,
+            ('DELETE', '/orders/batch'): self._batch_cancel,
+        }.get((method, route))
+        with self.lock:
+            if handler is None:
+                return self._error("not_found", 404)
+            return handler(endpoint, params or {}, body, account)
+
+    def on_price(self, symbol, price):
+        """Move a symbol's price and trigger the stop orders it crosses, in trigger order"""
+        product_id = self.product_ids.get(symbol)
+        if product_id is None:
+            return
+        with self.lock:
+            previous = self.prices.get(product_id)
+            self.prices[product_id] = float(price)
+            triggered = [order for order in self.orders.values()
+                         if order["product_id"] == product_id and self._crossed(order)]
+            # The price passed the nearest triggers first
+            triggered.sort(key=lambda order: float(order["stop_price"]),
+                           reverse=previous is not None and float(price) < previous)
+            for order in triggered:
+                del self.orders[order["id"]]
+                self._fill(order)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._stream_loop, name="paper-stream", daemon=True)
+            self.thread.start()
+            for store in state_stores.values():
+                store.set_live(True)
+
+    def _stream_loop(self):
+        while True:
+            account, message = self.events.get()
+            try:
+                state_stores[account].apply_message(message)
+            except Exception as e:
+                logger.error(f"❌ Paper stream update failed: {str(e)}")
+
+    def _publish_order(self, order, action):
+        if self.thread is not None:
+            self.events.put((order["account"], dict(self._public(order), type="orders", action=action)))
+
+    def _publish_position(self, account, product_id):
+        if self.thread is not None:
+            self.events.put((account, dict(self._position_record(account, product_id), type="positions",
+                                           action="update")))
+
+    def call_count(self):
+        with self.lock:
+            return len(self.request_log)
+
+    def calls(self, since=0):
+        with self.lock:
+            return list(self.request_log[since:])
+
+    def _ok(self, result):
+        return True, {"success": True, "result": result}
+
+    def _error(self, code, status=400):
+        return False, {"statuscode": status, "success": False, "error": {"code": code}}
+
+    def _crossed(self, order):
+        price = self.prices.get(order["product_id"])
+        if price is None or order["state"] != "pending":
+            return False
+        stop = float(order["stop_price"])
+        return price >= stop if order["side"] == "buy" else price <= stop
+
+    def _position(self, account, product_id):
+        return self.positions.setdefault((account, product_id), {"size": 0, "entry_price": None,
+                                                                 "realized_pnl": 0.0})
+
+    def _position_record(self, account, product_id):
+        position = self._position(account, product_id)
+        return {
+            "product_id": product_id,
+            "product_symbol": self.products[product_id]["symbol"],
+            "size": position["size"],
+            "entry_price": None if position["entry_price"] is None else str(position["entry_price"]),
+            "realized_pnl": str(position["realized_pnl"]),
+            "mark_price": str(self.prices.get(product_id)) if product_id in self.prices else None
+        }
+
+    def _fill(self, order):
+        position = self._position(order["account"], order["product_id"])
+        size = order["size"]
+        if order["reduce_only"]:
+            reducible = -position["size"] if order["side"] == "buy" else position["size"]
+            size = min(size, max(0, reducible))
+            if size == 0:
+                order["state"] = "cancelled"
+                self.history.append(order)
+                self._publish_order(order, "delete")
+                return
+        price = self.prices[order["product_id"]]
+        signed = size if order["side"] == "buy" else -size
+        held = position["size"]
+        contract_value = float(self.products[order["product_id"]]["contract_value"])
+
+        if held == 0 or (held > 0) == (signed > 0):
+            position["entry_price"] = (((position["entry_price"] or 0.0) * abs(held) + price * abs(signed))
+                                       / (abs(held) + abs(signed)))
+        else:
+            closed = min(abs(held), abs(signed))
+            position["realized_pnl"] += closed * contract_value * (price - position["entry_price"]) * \
+                (1 if held > 0 else -1)
+            if abs(signed) > abs(held):
+                position["entry_price"] = price
+            elif abs(signed) == abs(held):
+                position["entry_price"] = None
+        position["size"] = held + signed
+
+        order.update(state="closed", size=size, unfilled_size=0, average_fill_price=str(price))
+        self.history.append(order)
+        self.fills += 1
+        self._publish_order(order, "update")
+        self._publish_position(order["account"], order["product_id"])
+
+    def _list_products(self, endpoint, params, body, account):
+        return True, {"success": True, "result": list(self.products.values()), "meta": {"after": None}}
+
+    def _get_product(self, endpoint, params, body, account):
+        product = self.products.get(int(endpoint.rsplit('/', 1)[1]))
+        return self._ok(dict(product)) if product else self._error("not_found", 404)
+
+    def _get_position(self, endpoint, params, body, account):
+        product_id = int(params.get("product_id", 0))
+        if product_id not in self.products:
+            return self._error("invalid_product")
+        return self._ok(self._position_record(account, product_id))
+
+    def _list_positions(self, endpoint, params, body, account):
+        product_ids = {int(value) for value in str(params.get("product_ids", "")).split(",") if value}
+        return self._ok([self._position_record(account, product_id)
+                         for (owner, product_id), position in self.positions.items()
+                         if owner == account and position["size"] and (not product_ids or product_id in product_ids)])
+
+    def _list_orders(self, endpoint, params, body, account):
+        product_ids = {int(value) for value in str(params.get("product_ids", "")).split(",") if value}
+        states = set(str(params.get("states", "open,pending")).split(","))
+        return self._ok([self._public(order) for order in self.orders.values()
+                         if order["account"] == account and order["state"] in states
+                         and (not product_ids or order["product_id"] in product_ids)])
+
+    def _get_by_client_id(self, endpoint, params, body, account):
+        client_order_id = endpoint.rsplit('/', 1)[1]
+        for order in itertools.chain(self.orders.values(), reversed(self.history)):
+            if order["account"] == account and order.get("client_order_id") == client_order_id:
+                return self._ok(self._public(order))
+        return self._error("order_not_found", 404)
+
+    def _create_order(self, endpoint, params, body, account):
+        product_id = body.get("product_id")
+        if product_id not in self.products:
+            return self._error("invalid_product")
+        stop = bool(body.get("stop_order_type"))
+        order = {
+            "id": next(self._ids),
+            "account": account,
+            "product_id": product_id,
+            "product_symbol": self.products[product_id]["symbol"],
+            "size": int(body.get("size", 0)),
+            "unfilled_size": int(body.get("size", 0)),
+            "side": body.get("side"),
+            "order_type": body.get("order_type", "market_order"),
+            "stop_order_type": body.get("stop_order_type"),
+            "stop_price": body.get("stop_price"),
+            "reduce_only": bool(body.get("reduce_only", False)),
+            "client_order_id": body.get("client_order_id"),
+            "state": "pending" if stop else "open",
+            "created_at": time.time(),
+        }
+        if order["size"] <= 0 or order["side"] not in ("buy", "sell") or (stop and order["stop_price"] is None):
+            return self._error("invalid_order")
+        if order["order_type"] != "market_order":
+            return self._error("unsupported_order_type")
+        if not stop and product_id not in self.prices:
+            return self._error("no_price_for_product")
+
+        if not stop or self._crossed(order):
+            self._fill(order)
+        else:
+            self.orders[order["id"]] = order
+            self._publish_order(order, "create")
+        return self._ok(self._public(order))
+
+    def _edit_order(self, endpoint, params, body, account):
+        order = self.orders.get(body.get("id"))
+        if not order or order["account"] != account:
+            return self._error("order_not_found")
+        if "size" in body:
+            order["size"] = order["unfilled_size"] = int(body["size"])
+        if "stop_price" in body:
+            order["stop_price"] = body["stop_price"]
+        if self._crossed(order):
+            del self.orders[order["id"]]
+            self._fill(order)
+        else:
+            self._publish_order(order, "update")
+        return self._ok(self._public(order))
+
+    def _cancel_order(self, endpoint, params, body, account):
+        order = self.orders.get(body.get("id"))
+        if not order or order["account"] != account:
+            return self._error("order_not_found")
+        del self.orders[order["id"]]
+        order["state"] = "cancelled"
+        self.history.append(order)
+        self._publish_order(order, "delete")
+        return self._ok(self._public(order))
+
+    def _cancel_all(self, endpoint, params, body, account):
+        product_id = body.get("product_id")
+        for order in [order for order in self.orders.values()
+                      if order["account"] == account and (product_id is None or order["product_id"] == product_id)]:
+            del self.orders[order["id"]]
+            order["state"] = "cancelled"
+            self.history.append(order)
+            self._publish_order(order, "delete")
+        return True, {"success": True}
+
+    def _batch(self, handler, body, account, product_id=None):
+        results = []
+        for order in body.get("orders", []):
+            if product_id is not None:
+                order = dict(order, product_id=product_id)
+            success, response = handler('', {}, order, account)
+            if not success:
+                return success, response
+            results.append(response["result"])
+        return self._ok(results)
+
+    def _batch_create(self, endpoint, params, body, account):
+        return self._batch(self._create_order, body, account, body.get("product_id"))
+
+    def _batch_edit(self, endpoint, params, body, account):
+        return self._batch(self._edit_order, body, account)
+
+    def _batch_cancel(self, endpoint, params, body, account):
+        return self._batch(self._cancel_order, body, account)
+
+    @staticmethod
+    def _public(order):
+        return {key: value for key, value in order.items() if key != "account"}
+
+def create_exchange(name=EXCHANGE):
+    """Exchange backend by name: 'delta' (REST) or 'paper' (in-memory)"""
+    backends = {'delta': DeltaRestAdapter, 'paper': PaperExchange}
+    if name not in backends:
+        raise ValueError(f"Unknown EXCHANGE: {name}")
+    return backends[name]()
+
+exchange = create_exchange()
+
+class ProductSpec(NamedTuple):
+    """Contract specification used to normalize order sizes and prices"""
+    product_id: int
+    symbol: str
+    tick_size: Decimal
+    contract_value: Decimal
+    min_size: int
+
+def parse_product_spec(product):
+    """Build a ProductSpec from a Delta /products record"""
+    return ProductSpec(
+        product_id=int(product['id']),
+        symbol=product['symbol'],
+        tick_size=Decimal(str(product['tick_size'])),
+        contract_value=Decimal(str(product['contract_value'])),
+        min_size=int(product.get('min_size') or 1)
+    )
+
+class ProductSpecCache:
+    """Product specs indexed by id and symbol, refreshed from /products on a TTL"""
+
+    def __init__(self, ttl=PRODUCT_CACHE_TTL, miss_ttl=PRODUCT_MISS_TTL):
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.lock = threading.Lock()
+        self.by_id = {}
+        self.by_symbol = {}
+        self.misses = {}  # product_id -> time its single-product lookup failed
+        self.loaded_at = None
+        self.thread = None
+
+    def get(self, product_id=None, symbol=None):
+        """O(1) lookup by id or symbol, None when unknown"""
+        if product_id is not None:
+            return self.by_id.get(product_id)
+        return self.by_symbol.get(symbol)
+
+    def refresh(self):
+        """Reload every product spec, returns True on success"""
+        products = []
+        params = {"page_size": PRODUCT_PAGE_SIZE}
+        while True:
+            success, result = make_api_request('GET', '/products', params=params)
+            if not (success and result and result.get('success')):
+                logger.error(f"❌ Product metadata refresh failed: {result}")
+                return False
+            products.extend(result.get('result') or [])
+            after = (result.get('meta') or {}).get('after')
+            if not after:
+                break
+            params = {"page_size": PRODUCT_PAGE_SIZE, "after": after}
+
+        by_id, by_symbol = {}, {}
+        for product in products:
+            try:
+                spec = parse_product_spec(product)
+            except (KeyError, TypeError, ValueError, ArithmeticError):
+                continue
+            by_id[spec.product_id] = spec
+            by_symbol[spec.symbol] = spec
+
+        with self.lock:
+            previous = self.by_id
+            # Swap whole dicts so lock-free readers never see a half-built index
+            self.by_id, self.by_symbol = by_id, by_symbol
+            self.loaded_at = time.time()
+            self.misses = {}
+
+        for product_id, spec in by_id.items():
+            old = previous.get(product_id)
+            if old and old != spec:
+                log_and_notify(f"⚠️ Contract spec changed for {spec.symbol}\n"
+                               f"📏 Tick: {old.tick_size} → {spec.tick_size}\n"
+                               f"📦 Contract value: {old.contract_value} → {spec.contract_value}",
+                               level="warning")
+
+        logger.info(f"📚 Loaded {len(by_id)} product specs")
+        return True
+
+    def load_product(self, product_id):
+        """Fetch and index a single product, used on a cache miss; failures are cached for miss_ttl"""
+        failed_at = self.misses.get(product_id)
+        if failed_at is not None and time.time() - failed_at < self.miss_ttl:
+            return None
+        success, result = make_api_request('GET', f'/products/{product_id}')
+        spec = None
+        if success and result and result.get('success'):
+            try:
+                spec = parse_product_spec(result['result'])
+            except (KeyError, TypeError, ValueError, ArithmeticError):
+                pass
+        if spec is None:
+            with self.lock:
+                self.misses[product_id] = time.time()
+            return None
+        with self.lock:
+            self.misses.pop(product_id, None)
+            by_id, by_symbol = dict(self.by_id), dict(self.by_symbol)
+            by_id[spec.product_id] = spec
+            by_symbol[spec.symbol] = spec
+            self.by_id, self.by_symbol = by_id, by_symbol
+        return spec
+
+    def start(self):
+        """Start the background TTL refresher (idempotent)"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._refresh_loop, name="product-cache", daemon=True)
+            self.thread.start()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.ttl)
+            try:
+                with request_priority('low'):
+                    self.refresh()
+            except Exception as e:
+                logger.error(f"❌ Product cache refresh error: {str(e)}")
+
+product_cache = ProductSpecCache()
+
+def get_product_spec(product_id=PRODUCT_ID):
+    """Spec for an order builder; a cache miss loads just that product once.
+
+    Raises ValueError when the exchange has not supplied a spec, orders are
+    never sized from guessed tick and contract values.
+    """
+    spec = product_cache.get(product_id)
+    if spec is None:
+        spec = product_cache.load_product(product_id)
+    if spec is None:
+        raise ValueError(f"No contract spec available for product {product_id}")
+    return spec
+
+def size_to_contracts(size, spec):
+    """Convert a size in the underlying (e.g. BTC) to a whole number of contracts"""
+    contracts = int(Decimal(str(size)) / spec.contract_value)
+    return max(spec.min_size, contracts)
+
+def contracts_to_size(contracts, spec):
+    return float(Decimal(contracts) * spec.contract_value)
+
+def align_to_tick(price, spec):
+    """Round a price to the nearest tick and format it with the tick's precision"""
+    ticks = (Decimal(str(price)) / spec.tick_size).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
+    return str((ticks * spec.tick_size).quantize(spec.tick_size))
+
+def cancel_all_orders(product_id=PRODUCT_ID, account=DEFAULT_ACCOUNT):
+    """Cancel all open orders for a product using Delta Exchange API"""
+    try:
+        log_and_notify("❎ Cancelling all open orders...")
+        
+        # Use the correct Delta Exchange API format
+        payload = json.dumps({
+            "product_id": product_id,
+            "cancel_limit_orders": "true",
+            "cancel_stop_orders": "true",
+            "cancel_reduce_only_orders": "true"
+        })
+        
+        success, result = make_api_request('DELETE', '/orders/all', payload, account=account)
+        
+        if success and result and result.get('success'):
+            log_and_notify("✅ All open orders cancelled successfully.")
+            return True
+        else:
+            error_details = result.get('error', result) if result else 'No response'
+            log_and_notify(f"⚠️ Cancel orders response: {error_details}", level="warning")
+            return False
+            
+    except Exception as e:
+        log_and_notify(f"❌ ERROR cancelling orders: {str(e)}", level="error")
+        return False
+
+def place_stop_market_order(side, trigger_price, size, request_id=None, product_id=PRODUCT_ID, account=DEFAULT_ACCOUNT,
+                            reduce_only=False):
+    """Place stop-market order (Delta Exchange compatible)"""
+    try:
+        spec = get_product_spec(product_id)
+        contracts = size_to_contracts(size, spec)  # Convert BTC to contracts
+        trigger_price = float(trigger_price)
+        
+        # Ensure price is aligned to the product's tick size
+        formatted_trigger = align_to_tick(trigger_price, spec)
+        
+        client_order_id = new_client_order_id()
+        payload = build_order_payload(product_id, side.lower(), contracts, client_order_id,
+                                      stop_price=formatted_trigger, reduce_only=reduce_only)
+
+        log_and_notify(f"📈 Placing {side.upper()} {spec.symbol} {'STOP-LOSS' if reduce_only else 'STOP-MARKET'} order\n"
+                      f"🔫 Trigger: ${formatted_trigger}\n"
+                      f"📏 Size: {size} ({contracts} contracts)", 
+                      request_id=request_id)
+
+        success, result = make_api_request('POST', '/orders', payload, account=account,
+                                           client_order_id=client_order_id)
+
+        if success and result and result.get('success'):
+            order_id = result['result']['id']
+            order_state = result['result'].get('state', 'unknown')
+            
+            log_and_notify(
+                f"✅ {side.upper()} STOP-MARKET ORDER PLACED\n"
+                f"🆔 Order ID: {order_id}\n"
+                f"🔫 Trigger: ${formatted_trigger}\n"
+                f"📏 Size: {contracts} contracts\n"
+                f"📊 State: {order_state}",
+                request_id=request_id
+            )
+            return order_id
+        else:
+            error_details = result if result else 'No response'
+            error_msg = f"❌ FAILED TO PLACE {side.upper()} ORDER\n" \
+                       f"🚨 Error: Unknown error\n" \
+                       f"📋 Full Response: {json.dumps(error_details, indent=2)}"
+            log_and_notify(error_msg, "error", request_id=request_id)
+            return None
+
+    except Exception as e:
+        error_msg = f"❌ STOP-MARKET ORDER ERROR\n" \
+                   f"🚨 Error: {str(e)}"
+        log_and_notify(error_msg, "error", request_id=request_id)
+        return None
+
+def place_market_order(side, size, request_id=None, product_id=PRODUCT_ID, account=DEFAULT_ACCOUNT):
+    """Place immediate market order"""
+    try:
+        spec = get_product_spec(product_id)
+        contracts = size_to_contracts(size, spec)
+        
+        client_order_id = new_client_order_id()
+        payload = build_order_payload(product_id, side.lower(), contracts, client_order_id)
+        
+        log_and_notify(f"⚡ Placing {side.upper()} {spec.symbol} MARKET order\n"
+                      f"📏 Size: {size} ({contracts} contracts)", 
+                      request_id=request_id)
+
+        success, result = make_api_request('POST', '/orders', payload, account=account,
+                                           client_order_id=client_order_id)
+
+        if success and result and result.get('success'):
+            order_id = result['result']['id']
+            order_state = result['result'].get('state', 'unknown')
+            filled_size = result['result'].get('size', 0)
+            avg_price = result['result'].get('average_fill_price', 'N/A')
+            
             log_and_notify(
                 f"✅ {side.upper()} MARKET ORDER EXECUTED!\n"
                 f"🆔 Order ID: {order_id}\n"
@@ -336,168 +2417,1396 @@ def place_market_order(side, size, request_id=None):
             log_and_notify(error_msg, "error", request_id=request_id)
             return None
 
-    except Exception as e:
-        error_msg = f"❌ MARKET ORDER ERROR\n" \
-                   f"🚨 Error: {str(e)}"
-        log_and_notify(error_msg, "error", request_id=request_id)
-        return None
+    except Exception as e:
+        error_msg = f"❌ MARKET ORDER ERROR\n" \
+                   f"🚨 Error: {str(e)}"
+        log_and_notify(error_msg, "error", request_id=request_id)
+        return None
+
+def edit_order(order_id, product_id=PRODUCT_ID, account=DEFAULT_ACCOUNT, stop_price=None, size=None, request_id=None):
+    """Edit a resting order in place (PUT /orders), returns True on success"""
+    order_data = {"id": order_id, "product_id": product_id}
+    if stop_price is not None:
+        order_data["stop_price"] = stop_price
+    if size is not None:
+        order_data["size"] = size
+
+    success, result = make_api_request('PUT', '/orders', json.dumps(order_data), account=account)
+    if success and result and result.get('success'):
+        return True
+
+    logger.warning(f"⚠️ [{request_id}] Edit of order {order_id} rejected: {result}")
+    return False
+
+def cancel_order(order_id, product_id=PRODUCT_ID, account=DEFAULT_ACCOUNT):
+    """Cancel a single order by id"""
+    payload = json.dumps({"id": order_id, "product_id": product_id})
+    success, result = make_api_request('DELETE', '/orders', payload, account=account)
+    return bool(success and result and result.get('success'))
+
+def _known_open_orders(state):
+    """Open orders for the instrument and whether that list is authoritative.
+
+    With a live private stream the state store is exact for every order it
+    has seen. Orders placed moments ago may not have their create event
+    yet, so tracked orders the store hasn't confirmed are added as well.
+    Without the stream only the orders this bot placed are known, and
+    strays may exist on the exchange.
+    """
+    tracked = [
+        {"id": order_id, "side": order['side'], "trigger_price": order['trigger_price'],
+         "entry": order.get('type') == 'entry'}
+        for order_id, order in list(state.active_orders.items())
+    ]
+    store = state_stores[state.account]
+    if not store.is_live():
+        return False, tracked
+
+    confirmed = [
+        {"id": order['id'], "side": order.get('side'), "trigger_price": order.get('stop_price'),
+         "entry": order.get('stop_order_type') == 'stop_loss_order' and not order.get('reduce_only')}
+        for order in store.get_open_orders(state.product_id)
+    ]
+    confirmed_ids = {order['id'] for order in confirmed}
+    return True, confirmed + [order for order in tracked if order['id'] not in confirmed_ids]
+
+def clear_open_orders(state):
+    """Cancel the instrument's open orders, skipping the round-trip when there are provably none"""
+    authoritative, orders = _known_open_orders(state)
+    if authoritative and not orders:
+        state.active_orders.clear()
+        return True
+
+    cancelled = cancel_all_orders(state.product_id, state.account)
+    if cancelled:
+        state.active_orders.clear()
+    return cancelled
+
+def replace_entry_stop(state, side, trigger_price, size, request_id=None):
+    """Make the instrument's resting entry stop match (side, trigger, size) in as few round-trips as possible.
+
+    - a single resting entry on the same side is edited in place (one PUT, or
+      nothing at all when the stream shows it already matches)
+    - with no open orders (confirmed by the stream) the stop is just created
+    - anything else (side flip, stray orders, failed edit) falls back to
+      cancel-all followed by a fresh placement
+    """
+    spec = get_product_spec(state.product_id)
+    contracts = size_to_contracts(size, spec)
+    formatted_trigger = align_to_tick(trigger_price, spec)
+    authoritative, orders = _known_open_orders(state)
+
+    if len(orders) == 1 and orders[0]['entry'] and orders[0]['side'] == side:
+        resting = orders[0]
+        tracked = state.active_orders.get(resting['id'], {})
+        unchanged = (authoritative and resting['trigger_price'] is not None
+                     and Decimal(str(resting['trigger_price'])) == Decimal(formatted_trigger)
+                     and tracked.get('size') == size)
+
+        if unchanged or edit_order(resting['id'], state.product_id, state.account,
+                                   stop_price=formatted_trigger, size=contracts, request_id=request_id):
+            log_and_notify(f"✏️ {side.upper()} {state.symbol} entry stop {resting['id']} "
+                           f"{'unchanged' if unchanged else 'amended'}\n"
+                           f"🔫 Trigger: ${formatted_trigger}\n"
+                           f"📏 Size: {contracts} contracts",
+                           request_id=request_id)
+            state.active_orders[resting['id']] = {
+                'type': 'entry',
+                'side': side,
+                'trigger_price': trigger_price,
+                'size': size
+            }
+            return resting['id']
+
+    if not (authoritative and not orders):
+        # Side flip, unknown strays or a rejected edit: clear everything first
+        clear_open_orders(state)
+
+    return place_stop_market_order(side, trigger_price, size, request_id, state.product_id, state.account)
+
+def fetch_position_rest(product_id=PRODUCT_ID, account=DEFAULT_ACCOUNT):
+    """Fetch the raw position record for a product over REST"""
+    params = {"product_id": product_id}
+    success, result = make_api_request('GET', '/positions', params=params, account=account)
+    if success and result and result.get('success'):
+        return True, result.get('result')
+    return False, None
+
+def fetch_positions_rest(product_ids=(PRODUCT_ID,), account=DEFAULT_ACCOUNT):
+    """Fetch positions for several products in one call, returns {product_id: position or None}"""
+    params = {"product_ids": ','.join(str(product_id) for product_id in product_ids)}
+    success, result = make_api_request('GET', '/positions/margined', params=params, account=account)
+    if success and result and result.get('success'):
+        positions = {product_id: None for product_id in product_ids}
+        for position in result.get('result') or []:
+            if position.get('product_id') in positions:
+                positions[position['product_id']] = position
+        return True, positions
+    return False, None
+
+def fetch_open_orders_rest(product_ids=(PRODUCT_ID,), account=DEFAULT_ACCOUNT):
+    """Fetch open and pending (untriggered stop) orders for the given products over REST"""
+    params = {"product_ids": ','.join(str(product_id) for product_id in product_ids), "states": "open,pending"}
+    success, result = make_api_request('GET', '/orders', params=params, account=account)
+    if success and result and result.get('success'):
+        return True, result.get('result') or []
+    return False, None
+
+def get_position_data(use_cache=True, product_id=PRODUCT_ID, account=DEFAULT_ACCOUNT):
+    """Get current position data, served from the stream-fed state store when it is live"""
+    try:
+        store = state_stores[account]
+        if use_cache and store.is_live():
+            return store.get_position(product_id)
+
+        success, position_data = fetch_position_rest(product_id, account)
+        if success:
+            store.apply_position(product_id, position_data, sync=False)
+            if position_data and position_data.get('size', 0) != 0:
+                return position_data
+        
+        return None
+        
+    except Exception as e:
+        logger.error(f"❌ Error getting position: {str(e)}")
+        return None
+
+class ExchangeStateStore:
+    """Local copy of one account's positions and open orders, kept current by the private stream"""
+
+    def __init__(self, account):
+        self.account = account
+        self.lock = threading.Lock()
+        self.positions = {}
+        self.orders = {}
+        self.live = False
+        self.last_update = None
+        self.last_resync = None
+        self.updates_applied = 0
+
+    def product_ids(self):
+        return [instrument['product_id'] for instrument in INSTRUMENTS.values()]
+
+    def is_live(self):
+        return self.live
+
+    def set_live(self, live):
+        with self.lock:
+            self.live = live
+
+    def get_position(self, product_id=PRODUCT_ID):
+        """Open position record (copy) or None when flat"""
+        with self.lock:
+            position = self.positions.get(product_id)
+            return dict(position) if position else None
+
+    def get_open_orders(self, product_id=None):
+        with self.lock:
+            return [dict(order) for order in self.orders.values()
+                    if product_id is None or order.get('product_id') == product_id]
+
+    def apply_snapshot(self, positions, orders):
+        """Replace local state with a full REST snapshot ({product_id: position}, [orders])"""
+        with self.lock:
+            self.positions = {product_id: dict(position) for product_id, position in positions.items()
+                              if position and position.get('size', 0) != 0}
+            self.orders = {order['id']: dict(order) for order in orders if 'id' in order}
+            self.last_update = self.last_resync = time.time()
+            self.updates_applied += 1
+            open_order_ids = set(self.orders)
+        _sync_tracked_state(self, open_order_ids=open_order_ids)
+
+    def apply_position(self, product_id, position, sync=True):
+        """Apply a position record; REST readers pass sync=False, they hold the instrument lock already"""
+        with self.lock:
+            if position and position.get('size', 0) != 0:
+                self.positions[product_id] = dict(position)
+            else:
+                self.positions.pop(product_id, None)
+            self.last_update = time.time()
+            self.updates_applied += 1
+        if sync and self.live:
+            _sync_tracked_state(self)
+
+    def apply_order(self, order):
+        order_id = order.get('id')
+        if order_id is None:
+            return
+        finished = order.get('state') in FINAL_ORDER_STATES or order.get('action') == 'delete'
+        with self.lock:
+            if finished:
+                self.orders.pop(order_id, None)
+            else:
+                merged = self.orders.get(order_id, {})
+                merged.update(order)
+                self.orders[order_id] = merged
+            self.last_update = time.time()
+            self.updates_applied += 1
+        _sync_tracked_state(self, closed_order_ids=(order_id,) if finished else ())
+
+    def apply_message(self, message):
+        """Apply one decoded private-channel message"""
+        channel = message.get('type')
+        if channel not in ('orders', 'positions'):
+            return False
+
+        if message.get('action') == 'snapshot':
+            records = message.get('result') or []
+        else:
+            records = [message]
+
+        tracked = self.product_ids()
+        for record in records:
+            product_id = record.get('product_id')
+            if product_id not in tracked:
+                continue
+            if channel == 'orders':
+                self.apply_order(record)
+            else:
+                self.apply_position(product_id, None if record.get('action') == 'delete' else record)
+        return True
+
+    def stats(self):
+        with self.lock:
+            return {
+                "live": self.live,
+                "open_orders": len(self.orders),
+                "open_positions": len(self.positions),
+                "last_update": self.last_update,
+                "last_resync": self.last_resync,
+                "updates_applied": self.updates_applied
+            }
+
+state_stores = {account: ExchangeStateStore(account) for account in ACCOUNTS}
+
+def _sync_tracked_state(store, closed_order_ids=(), open_order_ids=None):
+    """Reconcile the account's instrument states with confirmed exchange state.
+
+    Only orders the exchange reported as finished (or missing from a full
+    snapshot) are dropped, so an order placed moments ago is never removed
+    before its create event arrives. Runs on the stream thread and holds
+    each instrument (lock and, with STATE_DIR, shared lease), so it waits for
+    an alert in flight instead of changing its state underneath it, and
+    other workers see the result. Callers must not hold an instrument lock
+    themselves.
+    """
+    for state in list(instrument_states.values()):
+        if state.account != store.account:
+            continue
+
+        with hold_instrument(state):
+            for order_id in closed_order_ids:
+                state.active_orders.pop(order_id, None)
+            if open_order_ids is not None:
+                for order_id in list(state.active_orders):
+                    if order_id not in open_order_ids:
+                        state.active_orders.pop(order_id, None)
+
+            position = store.get_position(state.product_id)
+            if position:
+                state.current_position = 'long' if position['size'] > 0 else 'short'
+            elif state.current_position in ('long', 'short'):
+                state.current_position = None
+            elif state.current_position in ('long_pending', 'short_pending') and not state.active_orders:
+                state.current_position = None
+            journal_state(state)
+            stop_manager.touch(state)
+
+class PrivateStreamClient:
+    """Subscribes to an account's private orders/positions channels and feeds its state store.
+
+    ``connect`` must return an object with ``send``, ``recv`` and ``close``
+    (websocket-client's ``create_connection`` or ``mock_delta.LocalWebSocketServer.connect``).
+    """
+
+    def __init__(self, store, url=WS_URL, connect=None):
+        self.store = store
+        self.url = url
+        self.connect = connect or (websocket.create_connection if websocket else None)
+        self.thread = None
+        self.running = False
+        self.reconnects = 0
+        self.ws = None
+
+    def start(self):
+        if self.connect is None:
+            logger.warning("⚠️ websocket-client not installed, positions will be read over REST")
+            return False
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name=f"private-stream-{self.store.account}",
+                                           daemon=True)
+            self.thread.start()
+        return True
+
+    def stop(self):
+        self.running = False
+        if self.ws:
+            try:
+                self.ws.close()
+            except Exception:
+                pass
+
+    def _auth_message(self):
+        credentials = ACCOUNTS[self.store.account]
+        timestamp = str(int(time.time()))
+        signature = generate_signature(credentials['api_secret'], 'GET' + timestamp + '/live')
+        return {
+            "type": WS_AUTH_TYPE,
+            "payload": {"api-key": credentials['api_key'], "signature": signature, "timestamp": timestamp}
+        }
+
+    def _subscribe_message(self):
+        symbols = list(INSTRUMENTS)
+        return {
+            "type": "subscribe",
+            "payload": {"channels": [
+                {"name": "orders", "symbols": symbols},
+                {"name": "positions", "symbols": symbols}
+            ]}
+        }
+
+    def resync(self):
+        """Reload positions and open orders over REST after (re)connecting"""
+        account = self.store.account
+        product_ids = self.store.product_ids()
+        positions_ok, positions = fetch_positions_rest(product_ids, account)
+        if not positions_ok:
+            return False
+        orders_ok, orders = fetch_open_orders_rest(product_ids, account)
+        if not orders_ok:
+            return False
+        self.store.apply_snapshot(positions, orders)
+        logger.info(f"🔁 [{account}] State resynced: {len(orders)} open order(s), "
+                    f"{sum(1 for p in positions.values() if p and p.get('size', 0) != 0)} open position(s)")
+        return True
+
+    def _run(self):
+        delay = 1
+        while self.running:
+            try:
+                self.ws = self.connect(self.url, timeout=WS_RECV_TIMEOUT)
+                self.ws.send(json.dumps(self._auth_message()))
+                self.ws.send(json.dumps({"type": "enable_heartbeat"}))
+                self.ws.send(json.dumps(self._subscribe_message()))
+
+                # Subscribe first so no update between snapshot and stream is missed
+                if not self.resync():
+                    raise ConnectionError("REST snapshot resync failed")
+                self.store.set_live(True)
+                logger.info(f"📡 [{self.store.account}] Private order/position stream connected")
+                delay = 1
+
+                while self.running:
+                    message = json.loads(self.ws.recv())
+                    if message.get('type') == 'error' or message.get('success') is False:
+                        raise ConnectionError(f"Stream error: {message}")
+                    self.store.apply_message(message)
+
+            except Exception as e:
+                if self.running:
+                    logger.warning(f"🔌 Private stream disconnected: {str(e)}")
+            finally:
+                self.store.set_live(False)
+                if self.ws:
+                    try:
+                        self.ws.close()
+                    except Exception:
+                        pass
+                    self.ws = None
+
+            if self.running:
+                self.reconnects += 1
+                time.sleep(delay)
+                delay = min(delay * 2, WS_RECONNECT_MAX_DELAY)
+
+private_streams = {account: PrivateStreamClient(store) for account, store in state_stores.items()}
+
+class StopManager:
+    """Attaches and maintains reduce-only protective stops for filled entries.
+
+    Entry alerts carrying ``stop_loss`` and/or ``trail_amount`` arm a plan on
+    the instrument. Position updates (private stream, or a REST poll while it
+    is down) and mark prices (ticker stream) only mark the instrument dirty;
+    one worker then converges the exchange to the plan: place the stop once
+    the position exists, edit it in place when the size or the trail level
+    changes, cancel it once the position is flat. A stop is edited at most
+    every ``min_edit_interval`` seconds, so a burst of ticks collapses into a
+    single edit at the latest level.
+    """
+
+    def __init__(self, min_edit_interval=TRAIL_MIN_EDIT_INTERVAL, poll_interval=MONITOR_POLL_INTERVAL):
+        self.min_edit_interval = min_edit_interval
+        self.poll_interval = poll_interval
+        self.dirty = set()
+        self.deferred = {}  # instrument key -> time its coalesced edit is due
+        self.condition = threading.Condition()
+        self.thread = None
+        self.last_poll = 0.0
+        self.counters = {"placed": 0, "edited": 0, "cancelled": 0, "failed": 0,
+                         "price_updates": 0, "coalesced": 0}
+
+    def start(self):
+        """Start the worker thread (idempotent)"""
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._worker, name="stop-manager", daemon=True)
+                self.thread.start()
+
+    def arm(self, state, side, stop_loss=0, trail_amount=0):
+        """Set the protection plan for an entry (caller holds state.lock)"""
+        if not stop_loss and not trail_amount:
+            state.protection = None
+            return
+        state.protection = {"side": side, "stop_loss": stop_loss, "trail_amount": trail_amount,
+                            "best_price": None, "last_edit": 0.0, "armed_at": time.time()}
+        self.touch(state)
+
+    def disarm(self, state):
+        state.protection = None
+
+    def touch(self, state):
+        """Queue the instrument for a convergence pass if it has a plan or a live stop"""
+        if state.protection is None and _protective_stop(state)[0] is None:
+            return
+        self._mark((state.account, state.symbol))
+
+    def on_price(self, symbol, price):
+        """Ratchet trailing plans on a mark price; only moves worth an edit wake the worker"""
+        for state in list(instrument_states.values()):
+            plan = state.protection
+            if state.symbol != symbol or not plan or not plan["trail_amount"]:
+                continue
+            self.counters["price_updates"] += 1
+            best = plan["best_price"]
+            if best is not None and (price <= best if plan["side"] == 'long' else price >= best):
+                continue
+            plan["best_price"] = price
+
+            _, stop = _protective_stop(state)
+            target = _stop_target(plan)
+            if stop is None or target is None:
+                continue
+            # Cache only, a lookup miss must not cost a REST call on the ticker thread
+            spec = product_cache.get(state.product_id)
+            if spec is None or abs(target - stop["trigger_price"]) >= TRAIL_MIN_STEP_TICKS * float(spec.tick_size):
+                self._mark((state.account, state.symbol))
+
+    def stats(self):
+        with self.condition:
+            stats = dict(self.counters)
+            stats["pending"] = len(self.dirty) + len(self.deferred)
+        return stats
+
+    def _mark(self, key):
+        with self.condition:
+            if key in self.dirty or key in self.deferred:
+                self.counters["coalesced"] += 1
+                return
+            self.dirty.add(key)
+            self.condition.notify()
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                if not self.dirty:
+                    due = min(self.deferred.values(), default=time.time() + self.poll_interval)
+                    self.condition.wait(max(0.0, due - time.time()))
+                now = time.time()
+                keys = set(self.dirty)
+                self.dirty.clear()
+                for key, due in list(self.deferred.items()):
+                    if due <= now:
+                        keys.add(key)
+                        del self.deferred[key]
+
+            if now - self.last_poll >= self.poll_interval:
+                # Without the private stream nobody pushes fills, so protected instruments are polled
+                # (all of them with STATE_DIR, plans armed by other workers only show up under the lease)
+                self.last_poll = now
+                keys.update((state.account, state.symbol) for state in list(instrument_states.values())
+                            if (state.protection is not None or shared_state is not None)
+                            and not state_stores[state.account].is_live())
+
+            for key in keys:
+                try:
+                    retry_at = self._converge(key)
+                except Exception as e:
+                    self.counters["failed"] += 1
+                    logger.error(f"❌ Stop manager error for {key[1]}@{key[0]}: {str(e)}")
+                    continue
+                if retry_at:
+                    with self.condition:
+                        self.deferred[key] = retry_at
+
+    def _converge(self, key):
+        state = instrument_states.get(key)
+        if state is None:
+            return None
+        with hold_instrument(state):
+            try:
+                return self._converge_locked(state)
+            finally:
+                journal_state(state)
+
+    def _converge_locked(self, state):
+        """Bring the exchange stop in line with the plan, returns a retry time when an edit was deferred"""
+        plan = state.protection
+        stop_id, stop = _protective_stop(state)
+        if plan is None and stop_id is None:
+            return None
+
+        with request_priority('critical'):
+            store = state_stores[state.account]
+            if store.is_live():
+                position = store.get_position(state.product_id)
+            else:
+                # A failed lookup must not read as flat, that would cancel a live stop
+                position_ok, position = fetch_position_rest(state.product_id, state.account)
+                if not position_ok:
+                    return time.time() + self.poll_interval
+                store.apply_position(state.product_id, position, sync=False)
+            contracts = int(position['size']) if position else 0
+
+            if contracts == 0:
+                if stop_id is not None and cancel_order(stop_id, state.product_id, state.account):
+                    # Stopped out or closed elsewhere: a leftover reduce-only stop is dead weight
+                    state.active_orders.pop(stop_id, None)
+                    self.counters["cancelled"] += 1
+                if state.current_position not in ('long_pending', 'short_pending'):
+                    state.protection = None
+                return None
+
+            direction = 'long' if contracts > 0 else 'short'
+            if plan is None or plan["side"] != direction:
+                return None
+
+            if plan["best_price"] is None and position.get('entry_price'):
+                plan["best_price"] = float(position['entry_price'])
+            target = _stop_target(plan)
+            if target is None:
+                return None
+
+            spec = get_product_spec(state.product_id)
+            trigger = align_to_tick(target, spec)
+            size = contracts_to_size(abs(contracts), spec)
+            side = 'sell' if direction == 'long' else 'buy'
+
+            if stop_id is None:
+                order_id = place_stop_market_order(side, trigger, size, None, state.product_id, state.account,
+                                                   reduce_only=True)
+                if order_id:
+                    state.active_orders[order_id] = {'type': 'stop_loss', 'side': side,
+                                                     'trigger_price': float(trigger), 'size': size}
+                    plan["last_edit"] = time.time()
+                    self.counters["placed"] += 1
+                return None
+
+            resized = stop.get('size') != size
+            moved = abs(float(trigger) - stop["trigger_price"]) >= TRAIL_MIN_STEP_TICKS * float(spec.tick_size)
+            if not (resized or moved):
+                return None
+            edit_due = plan["last_edit"] + self.min_edit_interval
+            if not resized and time.time() < edit_due:
+                return edit_due
+
+            if edit_order(stop_id, state.product_id, state.account, stop_price=trigger,
+                          size=abs(contracts) if resized else None):
+                state.active_orders[stop_id] = dict(stop, trigger_price=float(trigger), size=size)
+                plan["last_edit"] = time.time()
+                self.counters["edited"] += 1
+                logger.info(f"🛡️ {state.symbol} stop {stop_id} moved to {trigger} ({abs(contracts)} contracts)")
+            else:
+                # Gone on the exchange (triggered or cancelled): forget it, the next pass re-places if needed
+                state.active_orders.pop(stop_id, None)
+                self.counters["failed"] += 1
+        return None
+
+def _protective_stop(state):
+    """(order_id, order) of the instrument's tracked protective stop, or (None, None)"""
+    for order_id, order in list(state.active_orders.items()):
+        if order.get('type') == 'stop_loss':
+            return order_id, order
+    return None, None
+
+def _stop_target(plan):
+    """Stop level for a plan: the fixed stop_loss, ratcheted by the trail behind the best price"""
+    levels = []
+    if plan["stop_loss"]:
+        levels.append(plan["stop_loss"])
+    if plan["trail_amount"] and plan["best_price"] is not None:
+        trail = plan["trail_amount"]
+        levels.append(plan["best_price"] - trail if plan["side"] == 'long' else plan["best_price"] + trail)
+    if not levels:
+        return None
+    return max(levels) if plan["side"] == 'long' else min(levels)
+
+stop_manager = StopManager()
+
+class PublicStreamClient:
+    """Reconnecting subscription to public channels, subclasses pick the channels and handle messages"""
+
+    name = "Public"
+    disabled_feature = "public streams are disabled"
+
+    def __init__(self, url=WS_URL, connect=None):
+        self.url = url
+        self.connect = connect or (websocket.create_connection if websocket else None)
+        self.thread = None
+        self.running = False
+        self.reconnects = 0
+        self.ws = None
+
+    def channels(self):
+        raise NotImplementedError
+
+    def handle(self, message):
+        raise NotImplementedError
+
+    def start(self):
+        if self.connect is None:
+            logger.warning(f"⚠️ websocket-client not installed, {self.disabled_feature}")
+            return False
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name=f"{self.name.lower()}-stream", daemon=True)
+            self.thread.start()
+        return True
+
+    def stop(self):
+        self.running = False
+        if self.ws:
+            try:
+                self.ws.close()
+            except Exception:
+                pass
+
+    def _run(self):
+        delay = 1
+        while self.running:
+            try:
+                self.ws = self.connect(self.url, timeout=WS_RECV_TIMEOUT)
+                self.ws.send(json.dumps({"type": "enable_heartbeat"}))
+                self.ws.send(json.dumps({"type": "subscribe", "payload": {"channels": self.channels()}}))
+                logger.info(f"📡 {self.name} stream connected")
+                delay = 1
+
+                while self.running:
+                    message = json.loads(self.ws.recv())
+                    if message.get('type') == 'error' or message.get('success') is False:
+                        raise ConnectionError(f"Stream error: {message}")
+                    self.handle(message)
+
+            except Exception as e:
+                if self.running:
+                    logger.warning(f"🔌 {self.name} stream disconnected: {str(e)}")
+            finally:
+                if self.ws:
+                    try:
+                        self.ws.close()
+                    except Exception:
+                        pass
+                    self.ws = None
+
+            if self.running:
+                self.reconnects += 1
+                time.sleep(delay)
+                delay = min(delay * 2, WS_RECONNECT_MAX_DELAY)
+
+class TickerStreamClient(PublicStreamClient):
+    """Public v2/ticker subscription that feeds mark prices to the stop manager"""
+
+    name = "Ticker"
+    disabled_feature = "trailing stops are disabled"
+
+    def __init__(self, on_price, url=WS_URL, connect=None):
+        super().__init__(url, connect)
+        self.on_price = on_price
+
+    def channels(self):
+        return [{"name": "v2/ticker", "symbols": list(INSTRUMENTS)}]
+
+    def handle(self, message):
+        if message.get('type') == 'v2/ticker' and message.get('mark_price'):
+            self.on_price(message.get('symbol'), float(message['mark_price']))
+
+def on_mark_price(symbol, price):
+    # A paper exchange fills its stops from the same prices that drive trailing stops
+    exchange.on_price(symbol, price)
+    stop_manager.on_price(symbol, price)
+
+ticker_stream = TickerStreamClient(on_mark_price)
+
+def close_position(product_id=PRODUCT_ID, account=DEFAULT_ACCOUNT):
+    """Close current position with market order"""
+    try:
+        log_and_notify("🔄 Checking for position to close...")
+        
+        # Ask the exchange, a fill from moments ago may not have reached the stream-fed store yet.
+        # A lookup that failed or was shed says nothing about the position, it must not read as flat.
+        position_ok, position = fetch_position_rest(product_id, account)
+        if not position_ok:
+            log_and_notify("❌ Could not read the position, it was not closed", level="error")
+            return False
+        state_stores[account].apply_position(product_id, position, sync=False)
+        if position and position.get('size', 0) != 0:
+            position_size = int(position['size'])
+            side = 'sell' if position_size > 0 else 'buy'
+            size = contracts_to_size(abs(position_size), get_product_spec(product_id))
+            
+            log_and_notify(f"📍 Found position: {position_size} contracts")
+            log_and_notify(f"🚪 Closing position with {side.upper()} market order")
+            
+            order_id = place_market_order(side, size, product_id=product_id, account=account)
+            if order_id:
+                log_and_notify("✅ Position close order placed successfully")
+                return True
+            else:
+                log_and_notify("❌ Failed to place position close order", level="error")
+                return False
+        else:
+            log_and_notify("ℹ️ No open position to close.")
+            return True
+            
+    except Exception as e:
+        log_and_notify(f"❌ ERROR closing position: {str(e)}", level="error")
+        return False
+
+def execute_alert(alert, webhook_id):
+    """Run the exchange side of a validated alert and return a result summary"""
+    state = get_instrument_state(alert['symbol'], alert['account'])
+    # Other worker processes trade the same instruments, take their lock and state too.
+    # An alert's lookups decide what it cancels and closes, they must not be shed like polling.
+    with hold_instrument(state), request_priority('critical'):
+        try:
+            return _execute_alert_locked(state, alert, webhook_id)
+        finally:
+            # Orders placed before a failure must be journaled too
+            journal_state(state)
+
+def _execute_alert_locked(state, alert, webhook_id):
+    alert_type = alert['alert_type']
+    stop_price = alert['stop_price']
+    stop_loss = alert['stop_loss']
+    trail_amount = alert.get('trail_amount', 0)
+    size = alert['size']
+    product_id = state.product_id
+    account = state.account
+    start_time = time.time()
+    order_id = None
+    orders_cancelled = None
+    position_closed = None
+
+    # Process different alert types
+    if alert_type == 'LONG_ENTRY':
+        log_and_notify(f"🟢 {state.symbol} LONG ENTRY SIGNAL\n"
+                      f"🔫 Stop: {stop_price} | 🛑 SL: {stop_loss}", 
+                      request_id=webhook_id)
+        
+        if stop_price > 0:
+            # Amend or replace the resting stop-market buy order
+            order_id = replace_entry_stop(state, 'buy', stop_price, size, webhook_id)
+            if order_id:
+                state.current_position = 'long_pending'
+                state.active_orders[order_id] = {
+                    'type': 'entry',
+                    'side': 'buy',
+                    'trigger_price': stop_price,
+                    'size': size
+                }
+        else:
+            # Place immediate market buy order
+            orders_cancelled = clear_open_orders(state)
+            order_id = place_market_order('buy', size, webhook_id, product_id, account)
+            if order_id:
+                state.current_position = 'long'
+
+        # The stop manager attaches the protective stop once the entry has filled
+        stop_manager.arm(state, 'long', stop_loss, trail_amount)
+
+    elif alert_type == 'SHORT_ENTRY':
+        log_and_notify(f"🔴 {state.symbol} SHORT ENTRY SIGNAL\n"
+                      f"🔫 Stop: {stop_price} | 🛑 SL: {stop_loss}", 
+                      request_id=webhook_id)
+        
+        if stop_price > 0:
+            # Amend or replace the resting stop-market sell order
+            order_id = replace_entry_stop(state, 'sell', stop_price, size, webhook_id)
+            if order_id:
+                state.current_position = 'short_pending'
+                state.active_orders[order_id] = {
+                    'type': 'entry',
+                    'side': 'sell',
+                    'trigger_price': stop_price,
+                    'size': size
+                }
+        else:
+            # Place immediate market sell order
+            orders_cancelled = clear_open_orders(state)
+            order_id = place_market_order('sell', size, webhook_id, product_id, account)
+            if order_id:
+                state.current_position = 'short'
+
+        stop_manager.arm(state, 'short', stop_loss, trail_amount)
+
+    elif alert_type in ['LONG_EXIT', 'SHORT_EXIT']:
+        log_and_notify(f"🚪 {state.symbol} {alert_type.replace('_', ' ')} SIGNAL", 
+                      request_id=webhook_id)
+        stop_manager.disarm(state)
+        orders_cancelled = clear_open_orders(state)
+        position_closed = close_position(product_id, account)
+        state.current_position = None
+        state.active_orders.clear()
+
+    execution_time = time.time() - start_time
+    ALERT_EXECUTION_DURATION.observe(execution_time, alert_type=alert_type, symbol=state.symbol)
+    logger.info(f"✅ [{webhook_id}] Executed {state.symbol} {alert_type} in {execution_time:.3f}s")
+
+    return {
+        "alert_type": alert_type,
+        "symbol": state.symbol,
+        "account": account,
+        "order_id": order_id,
+        "orders_cancelled": orders_cancelled,
+        "position_closed": position_closed,
+        "current_position": state.current_position,
+        "execution_time": execution_time
+    }
+
+class OrderExecutionEngine:
+    """Worker pool that executes queued alerts off the webhook request thread.
+
+    Jobs are queued into one FIFO lane per (account, symbol). A lane is handed
+    to at most one worker at a time, so alerts for the same instrument stay
+    in order while different instruments run in parallel. Whatever piled up
+    in a lane while its previous batch ran is taken as one batch and folded
+    by coalesce_alerts, so a burst of flips only sends its net change.
+    """
+
+    def __init__(self, workers=ORDER_WORKERS, queue_size=JOB_QUEUE_SIZE, history_limit=JOB_HISTORY_LIMIT,
+                 coalesce=COALESCE_ALERTS):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.history_limit = history_limit
+        self.coalesce = coalesce
+        self.jobs = OrderedDict()
+        self.lanes = {}
+        self.queued = 0
+        self.ready_lanes = queue.Queue()
+        self.lock = threading.Lock()
+        self.threads = []
+        self.running = 0
+        self.accepting = True
+        self.released = threading.Event()  # Cleared while startup runs, queued jobs wait for it
+        self.released.set()
+
+    def hold(self):
+        """Keep accepting jobs but run none until release(), used while the process starts"""
+        self.released.clear()
+
+    def release(self):
+        self.released.set()
+
+    def abandon(self, reason):
+        """Stop accepting jobs and fail the queued ones, returns how many were failed"""
+        with self.lock:
+            self.accepting = False
+            abandoned = [job_id for lane in self.lanes.values() for job_id, _ in lane["pending"]]
+            for lane in self.lanes.values():
+                lane["pending"].clear()
+            self.queued -= len(abandoned)
+        for job_id in abandoned:
+            self._update(job_id, status="failed", finished_at=time.time(), error=reason)
+        return len(abandoned)
+
+    def start(self):
+        """Start worker threads (idempotent)"""
+        with self.lock:
+            if self.threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"order-worker-{index}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+        logger.info(f"⚙️ Order execution engine started with {self.workers} worker(s)")
+
+    def submit(self, alert, webhook_id, received_at=None):
+        """Queue an alert for execution, returns the job or None if the queue is full"""
+        self.start()
+
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "webhook_id": webhook_id,
+            "alert_type": alert['alert_type'],
+            "symbol": alert['symbol'],
+            "account": alert['account'],
+            "status": "queued",
+            "received_at": received_at or time.time(),
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None
+        }
+        lane_key = (alert['account'], alert['symbol'])
+
+        with self.lock:
+            if not self.accepting or self.queued >= self.queue_size:
+                return None
+            self.jobs[job["job_id"]] = job
+            self._trim_history()
+            self.queued += 1
+
+            lane = self.lanes.get(lane_key)
+            if lane is None:
+                lane = self.lanes[lane_key] = {"pending": deque(), "scheduled": False}
+            lane["pending"].append((job["job_id"], alert))
+            schedule = not lane["scheduled"]
+            lane["scheduled"] = True
+
+        if schedule:
+            self.ready_lanes.put(lane_key)
+
+        return dict(job)
+
+    def get_job(self, job_id):
+        """Return a snapshot of a job, or None if unknown"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def queue_depth(self):
+        return self.queued
+
+    def drain(self, timeout=SHUTDOWN_DRAIN_TIMEOUT):
+        """Stop accepting jobs and wait for queued and running ones, returns True if all finished"""
+        with self.lock:
+            self.accepting = False
+        deadline = time.time() + timeout
+        while (self.queued or self.running) and time.time() < deadline:
+            time.sleep(0.05)
+        return not (self.queued or self.running)
+
+    def _trim_history(self):
+        # Only finished jobs are evicted, queued/running ones must stay visible
+        excess = len(self.jobs) - self.history_limit
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job["status"] in ("completed", "failed", "superseded")][:excess]:
+            del self.jobs[job_id]
+
+    def _update(self, job_id, **fields):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job:
+                job.update(fields)
+
+    def _worker(self):
+        while True:
+            lane_key = self.ready_lanes.get()
+            try:
+                self._run_lane(lane_key)
+            except Exception as e:
+                # A dead worker would strand every lane it is handed later
+                logger.error(f"❌ Order worker error on {lane_key[1]}@{lane_key[0]}: {str(e)}")
+                logger.error(f"📋 Traceback: {traceback.format_exc()}")
+
+    def _run_lane(self, lane_key):
+        self.released.wait()
+        with self.lock:
+            lane = self.lanes[lane_key]
+            if not lane["pending"]:
+                # abandon() emptied it after it was scheduled
+                lane["scheduled"] = False
+                return
+            if self.coalesce:
+                batch = list(lane["pending"])
+                lane["pending"].clear()
+            else:
+                batch = [lane["pending"].popleft()]
+            self.queued -= len(batch)
+            self.running += 1
+
+        try:
+            if len(batch) > 1:
+                batch, superseded = coalesce_alerts(batch)
+                for job_id, covered_by in superseded.items():
+                    self._update(job_id, status="superseded", finished_at=time.time(),
+                                 result={"superseded_by": covered_by})
+                ALERTS_COALESCED.inc(len(superseded), symbol=lane_key[1])
+                logger.info(f"🧮 {lane_key[1]}@{lane_key[0]}: {len(superseded)} queued alert(s) folded, "
+                            f"running {len(batch)}")
+            for job_id, alert in batch:
+                self._run(job_id, alert)
+        finally:
+            # Hand the lane back only after this batch is done to keep per-instrument order
+            with self.lock:
+                self.running -= 1
+                reschedule = bool(lane["pending"])
+                lane["scheduled"] = reschedule
+            if reschedule:
+                self.ready_lanes.put(lane_key)
+
+    def _run(self, job_id, alert):
+        with self.lock:
+            webhook_id = self.jobs.get(job_id, {}).get("webhook_id")
+            received_at = self.jobs.get(job_id, {}).get("received_at", time.time())
+
+        started_at = time.time()
+        profile = profiler.begin("job", job_id)
+        profiler.annotate(webhook_id=webhook_id, alert_type=alert['alert_type'], symbol=alert['symbol'],
+                          account=alert['account'], queue_wait_ms=round((started_at - received_at) * 1000, 3))
+        status = "failed"
+        self._update(job_id, status="running", started_at=started_at)
+        try:
+            result = execute_alert(alert, webhook_id)
+            finished_at = time.time()
+            ALERT_TO_ORDER_DURATION.observe(finished_at - received_at,
+                                            alert_type=alert['alert_type'], symbol=alert['symbol'])
+            self._update(job_id, status="completed", finished_at=finished_at, result=result)
+            status = "completed"
+        except Exception as e:
+            log_and_notify(f"❌ ORDER EXECUTION ERROR: {str(e)}", "critical", webhook_id)
+            logger.error(f"📋 Traceback: {traceback.format_exc()}")
+            self._update(job_id, status="failed", finished_at=time.time(), error=str(e))
+        finally:
+            profiler.end(profile, status=status)
+
+def coalesce_alerts(batch):
+    """Fold one instrument's queued [(job_id, alert)] into the fewest alerts that reach the same end state.
+
+    - an EXIT cancels all orders, closes the position and disarms the stop,
+      so nothing queued before the last EXIT needs to run
+    - a stop entry is replaced (or cancelled) by whichever entry follows it
+    - back-to-back market entries on the same side become one order for the
+      summed size
+
+    Returns (alerts to run, {superseded job_id: job_id whose run covers it}).
+    """
+    superseded = {}
+    exits = [index for index, (_, alert) in enumerate(batch) if alert['alert_type'].endswith('_EXIT')]
+    start = exits[-1] if exits else 0
+    for job_id, _ in batch[:start]:
+        superseded[job_id] = batch[start][0]
+
+    kept = []
+    for job_id, alert in batch[start:]:
+        while kept and alert['alert_type'].endswith('_ENTRY'):
+            last_id, last = kept[-1]
+            if last['alert_type'].endswith('_ENTRY') and last['stop_price'] > 0:
+                kept.pop()
+            elif last['alert_type'] == alert['alert_type'] and last['stop_price'] == 0 == alert['stop_price']:
+                kept.pop()
+                alert = dict(alert, size=last['size'] + alert['size'])
+            else:
+                break
+            superseded[last_id] = job_id
+        kept.append((job_id, alert))
+
+    for job_id, covered_by in superseded.items():
+        while covered_by in superseded:
+            covered_by = superseded[covered_by]
+        superseded[job_id] = covered_by
+    return kept, superseded
+
+execution_engine = OrderExecutionEngine()
+
+def parse_alert(data):
+    """Validate webhook data and extract order parameters, raises ValueError on bad input"""
+    if not data or 'alert_type' not in data:
+        raise ValueError("Missing alert_type")
+
+    alert_type = data.get('alert_type')
+    if alert_type not in VALID_ALERT_TYPES:
+        raise ValueError(f"Unknown alert_type: {alert_type}")
+
+    symbol = data.get('symbol') or SYMBOL
+    account = data.get('account') or DEFAULT_ACCOUNT
+    if symbol not in INSTRUMENTS:
+        raise ValueError(f"Unknown symbol: {symbol}")
+    if account not in ACCOUNTS:
+        raise ValueError(f"Unknown account: {account}")
+
+    try:
+        stop_price = float(data.get("stop_price", 0)) if data.get("stop_price") else 0
+        stop_loss = float(data.get('stop_loss', 0)) if data.get('stop_loss') else 0
+        trail_amount = float(data.get('trail_amount', 0)) if data.get('trail_amount') else 0
+        size = float(data.get('lot_size', INSTRUMENTS[symbol].get('lot_size', LOT_SIZE)))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid numeric field: {str(e)}")
+
+    # float() accepts "nan" and "inf", and NaN slips through every comparison below
+    for name, value in (("stop_price", stop_price), ("stop_loss", stop_loss),
+                        ("trail_amount", trail_amount), ("lot_size", size)):
+        if not math.isfinite(value):
+            raise ValueError(f"Invalid {name}: {value}")
+
+    if size <= 0:
+        raise ValueError(f"Invalid lot_size: {size}")
+    if stop_loss < 0 or trail_amount < 0:
+        raise ValueError("stop_loss and trail_amount must not be negative")
+
+    return {
+        "alert_type": alert_type,
+        "symbol": symbol,
+        "account": account,
+        "stop_price": stop_price,
+        "stop_loss": stop_loss,
+        "trail_amount": trail_amount,
+        "size": size
+    }
+
+class DedupCache:
+    """Bounded TTL/LRU cache of webhook responses keyed by alert identity.
 
-def get_position_data():
-    """Get current position data"""
-    try:
-        params = {"product_id": PRODUCT_ID}
-        success, result = make_api_request('GET', '/positions', params=params)
-        
-        if success and result and result.get('success'):
-            position_data = result.get('result')
-            if position_data and position_data.get('size', 0) != 0:
-                return position_data
-        
-        return None
-        
-    except Exception as e:
-        logger.error(f"❌ Error getting position: {str(e)}")
-        return None
+    ``claim`` reserves a key atomically, so two concurrent deliveries of the
+    same alert can never both reach the exchange. When ``db_path`` is set,
+    recorded responses are also written to SQLite and reloaded on startup.
+    With ``shared`` the claim itself goes through SQLite as well, so the
+    guarantee holds across worker processes.
 
-def close_position():
-    """Close current position with market order"""
-    try:
-        log_and_notify("🔄 Checking for position to close...")
-        
-        position = get_position_data()
-        if position and position.get('size', 0) != 0:
-            position_size = int(position['size'])
-            side = 'sell' if position_size > 0 else 'buy'
-            size = abs(position_size) / 1000.0
-            
-            log_and_notify(f"📍 Found position: {position_size} contracts")
-            log_and_notify(f"🚪 Closing position with {side.upper()} market order")
-            
-            order_id = place_market_order(side, size)
-            if order_id:
-                log_and_notify("✅ Position close order placed successfully")
-                return True
+    Payload-hash keys ("hash:<scope>:<digest>") only match for ``window``
+    seconds after they were seen, and only while they are the latest alert
+    of their scope: a new payload for the same symbol and account drops the
+    previous one, so A, B, A executes all three.
+    """
+
+    def __init__(self, ttl=DEDUP_TTL, max_entries=DEDUP_MAX_ENTRIES, db_path=DEDUP_DB_PATH, shared=False,
+                 window=DEDUP_WINDOW):
+        self.ttl = ttl
+        self.window = window
+        self.latest = {}  # hash scope -> latest key claimed in it
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.db = None
+        self.db_path = db_path
+        self.shared = shared
+        self.duplicates = 0
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path):
+        try:
+            self.db = sqlite3.connect(db_path, timeout=10, check_same_thread=False, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS webhook_dedup "
+                            "(key TEXT PRIMARY KEY, response TEXT, status_code INTEGER, created_at REAL)")
+            cutoff = time.time() - self.ttl
+            self.db.execute("DELETE FROM webhook_dedup WHERE created_at < ?", (cutoff,))
+            rows = self.db.execute("SELECT key, response, status_code, created_at FROM webhook_dedup "
+                                   "WHERE response IS NOT NULL ORDER BY created_at DESC LIMIT ?",
+                                   (self.max_entries,)).fetchall()
+            for key, response, status_code, created_at in reversed(rows):
+                self.entries[key] = {"response": json.loads(response), "status_code": status_code,
+                                     "created_at": created_at}
+            logger.info(f"🗃️ Loaded {len(rows)} webhook dedup entries from {db_path}")
+        except Exception as e:
+            logger.error(f"❌ Dedup store unavailable, continuing in memory only: {str(e)}")
+            self.db = None
+
+    def _evict(self, now):
+        while self.entries:
+            key, entry = next(iter(self.entries.items()))
+            if len(self.entries) > self.max_entries or now - entry["created_at"] > self.ttl:
+                del self.entries[key]
+                scope = self._scope(key)
+                if scope and self.latest.get(scope) == key:
+                    del self.latest[scope]
             else:
-                log_and_notify("❌ Failed to place position close order", level="error")
-                return False
-        else:
-            log_and_notify("ℹ️ No open position to close.")
-            return True
-            
-    except Exception as e:
-        log_and_notify(f"❌ ERROR closing position: {str(e)}", level="error")
-        return False
+                break
+
+    def _max_age(self, key):
+        return self.window if key.startswith('hash:') else self.ttl
+
+    @staticmethod
+    def _scope(key):
+        """'hash:<scope>:' prefix shared by the payload keys of one symbol and account, None for id keys"""
+        return key[:key.rindex(':') + 1] if key.startswith('hash:') else None
+
+    def claim(self, keys):
+        """Return the cached entry for any of ``keys``, or reserve ``keys[0]`` and return None"""
+        now = time.time()
+        with self.lock:
+            self._evict(now)
+            for key in keys:
+                entry = self.entries.get(key)
+                if entry and now - entry["created_at"] <= self._max_age(key):
+                    self.entries.move_to_end(key)
+                    self.duplicates += 1
+                    return dict(entry)
+            if self.shared and self.db:
+                entry = self._claim_shared(keys, now)
+                if entry is not None:
+                    self.duplicates += 1
+                    return entry
+            scope = self._scope(keys[0])
+            if scope:
+                previous = self.latest.get(scope)
+                if previous and previous != keys[0]:
+                    self.entries.pop(previous, None)
+                self.latest[scope] = keys[0]
+            self.entries[keys[0]] = {"response": None, "status_code": None, "created_at": now}
+            return None
+
+    def _claim_shared(self, keys, now):
+        # BEGIN IMMEDIATE takes the write lock up front, so check-and-insert is atomic across processes
+        try:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self.db.execute("DELETE FROM webhook_dedup WHERE response IS NULL AND created_at < ?",
+                                (now - DEDUP_CLAIM_TIMEOUT,))
+                row = self.db.execute(f"SELECT response, status_code, created_at FROM webhook_dedup "
+                                      f"WHERE key IN ({','.join('?' * len(keys))}) AND created_at >= ? LIMIT 1",
+                                      (*keys, now - self._max_age(keys[0]))).fetchone()
+                if row is None:
+                    self._drop_superseded(keys[0])
+                    self.db.execute("INSERT OR REPLACE INTO webhook_dedup VALUES (?, NULL, NULL, ?)", (keys[0], now))
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        except Exception as e:
+            logger.error(f"❌ Shared dedup check failed, deduplicating within this worker only: {str(e)}")
+            return None
+
+        if row is None:
+            return None
+        response, status_code, created_at = row
+        return {"response": json.loads(response) if response else None, "status_code": status_code,
+                "created_at": created_at}
+
+    def _drop_superseded(self, key):
+        # Scopes are hex digests, no LIKE wildcards to escape
+        scope = self._scope(key)
+        if scope:
+            self.db.execute("DELETE FROM webhook_dedup WHERE key LIKE ? AND key != ?", (scope + '%', key))
+
+    def record(self, key, response, status_code):
+        """Store the final response for a claimed key"""
+        now = time.time()
+        with self.lock:
+            self.entries[key] = {"response": response, "status_code": status_code, "created_at": now}
+            self.entries.move_to_end(key)
+            if self.db:
+                try:
+                    self._drop_superseded(key)
+                    self.db.execute("INSERT OR REPLACE INTO webhook_dedup VALUES (?, ?, ?, ?)",
+                                    (key, json.dumps(response), status_code, now))
+                    self.db.execute("DELETE FROM webhook_dedup WHERE created_at < ?", (now - self.ttl,))
+                except Exception as e:
+                    logger.error(f"❌ Failed to persist dedup entry: {str(e)}")
+
+    def release(self, key):
+        """Forget a claimed key so a retry of a failed delivery is processed again"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry["response"] is None:
+                del self.entries[key]
+            if self.shared and self.db:
+                try:
+                    self.db.execute("DELETE FROM webhook_dedup WHERE key = ? AND response IS NULL", (key,))
+                except Exception as e:
+                    logger.error(f"❌ Failed to release shared dedup claim: {str(e)}")
+
+    def reopen(self):
+        """Reconnect after fork, a SQLite connection must not be shared between processes"""
+        if self.db_path:
+            self.db = None
+            self._open_db(self.db_path)
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "duplicates": self.duplicates,
+                    "persistent": self.db is not None, "shared": self.shared}
+
+dedup_cache = DedupCache(db_path=DEDUP_DB_PATH or (os.path.join(STATE_DIR, 'webhook_dedup.sqlite3') if STATE_DIR else None),
+                         shared=STATE_DIR is not None)
+
+def alert_dedup_keys(data, alert_id=None):
+    """Identity keys for an alert: the client id if supplied, else a payload hash scoped to symbol and account.
+
+    The payload key has no time component, DedupCache ages it from the exact
+    time it was seen (DEDUP_WINDOW).
+    """
+    alert_id = alert_id or data.get('alert_id')
+    if alert_id:
+        return [f"id:{alert_id}"]
+
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    digest = hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    scope = json.dumps([data.get('account'), data.get('symbol')], default=str)
+    return [f"hash:{hashlib.sha256(scope.encode('utf-8')).hexdigest()[:16]}:{digest}"]
 
 @app.route('/webhook', methods=['POST'])
 def webhook():
     """Main webhook handler for TradingView alerts"""
-    global current_position, active_orders
-    
     webhook_id = f"WH_{int(time.time() * 1000)}"
     start_time = time.time()
     
     logger.info(f"🎯 [{webhook_id}] Webhook request received")
-
+    profile = profiler.begin("webhook", webhook_id)
+    status_code = 500
     try:
-        # Get data from request
-        if request.is_json:
-            data = request.get_json()
-        else:
-            data = request.form.to_dict()
-        
-        logger.info(f"📨 [{webhook_id}] Data: {json.dumps(data, indent=2)}")
-
-        # Validate required fields
-        if not data or 'alert_type' not in data:
-            error_msg = "❌ Missing alert_type in webhook data"
-            log_and_notify(error_msg, "error", webhook_id)
-            return jsonify({"status": "error", "message": "Missing alert_type"}), 400
+        response, status_code = _handle_webhook(webhook_id, start_time)
+        return response, status_code
+    finally:
+        profiler.end(profile, status=status_code)
 
-        # Extract parameters
-        alert_type = data.get('alert_type')
-        stop_price = float(data.get("stop_price", 0)) if data.get("stop_price") else 0
-        stop_loss = float(data.get('stop_loss', 0)) if data.get('stop_loss') else 0
-        size = float(data.get('lot_size', LOT_SIZE))
+def _handle_webhook(webhook_id, start_time):
+    dedup_keys = None
 
-        logger.info(f"📊 [{webhook_id}] Alert: {alert_type}, Price: {stop_price}, SL: {stop_loss}, Size: {size}")
-
-        # Process different alert types
-        if alert_type == 'LONG_ENTRY':
-            log_and_notify(f"🟢 LONG ENTRY SIGNAL\n"
-                          f"🔫 Stop: {stop_price} | 🛑 SL: {stop_loss}", 
-                          request_id=webhook_id)
-            
-            cancel_all_orders()
-            
-            if stop_price > 0:
-                # Place stop-market buy order
-                order_id = place_stop_market_order('buy', stop_price, size, webhook_id)
-                if order_id:
-                    current_position = 'long_pending'
-                    active_orders[order_id] = {
-                        'type': 'entry',
-                        'side': 'buy',
-                        'trigger_price': stop_price,
-                        'size': size
-                    }
+    try:
+        # Get data from request
+        parse_start = time.perf_counter()
+        with profiler.stage("parse"):
+            if request.is_json:
+                data = request.get_json(silent=True)
             else:
-                # Place immediate market buy order
-                order_id = place_market_order('buy', size, webhook_id)
-                if order_id:
-                    current_position = 'long'
+                data = request.form.to_dict()
+        WEBHOOK_STAGE_DURATION.observe(time.perf_counter() - parse_start, stage="parse")
+        
+        logger.debug("📨 [%s] Data: %s", webhook_id, LazyJson(data))
+        if not isinstance(data, dict):
+            log_and_notify("❌ Webhook body is not a JSON object", "error", webhook_id)
+            WEBHOOK_DURATION.observe(time.time() - start_time, status=400)
+            return jsonify({"status": "error", "message": "Body must be a JSON object",
+                            "webhook_id": webhook_id}), 400
 
-        elif alert_type == 'SHORT_ENTRY':
-            log_and_notify(f"🔴 SHORT ENTRY SIGNAL\n"
-                          f"🔫 Stop: {stop_price} | 🛑 SL: {stop_loss}", 
-                          request_id=webhook_id)
-            
-            cancel_all_orders()
-            
-            if stop_price > 0:
-                # Place stop-market sell order
-                order_id = place_stop_market_order('sell', stop_price, size, webhook_id)
-                if order_id:
-                    current_position = 'short_pending'
-                    active_orders[order_id] = {
-                        'type': 'entry',
-                        'side': 'sell',
-                        'trigger_price': stop_price,
-                        'size': size
-                    }
-            else:
-                # Place immediate market sell order
-                order_id = place_market_order('sell', size, webhook_id)
-                if order_id:
-                    current_position = 'short'
+        # Retried deliveries are answered from the cache without touching the exchange
+        with profiler.stage("dedup"):
+            dedup_keys = alert_dedup_keys(data, request.headers.get('X-Alert-Id'))
+            cached = dedup_cache.claim(dedup_keys)
+        if cached is not None:
+            logger.info(f"♻️ [{webhook_id}] Duplicate alert ({dedup_keys[0]})")
+            WEBHOOK_DURATION.observe(time.time() - start_time, status="duplicate")
+            if cached["response"] is None:
+                return jsonify({
+                    "status": "duplicate",
+                    "message": "Alert is already being processed",
+                    "webhook_id": webhook_id
+                }), 202
+            return jsonify(dict(cached["response"], duplicate=True)), cached["status_code"]
 
-        elif alert_type in ['LONG_EXIT', 'SHORT_EXIT']:
-            log_and_notify(f"🚪 {alert_type.replace('_', ' ')} SIGNAL", 
-                          request_id=webhook_id)
-            cancel_all_orders()
-            close_position()
-            current_position = None
-            active_orders.clear()
+        body, status_code = _process_alert(data, webhook_id, start_time)
 
+        if status_code < 300:
+            startup.record_alert()
+            dedup_cache.record(dedup_keys[0], body, status_code)
         else:
-            error_msg = f"❌ Unknown alert_type: {alert_type}"
-            log_and_notify(error_msg, "error", webhook_id)
-            return jsonify({"status": "error", "message": error_msg}), 400
-
-        processing_time = time.time() - start_time
-        logger.info(f"✅ [{webhook_id}] Processed in {processing_time:.3f}s")
-
-        return jsonify({
-            "status": "success",
-            "webhook_id": webhook_id,
-            "processing_time": processing_time,
-            "alert_type": alert_type
-        })
+            dedup_cache.release(dedup_keys[0])
+        WEBHOOK_DURATION.observe(time.time() - start_time, status=status_code)
+        return jsonify(body), status_code
 
     except Exception as e:
         processing_time = time.time() - start_time
         error_msg = f"❌ WEBHOOK ERROR: {str(e)}"
         log_and_notify(error_msg, "critical", webhook_id)
         logger.error(f"📋 Traceback: {traceback.format_exc()}")
+        if dedup_keys:
+            dedup_cache.release(dedup_keys[0])
+        WEBHOOK_DURATION.observe(processing_time, status=500)
         
         return jsonify({
             "status": "error", 
@@ -506,28 +3815,542 @@ def webhook():
             "processing_time": processing_time
         }), 500
 
+def _process_alert(data, webhook_id, start_time):
+    """Validate and execute (or queue) an alert, returns (response body, status code)"""
+    if startup.error:
+        log_and_notify(f"🚨 Startup failed, rejecting alert: {startup.error}", "critical", webhook_id)
+        return {"status": "error", "message": "Startup failed", "webhook_id": webhook_id}, 503
+
+    # Validate required fields
+    try:
+        with WEBHOOK_STAGE_DURATION.time(stage="validate"), profiler.stage("validate"):
+            alert = parse_alert(data)
+    except ValueError as e:
+        error_msg = f"❌ {str(e)}"
+        log_and_notify(error_msg, "error", webhook_id)
+        return {"status": "error", "message": str(e)}, 400
+
+    alert_type = alert['alert_type']
+    profiler.annotate(alert_type=alert_type, symbol=alert['symbol'], account=alert['account'])
+    logger.info(f"📊 [{webhook_id}] Alert: {alert_type} {alert['symbol']}@{alert['account']}, Price: {alert['stop_price']}, "
+                f"SL: {alert['stop_loss']}, Trail: {alert['trail_amount']}, Size: {alert['size']}")
+
+    if not WEBHOOK_ASYNC:
+        if not startup.wait(STARTUP_SYNC_WAIT):
+            log_and_notify(f"🚨 Still starting up, rejecting {alert_type}", "critical", webhook_id)
+            return {"status": "error", "message": "Starting up", "webhook_id": webhook_id}, 503
+        result = execute_alert(alert, webhook_id)
+        processing_time = time.time() - start_time
+        ALERT_TO_ORDER_DURATION.observe(processing_time, alert_type=alert_type, symbol=alert['symbol'])
+        logger.info(f"✅ [{webhook_id}] Processed in {processing_time:.3f}s")
+        return {
+            "status": "success",
+            "webhook_id": webhook_id,
+            "processing_time": processing_time,
+            "alert_type": alert_type,
+            "result": result
+        }, 200
+
+    with WEBHOOK_STAGE_DURATION.time(stage="enqueue"), profiler.stage("enqueue"):
+        job = execution_engine.submit(alert, webhook_id, received_at=start_time)
+    processing_time = time.time() - start_time
+
+    if job is None:
+        reason = "Order queue full" if execution_engine.accepting else "Shutting down"
+        log_and_notify(f"🚨 {reason}, rejecting {alert_type}", "critical", webhook_id)
+        return {
+            "status": "error",
+            "message": reason,
+            "webhook_id": webhook_id,
+            "processing_time": processing_time
+        }, 503
+
+    profiler.annotate(job_id=job['job_id'])
+    logger.info(f"📬 [{webhook_id}] Queued job {job['job_id']} in {processing_time:.3f}s")
+
+    return {
+        "status": "accepted",
+        "webhook_id": webhook_id,
+        "job_id": job['job_id'],
+        "job_url": f"/jobs/{job['job_id']}",
+        "processing_time": processing_time,
+        "alert_type": alert_type,
+        "symbol": alert['symbol']
+    }, 202
+
+def submit_signal(data, signal_id, timestamp=None):
+    """Send a strategy signal down the path a webhook alert takes, without the HTTP hop and dedup"""
+    try:
+        alert = parse_alert(data)
+    except ValueError as e:
+        log_and_notify(f"❌ Signal rejected: {str(e)}", "error", signal_id)
+        return None
+
+    alert_type = alert['alert_type']
+    SIGNALS_TOTAL.inc(alert_type=alert_type, symbol=alert['symbol'])
+    logger.info(f"📈 [{signal_id}] Signal: {alert_type} {alert['symbol']}@{alert['account']}, "
+                f"Price: {alert['stop_price']}, SL: {alert['stop_loss']}, Size: {alert['size']}")
+
+    if not WEBHOOK_ASYNC:
+        return execute_alert(alert, signal_id)
+    job = execution_engine.submit(alert, signal_id)
+    if job is None:
+        reason = "Order queue full" if execution_engine.accepting else "Shutting down"
+        log_and_notify(f"🚨 {reason}, dropping {alert_type} signal", "critical", signal_id)
+    return job
+
+class Ema:
+    """Exponential moving average seeded with the mean of its first ``period`` values"""
+
+    def __init__(self, period):
+        self.period = period
+        self.alpha = 2.0 / (period + 1)
+        self.value = None
+        self.count = 0
+        self.seed = 0.0
+
+    def update(self, x):
+        self.count += 1
+        if self.count < self.period:
+            self.seed += x
+        elif self.count == self.period:
+            self.value = (self.seed + x) / self.period
+        else:
+            self.value += self.alpha * (x - self.value)
+        return self.value
+
+class Atr:
+    """Wilder's average true range, seeded like Ema"""
+
+    def __init__(self, period):
+        self.period = period
+        self.value = None
+        self.count = 0
+        self.seed = 0.0
+        self.prev_close = None
+
+    def update(self, high, low, close):
+        if self.prev_close is None:
+            true_range = high - low
+        else:
+            true_range = max(high, self.prev_close) - min(low, self.prev_close)
+        self.prev_close = close
+        self.count += 1
+        if self.count < self.period:
+            self.seed += true_range
+        elif self.count == self.period:
+            self.value = (self.seed + true_range) / self.period
+        else:
+            self.value += (true_range - self.value) / self.period
+        return self.value
+
+class CandleSeries:
+    """Running indicators of one symbol, candles themselves are not kept"""
+
+    def __init__(self, symbol, fast, slow, atr):
+        self.symbol = symbol
+        self.candles = 0
+        self.fast = Ema(fast)
+        self.slow = Ema(slow)
+        self.atr = Atr(atr)
+        self.forming = None  # [start, open, high, low, close] of the candle still building
+        self.spread = None  # fast - slow EMA as of the last closed candle
+        self.side = None  # Direction of the last signalled entry
+
+    def close_candle(self, candle):
+        """Add a finished candle, returns (fast, slow, atr) once all are warmed up, else None"""
+        self.candles += 1
+        _, _, high, low, close = candle
+        fast = self.fast.update(close)
+        slow = self.slow.update(close)
+        atr = self.atr.update(high, low, close)
+        if fast is None or slow is None or atr is None:
+            return None
+        return fast, slow, atr
+
+    def snapshot(self):
+        return {
+            "candles": self.candles,
+            "forming_since": self.forming[0] if self.forming else None,
+            "fast_ema": self.fast.value,
+            "slow_ema": self.slow.value,
+            "atr": self.atr.value,
+            "side": self.side
+        }
+
+class SignalEngine:
+    """In-process strategy driven by the public candle stream.
+
+    Each stream update only rewrites the forming candle. When a newer candle
+    starts, the previous one is closed and the EMAs and ATR advance one step
+    as scalar recurrences, so nothing is recomputed over history and no
+    candle history is kept. A cross
+    of the fast and slow EMA becomes the same *_EXIT / *_ENTRY payloads a
+    TradingView alert carries and goes straight to the order path.
+
+    ``emit(payload, signal_id, timestamp)`` defaults to submit_signal; pass a
+    collector to run the engine offline (see replay_feed).
+    """
+
+    def __init__(self, symbols=None, account=SIGNAL_ACCOUNT, emit=None, history=SIGNAL_HISTORY,
+                 fast=SIGNAL_FAST_EMA, slow=SIGNAL_SLOW_EMA, atr=SIGNAL_ATR_PERIOD,
+                 entry_atr=SIGNAL_ENTRY_ATR, stop_atr=SIGNAL_STOP_ATR, resolution=SIGNAL_RESOLUTION):
+        self.symbols = list(symbols or INSTRUMENTS)
+        self.account = account
+        self.emit = emit or submit_signal
+        self.params = (history, fast, slow, atr)
+        self.entry_atr = entry_atr
+        self.stop_atr = stop_atr
+        self.resolution = resolution
+        self.series = {}
+        self.lock = threading.Lock()
+        self.counters = {"updates": 0, "candles": 0, "signals": 0, "out_of_order": 0}
+        self.stream = None
+        self.leader = ServiceLeader('signal_engine')
+        self.warming = False
+
+    def on_message(self, message):
+        """Feed one candlestick stream message, live or recorded"""
+        if not str(message.get('type', '')).startswith('candlestick_'):
+            return
+        self.on_candle(message.get('symbol'), message['candle_start_time'] / 1e6, float(message['open']),
+                       float(message['high']), float(message['low']), float(message['close']))
+
+    def on_candle(self, symbol, start, open_price, high, low, close):
+        """Update for the candle opening at ``start`` (seconds), the feed repeats it until the next one opens"""
+        if symbol not in self.symbols:
+            return
+        with self.lock:
+            series = self.series.get(symbol)
+            if series is None:
+                series = self.series[symbol] = CandleSeries(symbol, *self.params[1:])
+            self.counters["updates"] += 1
+
+            forming = series.forming
+            if forming is not None and start == forming[0]:
+                forming[1:] = [open_price, high, low, close]
+                return
+            if forming is not None and start < forming[0]:
+                self.counters["out_of_order"] += 1
+                return
+            series.forming = [start, open_price, high, low, close]
+            if forming is None:
+                return
+            signals = self._close(series, forming)
+
+        # Emitted outside the lock, execution may block on the exchange
+        for payload in signals:
+            self.emit(payload, f"SIG_{symbol}_{int(start)}", start)
+
+    def _close(self, series, candle):
+        indicators = series.close_candle(candle)
+        self.counters["candles"] += 1
+        if indicators is None:
+            return []
+        fast, slow, atr = indicators
+        previous, series.spread = series.spread, fast - slow
+        if previous is None or (previous > 0) == (series.spread > 0) or self.warming:
+            return []
+
+        direction = 'long' if series.spread > 0 else 'short'
+        _, _, high, low, close = candle
+        sign = 1 if direction == 'long' else -1
+        payloads = []
+        if series.side is not None and series.side != direction:
+            payloads.append({"alert_type": f"{series.side.upper()}_EXIT", "symbol": series.symbol,
+                             "account": self.account})
+        entry = {"alert_type": f"{direction.upper()}_ENTRY", "symbol": series.symbol, "account": self.account}
+        if self.entry_atr:
+            entry["stop_price"] = round((high if direction == 'long' else low) + sign * self.entry_atr * atr, 8)
+        if self.stop_atr:
+            entry["stop_loss"] = round(close - sign * self.stop_atr * atr, 8)
+        payloads.append(entry)
+        series.side = direction
+        self.counters["signals"] += len(payloads)
+        return payloads
+
+    def warm_up(self):
+        """Seed the indicators from REST candle history so signals don't wait SIGNAL_SLOW_EMA live candles"""
+        seconds = resolution_seconds(self.resolution)
+        end = int(time.time())
+        self.warming = True
+        try:
+            for symbol in self.symbols:
+                with request_priority('low'):
+                    success, result = make_api_request('GET', '/history/candles', params={
+                        'resolution': self.resolution, 'symbol': symbol,
+                        'start': end - seconds * self.params[0], 'end': end})
+                if not success:
+                    logger.warning(f"⚠️ No candle history for {symbol}, indicators warm up from the stream")
+                    continue
+                candles = sorted(result.get('result') or [], key=lambda candle: candle['time'])
+                for candle in candles:
+                    self.on_candle(symbol, float(candle['time']), float(candle['open']), float(candle['high']),
+                                   float(candle['low']), float(candle['close']))
+                logger.info(f"📈 {symbol} signal engine warmed up with {len(candles)} candles")
+        finally:
+            self.warming = False
+
+    def start(self):
+        """Warm up and subscribe, in one worker process only when several share STATE_DIR"""
+        if self.stream is not None:
+            return True
+        # Another worker may own the engine, this one takes over if it goes away
+        return self.leader.run(self._start_stream)
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop()
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["symbols"] = {symbol: series.snapshot() for symbol, series in self.series.items()}
+        stats["streaming"] = self.stream is not None
+        return stats
+
+    def _start_stream(self):
+        self.warm_up()
+        self.stream = CandleStreamClient(self.on_message, self.symbols, self.resolution)
+        self.stream.start()
+
+class CandleStreamClient(PublicStreamClient):
+    """Public candlestick_<resolution> subscription that feeds the signal engine"""
+
+    name = "Candle"
+    disabled_feature = "signal engine is disabled"
+
+    def __init__(self, on_message, symbols, resolution=SIGNAL_RESOLUTION, record_path=SIGNAL_RECORD_PATH,
+                 url=WS_URL, connect=None):
+        super().__init__(url, connect)
+        self.on_message = on_message
+        self.symbols = list(symbols)
+        self.resolution = resolution
+        self.record = open(record_path, 'a', buffering=1) if record_path else None
+
+    def channels(self):
+        return [{"name": f"candlestick_{self.resolution}", "symbols": self.symbols}]
+
+    def handle(self, message):
+        if str(message.get('type', '')).startswith('candlestick_'):
+            if self.record:
+                self.record.write(json.dumps(message) + '\n')
+            self.on_message(message)
+
+def resolution_seconds(resolution):
+    """'1m' / '15m' / '4h' / '1d' / '1w' in seconds"""
+    units = {'m': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+    return int(resolution[:-1]) * units[resolution[-1]]
+
+def replay_feed(path, **engine_options):
+    """Run a recorded candle feed (JSON lines, see SIGNAL_RECORD_PATH) through a fresh SignalEngine offline.
+
+    Returns the [(timestamp, payload)] it would have traded, the shape
+    backtest.py replays through /webhook.
+    """
+    signals = []
+    engine = SignalEngine(emit=lambda payload, signal_id, timestamp: signals.append((timestamp, payload)),
+                          **engine_options)
+    with open(path, encoding='utf-8') as handle:
+        for line in handle:
+            if line.strip():
+                engine.on_message(json.loads(line))
+    return signals
+
+signal_engine = SignalEngine(symbols=SIGNAL_SYMBOLS)
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Order execution job status endpoint"""
+    job = execution_engine.get_job(job_id)
+    if not job:
+        return jsonify({"status": "error", "message": f"Unknown job: {job_id}"}), 404
+
+    return jsonify(job)
+
+def build_status():
+    """Full /status body, the only place it touches the exchange"""
+    with request_priority('low'):
+        position = get_position_data()
+    default_state = get_instrument_state()
+
+    return {
+        "status": "running",
+        "timestamp": datetime.now().isoformat(),
+        "current_position": default_state.current_position,
+        "position_data": position,
+        "active_orders": len(default_state.active_orders),
+        "instruments": [state.snapshot() for state in list(instrument_states.values())],
+        "queued_jobs": execution_engine.queue_depth(),
+        "telegram": telegram_notifier.stats(),
+        "dedup": dedup_cache.stats(),
+        "journal": order_journal.stats() if order_journal is not None else None,
+        "stops": stop_manager.stats(),
+        "signals": signal_engine.stats() if SIGNAL_ENGINE else None,
+        "startup": startup.stats(),
+        "log_records_dropped": AsyncQueueHandler.dropped,
+        "rate_limits": {account: limiter.stats() for account, limiter in rate_limiters.items()},
+        "circuit_breakers": {key: breaker.state for key, breaker in list(circuit_breakers.items())},
+        "streams": {account: store.stats() for account, store in state_stores.items()},
+        "symbol": SYMBOL,
+        "product_id": PRODUCT_ID,
+        "lot_size": LOT_SIZE
+    }
+
+def status_fingerprint(body):
+    """The trading state in a /status body, the only part its ETag covers.
+
+    Token counts, stream timestamps, uptime and counters move on every
+    build; hashing them would turn each background rebuild into a new ETag
+    and revalidation would never answer 304.
+    """
+    position = body["position_data"] or {}
+    return {
+        "position": {key: position.get(key) for key in ('size', 'entry_price')},
+        "instruments": [{key: value for key, value in instrument.items() if key != 'busy'}
+                        for instrument in body["instruments"]],
+        "circuit_breakers": body["circuit_breakers"],
+        "streams_live": {account: stream["live"] for account, stream in body["streams"].items()},
+        "ready": body["startup"]["ready"]
+    }
+
+class StatusCache:
+    """Snapshot behind /status, rebuilt by a background refresher.
+
+    Pollers are answered from the snapshot and never reach the exchange
+    unless it is older than ``max_staleness`` or they ask for ``fresh``.
+    Concurrent rebuilds are single-flight: callers arriving while one runs
+    wait for it and share its result.
+    """
+
+    def __init__(self, build, fingerprint=None, interval=STATUS_REFRESH_INTERVAL,
+                 max_staleness=STATUS_MAX_STALENESS):
+        self.build = build
+        self.fingerprint = fingerprint  # body -> the part the ETag covers, default: all but 'timestamp'
+        self.interval = interval
+        self.max_staleness = max_staleness
+        self.lock = threading.Lock()
+        self.snapshot = None  # (body, etag, built_at)
+        self.inflight = None  # Event set when the running rebuild finishes
+        self.thread = None
+        self.counters = {"builds": 0, "shared": 0, "failed": 0}
+
+    def get(self, fresh=False):
+        """(body, etag, built_at), rebuilt first when missing, too old or ``fresh`` is asked for"""
+        snapshot = self.snapshot
+        if snapshot is not None and not fresh and time.time() - snapshot[2] <= self.max_staleness:
+            return snapshot
+        return self.refresh()
+
+    def refresh(self):
+        """Rebuild the snapshot, or wait for the rebuild already in flight and return its result"""
+        with self.lock:
+            event = self.inflight
+            if event is None:
+                event = self.inflight = threading.Event()
+                owner = True
+            else:
+                self.counters["shared"] += 1
+                owner = False
+
+        if not owner:
+            event.wait(REQUEST_DEADLINE + 5)
+            if self.snapshot is None:
+                raise RuntimeError("Status snapshot unavailable")
+            return self.snapshot
+
+        try:
+            body = self.build()
+            # Unchanged state must revalidate as 304, so volatile fields stay out of the ETag
+            if self.fingerprint is not None:
+                tagged = self.fingerprint(body)
+            else:
+                tagged = {key: value for key, value in body.items() if key != 'timestamp'}
+            content = json.dumps(tagged, sort_keys=True, default=str)
+            self.snapshot = (body, hashlib.sha1(content.encode()).hexdigest()[:20], time.time())
+            self.counters["builds"] += 1
+            return self.snapshot
+        except Exception:
+            self.counters["failed"] += 1
+            raise
+        finally:
+            with self.lock:
+                self.inflight = None
+            event.set()
+
+    def start(self):
+        """Start the background refresher (idempotent)"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._refresh_loop, name="status-cache", daemon=True)
+            self.thread.start()
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats["age"] = time.time() - self.snapshot[2] if self.snapshot else None
+        return stats
+
+    def _refresh_loop(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"❌ Status refresh error: {str(e)}")
+            time.sleep(self.interval)
+
+status_cache = StatusCache(build_status, status_fingerprint)
+
 @app.route('/status', methods=['GET'])
 def status():
-    """Bot status endpoint"""
+    """Bot status endpoint, served from the cached snapshot (?fresh=1 rebuilds it first)"""
     try:
-        position = get_position_data()
-        
-        return jsonify({
-            "status": "running",
-            "timestamp": datetime.now().isoformat(),
-            "current_position": current_position,
-            "position_data": position,
-            "active_orders": len(active_orders),
-            "symbol": SYMBOL,
-            "product_id": PRODUCT_ID,
-            "lot_size": LOT_SIZE
-        })
+        body, etag, built_at = status_cache.get(fresh=request.args.get('fresh') in ('1', 'true'))
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+        else:
+            response = jsonify(dict(body, snapshot_age=round(time.time() - built_at, 3)))
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     except Exception as e:
         return jsonify({
             "status": "error",
             "error": str(e)
         }), 500
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics endpoint"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/slow', methods=['GET', 'POST'])
+def debug_slow():
+    """Slowest profiled webhook requests and order jobs (?kind=webhook|job&limit=N).
+
+    POST {"enabled": true|false, "reset": true, "keep": N, "sample_interval": seconds}
+    switches profiling without a restart, it needs DEBUG_TOKEN in the X-Debug-Token header.
+    """
+    try:
+        if request.method == 'POST':
+            token = request.headers.get('X-Debug-Token', '')
+            if not DEBUG_TOKEN or not hmac.compare_digest(token.encode('utf-8'), DEBUG_TOKEN.encode('utf-8')):
+                logger.warning(f"🚫 Rejected profiling change from {request.remote_addr}")
+                return jsonify({"status": "error", "message": "Forbidden"}), 403
+            options = request.get_json(silent=True) or {}
+            profiler.configure(enabled=options.get('enabled'), keep=options.get('keep'),
+                               sample_interval=options.get('sample_interval'), reset=bool(options.get('reset')))
+            logger.info(f"🔬 Profiling {'enabled' if profiler.enabled else 'disabled'}")
+        limit = request.args.get('limit', type=int)
+        return jsonify(profiler.report(kind=request.args.get('kind'), limit=limit))
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 503 while starting up (alerts are buffered, not run), 200 once orders execute"""
+    stats = startup.stats()
+    status = "ready" if stats["ready"] else "failed" if stats["error"] else "starting"
+    return jsonify(dict(stats, status=status)), 200 if stats["ready"] else 503
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
@@ -541,7 +4364,8 @@ def health():
 def test_api():
     """Test API connection"""
     try:
-        success, result = make_api_request('GET', f'/products/{PRODUCT_ID}')
+        with request_priority('low'):
+            success, result = make_api_request('GET', f'/products/{PRODUCT_ID}')
         if success:
             return jsonify({
                 "status": "success",
@@ -560,45 +4384,369 @@ def test_api():
             "message": str(e)
         }), 500
 
-# Startup notification
-if __name__ == '__main__':
-    try:
-        logger.info("🚀 Delta Trading Bot v4.0 Starting...")
-        logger.info(f"📊 Symbol: {SYMBOL}")
-        logger.info(f"🆔 Product ID: {PRODUCT_ID}")
-        logger.info(f"📏 Default Lot Size: {LOT_SIZE} BTC")
-        
-        # Test API connection on startup
-        success, result = make_api_request('GET', f'/products/{PRODUCT_ID}')
-        if success:
-            logger.info("✅ API connection verified successfully")
-            send_telegram_message("🚀 Delta Trading Bot v4.0 Started!\n✅ API Connection Verified")
+def reconcile_on_startup():
+    """Restore instrument state from the journal, then correct it against one bulk REST snapshot per account"""
+    start_time = time.perf_counter()
+    replayed = order_journal.replay() if order_journal is not None else {}
+
+    for account, store in state_stores.items():
+        states = [get_instrument_state(symbol, account) for symbol in INSTRUMENTS]
+        for state in states:
+            saved = replayed.get((account, state.symbol))
+            if saved:
+                with state.lock:
+                    state.current_position = saved["current_position"]
+                    state.active_orders = dict(saved["active_orders"])
+
+        product_ids = store.product_ids()
+        positions_ok, positions = fetch_positions_rest(product_ids, account)
+        orders_ok, orders = fetch_open_orders_rest(product_ids, account)
+        if not (positions_ok and orders_ok):
+            log_and_notify(f"⚠️ [{account}] Startup reconciliation failed, continuing from journaled state", "warning")
+            continue
+
+        # Drops journaled orders that are no longer open and takes positions from the exchange
+        store.apply_snapshot(positions, orders)
+
+        for state in states:
+            with hold_instrument(state):
+                adopted = _adopt_open_orders(state, orders)
+                journal_state(state)
+            if adopted:
+                log_and_notify(f"🧾 {state.symbol}@{account}: adopted {adopted} open order(s) missing from the journal",
+                               "warning")
+
+    restored = sum(len(state.active_orders) for state in list(instrument_states.values()))
+    logger.info(f"🧾 State reconciled in {(time.perf_counter() - start_time) * 1000:.0f}ms: "
+                f"{restored} tracked order(s) across {len(instrument_states)} instrument(s)")
+
+def _adopt_open_orders(state, orders):
+    """Track open exchange orders for the instrument that the journal does not know about"""
+    adopted = 0
+    for order in orders:
+        if order.get('product_id') != state.product_id or order['id'] in state.active_orders:
+            continue
+        stop = order.get('stop_order_type') == 'stop_loss_order'
+        state.active_orders[order['id']] = {
+            'type': ('stop_loss' if order.get('reduce_only') else 'entry') if stop else 'other',
+            'side': order.get('side'),
+            'trigger_price': float(order['stop_price']) if order.get('stop_price') else None,
+            'size': contracts_to_size(int(order.get('size', 0)), get_product_spec(state.product_id))
+        }
+        adopted += 1
+    return adopted
+
+class StartupPipeline:
+    """Brings a process from listening to trading without holding up the listener.
+
+    The connection warm-up, product fetch and position/order snapshot run
+    concurrently on a background thread while the webhook already answers.
+    Alerts accepted meanwhile wait in the execution engine (held since
+    start_services) and run once the state is reconciled. If the workers
+    can't be started, the buffered alerts are failed and new ones are
+    answered 503. ``/ready`` reports progress or the error, ``/health``
+    stays a plain liveness check.
+    """
+
+    def __init__(self, started_at=PROCESS_STARTED_AT):
+        self.started_at = started_at
+        self.ready = threading.Event()
+        self.done = threading.Event()  # Set when startup succeeded or failed
+        self.error = None
+        self.lock = threading.Lock()
+        self.thread = None
+        self.steps = {}
+        self.ready_at = None
+        self.first_alert_at = None
+        self.buffered_alerts = 0
+
+    def start(self):
+        """Run the startup steps in the background (idempotent)"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="startup", daemon=True)
+            self.thread.start()
+
+    def wait(self, timeout=None):
+        """True once started up, also when this process never ran the pipeline (tests, tools)"""
+        if self.thread is None:
+            return True
+        self.done.wait(timeout)
+        return self.ready.is_set()
+
+    def record_alert(self):
+        """Note an accepted alert, the first one sets the time-to-first-alert metric"""
+        with self.lock:
+            if not self.ready.is_set():
+                self.buffered_alerts += 1
+            if self.first_alert_at is not None:
+                return
+            self.first_alert_at = time.time()
+        elapsed = self.first_alert_at - self.started_at
+        FIRST_ALERT_SECONDS.set(round(elapsed, 3))
+        logger.info(f"⏱️ First alert accepted {elapsed:.2f}s after process start")
+
+    def _step(self, name, target):
+        step_start = time.perf_counter()
+        try:
+            status = "failed" if target() is False else "ok"
+        except Exception as e:
+            logger.error(f"❌ Startup step {name} failed: {str(e)}")
+            status = "failed"
+        elapsed = time.perf_counter() - step_start
+        STARTUP_STEP_SECONDS.set(round(elapsed, 3), step=name)
+        with self.lock:
+            self.steps[name] = {"status": status, "seconds": round(elapsed, 3)}
+
+    def _run(self):
+        steps = [
+            # Contract specs, also the API connection check
+            ("products", product_cache.refresh),
+            # Pick up where the last run stopped before running alerts
+            ("reconcile", reconcile_on_startup)
+        ]
+        if exchange.remote:
+            # Pre-open keep-alive connections before the first alert runs
+            steps.insert(0, ("warm_up", warm_up_connections))
+        with self.lock:
+            self.steps = {name: {"status": "running", "seconds": None} for name, _ in steps}
+
+        try:
+            threads = [threading.Thread(target=self._step, args=step, name=f"startup-{step[0]}", daemon=True)
+                       for step in steps]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            _start_workers()
+        except Exception as e:
+            # Buffered alerts would otherwise sit in the held queue forever
+            self.error = str(e)
+            abandoned = execution_engine.abandon(f"Startup failed: {str(e)}")
+            self.done.set()
+            log_and_notify(f"❌ Bot startup failed: {str(e)}\n🚫 {abandoned} buffered alert(s) dropped", "critical")
+            logger.error(f"📋 Traceback: {traceback.format_exc()}")
+            return
+
+        with self.lock:
+            self.ready_at = time.time()
+            buffered = self.buffered_alerts
+            steps = dict(self.steps)
+        self.ready.set()
+        self.done.set()
+        elapsed = self.ready_at - self.started_at
+        STARTUP_READY_SECONDS.set(round(elapsed, 3))
+        logger.info(f"✅ Ready {elapsed:.2f}s after process start, {buffered} buffered alert(s) released")
+
+        # Queued on the notifier, the announcement never delays trading (one per worker process)
+        worker = f"\n🆔 Worker {os.getpid()}" if WEB_WORKERS > 1 else ""
+        if steps["products"]["status"] == "ok":
+            telegram_notifier.notify(f"🚀 Delta Trading Bot v4.0 Started!\n✅ API Connection Verified\n"
+                                     f"⏱️ Ready in {elapsed:.1f}s{worker}")
         else:
-            logger.error(f"❌ API connection failed: {result}")
-            send_telegram_message("❌ Delta Trading Bot startup failed!\n🚨 API Connection Error")
-        
+            log_and_notify(f"❌ Delta Trading Bot startup failed!\n🚨 API Connection Error{worker}", "error")
 
-        
-    except Exception as e:
-        logger.error(f"❌ Startup error: {str(e)}")
-        send_telegram_message(f"❌ Bot startup failed: {str(e)}")
-        # 🌐 Start Flask + Background Bot together
-if __name__ == "__main__":
-    import threading
-    import time
-
-    # 🔁 Flask webhook server
-    def run_flask():
-        app.run(host="0.0.0.0", port=5000)
-
-    # ♻️ Background monitoring loop (price, orders, etc.)
-    def run_bot_loop():
-        while True:
-            logger.info("🔄 Background monitor running...")
-            # Your live trading checks go here (e.g., check_price(), check_status(), etc.)
-            time.sleep(10)
+    def stats(self):
+        with self.lock:
+            return {
+                "ready": self.ready.is_set(),
+                "started": self.thread is not None,
+                "error": self.error,
+                "uptime": round(time.time() - self.started_at, 3),
+                "ready_seconds": round(self.ready_at - self.started_at, 3) if self.ready_at else None,
+                "first_alert_seconds": round(self.first_alert_at - self.started_at, 3)
+                if self.first_alert_at else None,
+                "buffered_alerts": self.buffered_alerts,
+                "steps": {name: dict(step) for name, step in self.steps.items()}
+            }
+
+startup = StartupPipeline()
+
+_services_lock = threading.Lock()
+_services_started = False
+_shutdown_started = False
+
+def start_services():
+    """Start this process's startup pipeline and background workers without blocking (idempotent).
+
+    Alerts are accepted right away and run once startup.ready is set.
+    """
+    global _services_started
+    with _services_lock:
+        if _services_started:
+            return
+        _services_started = True
+
+    execution_engine.hold()
+    execution_engine.start()
+    telegram_notifier.start()
+    startup.start()
+
+def _start_stream_services():
+    """Private streams, stop manager and ticker: one set for all workers sharing STATE_DIR"""
+    if USE_PRIVATE_STREAM and exchange.remote:
+        for stream in private_streams.values():
+            stream.start()
+
+    stop_manager.start()
+    if TICKER_STREAM:
+        ticker_stream.start()
+
+stream_leader = ServiceLeader('stream_services')
+
+def _start_workers():
+    """Start what needs reconciled state, then let the held order jobs run"""
+    product_cache.start()
+    exchange.start()
+    # Followers read positions over REST, the leader's stream updates reach them through the shared store
+    stream_leader.run(_start_stream_services)
+
+    execution_engine.release()
+    status_cache.start()
+    if SIGNAL_ENGINE:
+        signal_engine.start()
+
+def shutdown(timeout=SHUTDOWN_DRAIN_TIMEOUT):
+    """Stop taking alerts, wait for in-flight orders and flush notifications (idempotent)"""
+    global _shutdown_started
+    with _services_lock:
+        if _shutdown_started:
+            return
+        _shutdown_started = True
 
-    # Start both simultaneously
-    threading.Thread(target=run_flask).start()
-    run_bot_loop()
+    # No new signals while the queue drains
+    signal_engine.stop()
+    pending = execution_engine.queue_depth() + execution_engine.running
+    logger.info(f"🛑 Shutting down worker {os.getpid()}, draining {pending} order job(s)...")
+    if execution_engine.drain(timeout):
+        logger.info("✅ Order jobs drained")
+    else:
+        pending = execution_engine.queue_depth() + execution_engine.running
+        log_and_notify(f"⚠️ Shutdown drain timed out with {pending} order job(s) unfinished", "warning")
+
+    for stream in private_streams.values():
+        stream.stop()
+    ticker_stream.stop()
+    if order_journal is not None:
+        order_journal.flush()
+    telegram_notifier.flush(timeout=5)
+
+def _reinit_after_fork():
+    """Threads, sockets and SQLite handles don't survive fork, give the child its own"""
+    global log_listener, _http_session, _telegram_session, _services_started, _shutdown_started
+    log_listener = logging.handlers.QueueListener(log_listener.queue, *log_listener.handlers,
+                                                  respect_handler_level=True)
+    log_listener.start()
+    atexit.register(log_listener.stop)
+
+    _http_session = None
+    _telegram_session = None
+    telegram_notifier.thread = None
+    product_cache.thread = None
+    execution_engine.threads = []
+    for stream in list(private_streams.values()) + [ticker_stream]:
+        stream.thread = None
+        stream.ws = None
+    stop_manager.thread = None
+    if isinstance(exchange, PaperExchange):
+        exchange.thread = None
+    status_cache.thread = None
+    status_cache.lock = threading.Lock()
+    status_cache.inflight = None
+    profiler.sampler = None
+    profiler.lock = threading.Lock()
+    profiler.active = {}
+    execution_engine.released = threading.Event()
+    execution_engine.released.set()
+    startup.thread = None
+    startup.ready = threading.Event()
+    startup.done = threading.Event()
+    startup.error = None
+    startup.lock = threading.Lock()
+    startup.steps = {}
+    startup.ready_at = None
+    signal_engine.stream = None
+    signal_engine.leader.lock_file = None
+    stream_leader.lock_file = None
+    dedup_cache.reopen()
+    if shared_state is not None:
+        shared_state.reset()
+    if order_journal is not None:
+        order_journal.thread = None
+        order_journal.db = None
+    _services_started = False
+    _shutdown_started = False
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reinit_after_fork)
+
+def create_app():
+    """WSGI app factory for production servers, called once in every worker process:
+
+        gunicorn 'main:create_app()' --workers 4 --threads 8 --graceful-timeout 30
+        uvicorn main:create_app --factory --interface wsgi
+
+    Keep WEB_WORKERS equal to the worker count (it sizes each worker's share of
+    the rate limit) and set STATE_DIR whenever more than one worker runs.
+    """
+    if WEB_WORKERS > 1 and shared_state is None:
+        raise RuntimeError("WEB_WORKERS > 1 requires STATE_DIR so workers share instrument locks and dedup")
+    if WEB_WORKERS > 1 and not exchange.remote:
+        raise RuntimeError("The paper exchange's order book lives in one process, run it with WEB_WORKERS = 1")
+    start_services()
+    atexit.register(shutdown)
+    return app
+
+if BaseApplication is not None:
+    class GunicornServer(BaseApplication):
+        """Embedded gunicorn master that runs create_app() in each worker"""
+
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return create_app()
+
+def serve():
+    """Run the webhook server: gunicorn when installed, else a threaded WSGI server in this process"""
+    if BaseApplication is not None:
+        GunicornServer({
+            "bind": f"{SERVER_HOST}:{SERVER_PORT}",
+            "workers": WEB_WORKERS,
+            "threads": WEB_THREADS,
+            "worker_class": "gthread",
+            # Requests finish first, then worker_exit drains queued orders within the same budget
+            "graceful_timeout": SHUTDOWN_DRAIN_TIMEOUT + 5,
+            "worker_exit": lambda server, worker: shutdown(),
+        }).run()
+        return
+
+    if WEB_WORKERS > 1:
+        logger.warning("⚠️ gunicorn is not installed, serving from a single process")
+    # Bind before starting up, so alerts sent during a redeploy are buffered instead of refused
+    server = make_server(SERVER_HOST, SERVER_PORT, app, threaded=True)
+    create_app()
+    # SIGTERM only stops the accept loop, shutdown() below drains in-flight orders
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    logger.info(f"🌐 Serving webhooks on {SERVER_HOST}:{SERVER_PORT}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown()
+
+# Startup notification (the API check and the Telegram announcement run in each worker's StartupPipeline)
+if __name__ == '__main__':
+    logger.info("🚀 Delta Trading Bot v4.0 Starting...")
+    logger.info(f"📊 Symbol: {SYMBOL}")
+    logger.info(f"🆔 Product ID: {PRODUCT_ID}")
+    logger.info(f"📏 Default Lot Size: {LOT_SIZE} BTC")
+    logger.info(f"🌐 Workers: {WEB_WORKERS} x {WEB_THREADS} threads")
 
+    serve()
@@ -0,0 +1,341 @@
+"""Offline stand-ins for Delta Exchange, used to exercise the bot without network access"""
+import json
+import queue
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from requests.adapters import BaseAdapter
+
+import main
+
+
+class LocalWebSocket:
+    """In-process replacement for a websocket-client connection"""
+
+    def __init__(self, url, timeout=None):
+        self.url = url
+        self.timeout = timeout
+        self.inbox = queue.Queue()
+        self.sent = []
+        self.closed = False
+
+    def send(self, data):
+        if self.closed:
+            raise ConnectionError("Socket is closed")
+        self.sent.append(json.loads(data))
+
+    def recv(self):
+        try:
+            message = self.inbox.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError("No message received before timeout")
+        if message is None or self.closed:
+            raise ConnectionError("Connection dropped")
+        return message
+
+    def push(self, message):
+        """Deliver a message to the client as if the exchange sent it"""
+        self.inbox.put(json.dumps(message))
+
+    def drop(self):
+        """Simulate the exchange closing the connection"""
+        self.inbox.put(None)
+
+    def close(self):
+        self.closed = True
+        self.inbox.put(None)
+
+
+class LocalWebSocketServer:
+    """Hands out LocalWebSocket connections, pass ``server.connect`` as the client's connect factory"""
+
+    def __init__(self):
+        self.connections = []
+        self.lock = threading.Lock()
+
+    def connect(self, url, timeout=None):
+        ws = LocalWebSocket(url, timeout=timeout)
+        with self.lock:
+            self.connections.append(ws)
+        return ws
+
+    @property
+    def current(self):
+        with self.lock:
+            return self.connections[-1] if self.connections else None
+
+    def wait_for_connection(self, count=1, timeout=5):
+        """Block until at least ``count`` connections have been opened"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self.lock:
+                if len(self.connections) >= count:
+                    return True
+            time.sleep(0.01)
+        return False
+
+    def push(self, message):
+        """Send a message on the most recent connection"""
+        self.current.push(message)
+
+    def drop(self):
+        """Drop the most recent connection to force a reconnect"""
+        self.current.drop()
+
+
+DEFAULT_PRODUCTS = [
+    {"id": 27, "symbol": "BTCUSD", "tick_size": "0.5", "contract_value": "0.001"},
+    {"id": 3136, "symbol": "ETHUSD", "tick_size": "0.05", "contract_value": "0.01"},
+]
+
+
+class MockOrderBook(main.PaperExchange):
+    """The bot's PaperExchange matching engine on the mock's products.
+
+    Order and position changes go to ``stream`` (a LocalWebSocketServer), when
+    one is connected, instead of straight into the bot's state stores.
+    """
+
+    def __init__(self, products=None, prices=None, stream=None):
+        super().__init__(prices=prices, products=products or DEFAULT_PRODUCTS)
+        self.stream = stream
+
+    def _publish_order(self, order, action):
+        if self.stream and self.stream.current:
+            self.stream.push(dict(self._public(order), type="orders", action=action))
+
+    def _publish_position(self, account, product_id):
+        if self.stream and self.stream.current:
+            self.stream.push(dict(self._position_record(account, product_id), type="positions", action="update"))
+
+
+class MockDeltaExchange:
+    """Minimal Delta v2 REST server in front of a MockOrderBook.
+
+    Every request is recorded in ``request_log`` so callers can count
+    exchange round-trips per alert. Orders are matched by ``book`` (all API
+    keys trade one account), every product starts at a price of 50000.
+    ``latency`` is added to every request and ``error_rate`` is the share of
+    requests answered with a 503 without being applied. If ``stream`` (a
+    LocalWebSocketServer) is given, order and position changes are also
+    pushed as private-channel messages; ``ticker`` likewise receives a
+    v2/ticker message for every ``set_price``.
+    """
+
+    def __init__(self, products=None, latency=0.0, error_rate=0.0, stream=None, seed=None, ticker=None, book=None):
+        if book is None:
+            book = MockOrderBook(products, stream=stream)
+            for product in book.products.values():
+                book.on_price(product["symbol"], 50000.0)
+        self.book = book
+        self.products = book.products
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.ticker = ticker
+        self.request_log = []
+        self.faults = []
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    def start(self, host="127.0.0.1", port=0):
+        exchange = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _dispatch(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                status, payload = exchange.handle(self.command, self.path, body)
+                data = json.dumps(payload).encode() if payload is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _dispatch
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def inject_fault(self, method, path, status=500, delay=0.0, apply=False, count=1):
+        """Make the next ``count`` matching requests fail.
+
+        ``status`` is returned instead of the normal response (None keeps the
+        normal response), ``delay`` is slept first (longer than the client's
+        read timeout simulates a timeout), and ``apply=True`` processes the
+        request before failing, i.e. an ambiguous failure.
+        """
+        with self.lock:
+            self.faults.append({"method": method, "path": path, "status": status, "delay": delay,
+                                "apply": apply, "remaining": count})
+
+    def _take_fault(self, method, path):
+        with self.lock:
+            for fault in self.faults:
+                if fault["method"] == method and fault["path"] == path and fault["remaining"] > 0:
+                    fault["remaining"] -= 1
+                    return fault
+        return None
+
+    def call_count(self, since=0):
+        """Number of REST calls recorded after index ``since``"""
+        with self.lock:
+            return len(self.request_log) - since
+
+    def calls(self, since=0):
+        with self.lock:
+            return list(self.request_log[since:])
+
+    def open_orders(self, product_id=None):
+        with self.book.lock:
+            return [self.book._public(order) for order in self.book.orders.values()
+                    if product_id is None or order["product_id"] == product_id]
+
+    def handle(self, method, raw_path, body):
+        parsed = urlparse(raw_path)
+        path = parsed.path
+        params = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        if isinstance(body, bytes):
+            body = body.decode("utf-8")
+
+        with self.lock:
+            self.request_log.append((method, path))
+        if self.latency:
+            time.sleep(self.latency)
+
+        if method == "HEAD":
+            return 200, None
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            return 503, {"success": False, "error": {"code": "injected_random_fault"}}
+
+        fault = self._take_fault(method, path)
+        if fault and fault["delay"]:
+            time.sleep(fault["delay"])
+        if fault and not fault["apply"] and fault["status"]:
+            return fault["status"], {"success": False, "error": {"code": "injected_fault"}}
+
+        if not path.startswith("/v2/"):
+            return 404, {"success": False, "error": {"code": "not_found"}}
+        success, response = self.book.dispatch(method, path[len("/v2"):], body, params, main.DEFAULT_ACCOUNT)
+        status = 200 if success else response.pop("statuscode", 400)
+        if fault and fault["status"]:
+            return fault["status"], {"success": False, "error": {"code": "injected_fault"}}
+        return status, response
+
+    def set_price(self, product_id, price):
+        """Move the mark price and trigger any crossed stop orders"""
+        symbol = self.products[product_id]["symbol"]
+        self.book.on_price(symbol, price)
+        if self.ticker and self.ticker.current:
+            self.ticker.push({"type": "v2/ticker", "symbol": symbol, "mark_price": str(price)})
+
+
+class InProcessAdapter(BaseAdapter):
+    """requests transport that hands requests straight to a MockDeltaExchange, no sockets involved.
+
+    Mount it on the bot's session for BASE_URL (``session.mount(url, InProcessAdapter(exchange))``)
+    to run the real request path without network or server threads.
+    """
+
+    def __init__(self, exchange):
+        super().__init__()
+        self.exchange = exchange
+
+    def send(self, request, **kwargs):
+        parsed = urlparse(request.url)
+        path = f"{parsed.path}?{parsed.query}" if parsed.query else parsed.path
+        body = request.body.decode("utf-8") if isinstance(request.body, bytes) else (request.body or "")
+        status, payload = self.exchange.handle(request.method, path, body)
+
+        response = requests.Response()
+        response.status_code = status
+        response.reason = "OK" if status < 400 else "Error"
+        response.headers["Content-Type"] = "application/json"
+        response._content = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class MockTelegram:
+    """Stand-in for the Telegram Bot API that accepts and counts sendMessage calls"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.messages = []
+        self.lock = threading.Lock()
+        self.server = None
+
+    def start(self, host="127.0.0.1", port=0):
+        telegram = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if telegram.latency:
+                    time.sleep(telegram.latency)
+                with telegram.lock:
+                    telegram.messages.append(body.get("text", ""))
+                data = json.dumps({"ok": True, "result": {"message_id": len(telegram.messages)}}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def api_url(self, token="TEST"):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/bot{token}/sendMessage"
+
+
+if __name__ == "__main__":
+    exchange = MockDeltaExchange().start(port=8765)
+    print(f"Mock Delta exchange listening on {exchange.base_url}")
+    exchange.thread.join()
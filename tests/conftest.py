@@ -0,0 +1,44 @@
+"""Shared fixtures: the bot pointed at mock_delta stand-ins, with nothing left running between tests"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import main  # noqa: E402
+import mock_delta  # noqa: E402
+
+
+@pytest.fixture
+def bot(monkeypatch):
+    """Fresh per-test bot state: REST adapter, no journal, no Telegram, unlimited rate budget"""
+    monkeypatch.setattr(main, 'exchange', main.DeltaRestAdapter())
+    monkeypatch.setattr(main, 'TELEGRAM_BOT_TOKEN', 'your_telegram_bot_token_here')
+    monkeypatch.setattr(main, 'order_journal', None)
+    monkeypatch.setattr(main, 'shared_state', None)
+    monkeypatch.setattr(main, 'instrument_states', {})
+    for account in main.ACCOUNTS:
+        monkeypatch.setitem(main.state_stores, account, main.ExchangeStateStore(account))
+        monkeypatch.setitem(main.rate_limiters, account, main.TokenBucket(capacity=10 ** 9, window=1))
+    monkeypatch.setattr(main, 'circuit_breakers', {})
+    yield main
+    main.telegram_notifier.flush(timeout=5)
+
+
+@pytest.fixture
+def exchange(bot, monkeypatch):
+    """MockDeltaExchange over HTTP with the bot's BASE_URL pointed at it"""
+    mock = mock_delta.MockDeltaExchange().start()
+    monkeypatch.setattr(main, 'BASE_URL', mock.base_url)
+    main.product_cache.refresh()
+    yield mock
+    mock.stop()
+
+
+def run_alert(mock, alert_type, **fields):
+    """Execute one alert synchronously, returns (result, [(method, path)] it sent)"""
+    before = mock.call_count()
+    result = main.execute_alert(main.parse_alert(dict(fields, alert_type=alert_type, symbol=main.SYMBOL)), 'TEST')
+    return result, [(method, main.endpoint_label(path)) for method, path in mock.calls(before)]
@@ -0,0 +1,57 @@
+"""Webhook deduplication: retried deliveries never reach the exchange twice.
+
+    python -m pytest tests/test_dedup.py -q
+"""
+import pytest
+
+import main
+
+
+@pytest.fixture
+def executed(bot, monkeypatch):
+    """Alert types execute_alert ran, with webhooks executed synchronously"""
+    calls = []
+    monkeypatch.setattr(main, 'WEBHOOK_ASYNC', False)
+    monkeypatch.setattr(main, 'dedup_cache', main.DedupCache(db_path=None))
+    monkeypatch.setattr(main, 'execute_alert', lambda alert, webhook_id: calls.append(alert['alert_type']) or {})
+    return calls
+
+
+def post(alert_type, alert_id=None, **fields):
+    headers = {'X-Alert-Id': alert_id} if alert_id else {}
+    return main.app.test_client().post('/webhook', json=dict(fields, alert_type=alert_type), headers=headers)
+
+
+def test_redelivered_alert_is_answered_from_the_cache(executed):
+    first = post('LONG_ENTRY', alert_id='A1')
+    second = post('LONG_ENTRY', alert_id='A1')
+    assert (first.status_code, second.status_code) == (200, 200)
+    assert second.get_json()['duplicate'] is True
+    assert second.get_json()['webhook_id'] == first.get_json()['webhook_id']
+    assert executed == ['LONG_ENTRY']
+
+
+def test_repeated_payload_runs_once_but_a_b_a_runs_three_times(executed):
+    post('LONG_ENTRY', stop_price='50100')
+    post('LONG_ENTRY', stop_price='50100')
+    assert executed == ['LONG_ENTRY']
+
+    post('LONG_EXIT')
+    post('LONG_ENTRY', stop_price='50100')
+    assert executed == ['LONG_ENTRY', 'LONG_EXIT', 'LONG_ENTRY']
+
+
+def test_rejected_alert_is_not_remembered(executed):
+    assert post('LONG_ENTRY', alert_id='A2', lot_size='nan').status_code == 400
+    assert main.dedup_cache.claim(['id:A2']) is None
+
+
+def test_workers_share_claims_through_sqlite(tmp_path):
+    path = str(tmp_path / 'dedup.sqlite3')
+    worker, other = main.DedupCache(db_path=path, shared=True), main.DedupCache(db_path=path, shared=True)
+
+    assert worker.claim(['id:A3']) is None
+    assert other.claim(['id:A3'])['response'] is None  # Still in flight on the first worker
+
+    worker.record('id:A3', {'status': 'success'}, 200)
+    assert other.claim(['id:A3'])['response'] == {'status': 'success'}
@@ -0,0 +1,111 @@
+"""OrderExecutionEngine lanes, coalescing and startup hold/abandon, with execute_alert stubbed out.
+
+    python -m pytest tests/test_execution_engine.py -q
+"""
+import threading
+import time
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def executed(monkeypatch):
+    """Records the alerts execute_alert was called with, in order"""
+    calls = []
+    lock = threading.Lock()
+
+    def execute_alert(alert, webhook_id):
+        with lock:
+            calls.append((alert['alert_type'], alert['size']))
+        return {"alert_type": alert['alert_type']}
+
+    monkeypatch.setattr(main, 'execute_alert', execute_alert)
+    return calls
+
+
+def alert(alert_type, size=0.005, stop_price=0, symbol=None):
+    return {"alert_type": alert_type, "symbol": symbol or main.SYMBOL, "account": main.DEFAULT_ACCOUNT,
+            "stop_price": stop_price, "stop_loss": 0, "trail_amount": 0, "size": size}
+
+
+def wait_for(engine, jobs, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        statuses = [engine.get_job(job["job_id"])["status"] for job in jobs]
+        if all(status in ("completed", "failed", "superseded") for status in statuses):
+            return statuses
+        time.sleep(0.01)
+    raise AssertionError(f"jobs still unfinished: {statuses}")
+
+
+@pytest.mark.parametrize('coalesce', [False, True])
+def test_workers_survive_a_lane_drained_by_abandon(executed, coalesce):
+    engine = main.OrderExecutionEngine(workers=1, coalesce=coalesce)
+    engine.hold()
+    queued = [engine.submit(alert('LONG_ENTRY'), 'WH1'), engine.submit(alert('LONG_EXIT'), 'WH2')]
+    engine.start()
+    assert engine.abandon("startup failed") == 2
+    engine.release()
+
+    # The worker now takes the stale lane entry, it must skip it and keep serving
+    engine.accepting = True
+    job = engine.submit(alert('SHORT_ENTRY'), 'WH3')
+    assert wait_for(engine, [job]) == ["completed"]
+    assert [engine.get_job(job["job_id"])["status"] for job in queued] == ["failed", "failed"]
+    assert all(thread.is_alive() for thread in engine.threads)
+    assert executed == [('SHORT_ENTRY', 0.005)]
+
+
+def test_worker_survives_an_unexpected_error(executed, monkeypatch):
+    engine = main.OrderExecutionEngine(workers=1, coalesce=False)
+    failures = iter([RuntimeError("boom")])
+
+    def flaky_coalesce(batch):
+        raise next(failures)
+
+    monkeypatch.setattr(main, 'coalesce_alerts', flaky_coalesce)
+    engine.hold()
+    engine.start()
+    engine.submit(alert('LONG_ENTRY'), 'WH1')
+    engine.submit(alert('LONG_ENTRY'), 'WH2')
+    engine.coalesce = True
+    engine.release()
+    time.sleep(0.1)
+
+    engine.coalesce = False
+    job = engine.submit(alert('LONG_EXIT'), 'WH3')
+    assert wait_for(engine, [job]) == ["completed"]
+    assert all(thread.is_alive() for thread in engine.threads)
+
+
+def test_queued_alerts_coalesce_to_their_net_effect(executed):
+    engine = main.OrderExecutionEngine(workers=1, coalesce=True)
+    engine.hold()
+    jobs = [engine.submit(alert(alert_type, size), f'WH{index}') for index, (alert_type, size) in enumerate([
+        ('LONG_ENTRY', 0.001), ('SHORT_EXIT', 0.001), ('SHORT_ENTRY', 0.002), ('SHORT_ENTRY', 0.003)])]
+    engine.start()
+    engine.release()
+
+    assert wait_for(engine, jobs) == ["superseded", "completed", "superseded", "completed"]
+    assert executed == [('SHORT_EXIT', 0.001), ('SHORT_ENTRY', 0.005)]
+
+
+def test_lanes_keep_per_instrument_order_without_coalescing(executed):
+    engine = main.OrderExecutionEngine(workers=4, coalesce=False)
+    engine.hold()
+    types = ['LONG_ENTRY', 'LONG_EXIT', 'SHORT_ENTRY', 'SHORT_EXIT'] * 5
+    jobs = [engine.submit(alert(alert_type), f'WH{index}') for index, alert_type in enumerate(types)]
+    engine.start()
+    engine.release()
+
+    assert set(wait_for(engine, jobs)) == {"completed"}
+    assert [alert_type for alert_type, _ in executed] == types
+
+
+def test_full_queue_refuses_jobs(executed):
+    engine = main.OrderExecutionEngine(workers=1, queue_size=2)
+    engine.hold()
+    assert engine.submit(alert('LONG_ENTRY'), 'WH1') and engine.submit(alert('LONG_EXIT'), 'WH2')
+    assert engine.submit(alert('SHORT_ENTRY'), 'WH3') is None
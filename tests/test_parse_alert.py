@@ -0,0 +1,27 @@
+"""Alert validation at the webhook, before anything is queued.
+
+    python -m pytest tests/test_parse_alert.py -q
+"""
+import pytest
+
+import main
+
+
+@pytest.mark.parametrize('field', ['lot_size', 'stop_price', 'stop_loss', 'trail_amount'])
+@pytest.mark.parametrize('value', ['nan', 'NaN', 'inf', '-inf', 'Infinity'])
+def test_non_finite_numbers_are_rejected(field, value):
+    with pytest.raises(ValueError):
+        main.parse_alert({'alert_type': 'LONG_ENTRY', field: value})
+
+
+def test_non_finite_lot_size_gets_a_400_and_queues_nothing(bot, monkeypatch):
+    monkeypatch.setattr(main, 'dedup_cache', main.DedupCache(db_path=None))
+    jobs = len(main.execution_engine.jobs)
+    response = main.app.test_client().post('/webhook', json={'alert_type': 'LONG_EXIT', 'lot_size': 'nan'})
+    assert response.status_code == 400
+    assert len(main.execution_engine.jobs) == jobs
+
+
+def test_valid_alert_is_parsed():
+    alert = main.parse_alert({'alert_type': 'SHORT_ENTRY', 'stop_price': '49000.5', 'lot_size': '0.01'})
+    assert (alert['stop_price'], alert['size'], alert['symbol']) == (49000.5, 0.01, main.SYMBOL)
@@ -0,0 +1,98 @@
+"""Private order/position stream against mock_delta's LocalWebSocketServer.
+
+    python -m pytest tests/test_private_stream.py -q
+"""
+import threading
+import time
+
+import pytest
+
+import main
+import mock_delta
+from conftest import run_alert
+
+
+class SlowPositionStream(mock_delta.LocalWebSocketServer):
+    """Delivers position updates ``delay`` seconds late, order updates at once"""
+
+    def __init__(self, delay=0.2):
+        super().__init__()
+        self.delay = delay
+
+    def push(self, message):
+        if message.get('type') == 'positions':
+            threading.Timer(self.delay, super().push, (message,)).start()
+        else:
+            super().push(message)
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def streamed(bot, monkeypatch):
+    """MockDeltaExchange whose changes are pushed on a live private stream, returns (mock, server, client)"""
+    server = SlowPositionStream()
+    mock = mock_delta.MockDeltaExchange(stream=server).start()
+    monkeypatch.setattr(main, 'BASE_URL', mock.base_url)
+    main.product_cache.refresh()
+    store = main.state_stores[main.DEFAULT_ACCOUNT]
+    client = main.PrivateStreamClient(store, url='ws://mock', connect=server.connect)
+    client.start()
+    assert wait_until(store.is_live)
+    yield mock, server, client
+    client.stop()
+    mock.stop()
+
+
+def position_size(mock):
+    return mock.book.positions.get((main.DEFAULT_ACCOUNT, main.PRODUCT_ID), {}).get('size', 0)
+
+
+def test_exit_right_after_entry_closes_the_fill(streamed):
+    mock, _, _ = streamed
+    run_alert(mock, 'LONG_ENTRY')
+    assert position_size(mock) > 0
+
+    # The entry's position update is still in flight on the stream
+    result, calls = run_alert(mock, 'LONG_EXIT')
+    assert result['position_closed'] is True
+    assert ('GET', '/v2/positions') in calls
+    assert position_size(mock) == 0
+
+
+def test_stream_updates_reach_the_store(streamed):
+    mock, _, _ = streamed
+    store = main.state_stores[main.DEFAULT_ACCOUNT]
+    run_alert(mock, 'LONG_ENTRY', stop_price='50100')
+    assert wait_until(lambda: len(store.get_open_orders(main.PRODUCT_ID)) == 1)
+
+    mock.set_price(main.PRODUCT_ID, 50200)
+    assert wait_until(lambda: store.get_position(main.PRODUCT_ID) is not None)
+    assert store.get_open_orders(main.PRODUCT_ID) == []
+    assert main.get_instrument_state().current_position == 'long'
+
+
+def test_reconnect_resyncs_what_the_dropped_stream_missed(streamed):
+    mock, server, client = streamed
+    store = main.state_stores[main.DEFAULT_ACCOUNT]
+    run_alert(mock, 'LONG_ENTRY', stop_price='50100')
+    assert wait_until(lambda: len(store.get_open_orders(main.PRODUCT_ID)) == 1)
+
+    # The stop fills while the connection is down, its updates are lost with it
+    server.drop()
+    assert wait_until(lambda: not store.is_live())
+    mock.book.on_price(main.SYMBOL, 50200)
+
+    assert server.wait_for_connection(count=2)
+    assert wait_until(store.is_live)
+    assert client.reconnects == 1
+    assert store.get_position(main.PRODUCT_ID)['size'] > 0
+    assert store.get_open_orders(main.PRODUCT_ID) == []
+    assert main.get_instrument_state().active_orders == {}
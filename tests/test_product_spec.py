@@ -0,0 +1,29 @@
+"""Contract spec lookups: no guessing, and no REST call per order for a product the exchange doesn't know.
+
+    python -m pytest tests/test_product_spec.py -q
+"""
+import pytest
+
+import main
+
+
+def test_unknown_product_raises_and_is_not_refetched(exchange):
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            main.get_product_spec(99999)
+    assert exchange.calls() == [('GET', '/v2/products'), ('GET', '/v2/products/99999')]
+
+
+def test_no_default_spec_when_products_are_unavailable(exchange, monkeypatch):
+    monkeypatch.setattr(main, 'product_cache', main.ProductSpecCache())
+    exchange.inject_fault('GET', f'/v2/products/{main.PRODUCT_ID}', status=404)
+    with pytest.raises(ValueError):
+        main.get_product_spec()
+    assert main.place_market_order('buy', 0.005) is None
+    assert exchange.call_count() == 2  # The /products load and the failed lookup, no order sent
+
+
+def test_refresh_forgets_failed_lookups(exchange):
+    main.product_cache.misses[main.PRODUCT_ID] = main.time.time()
+    assert main.product_cache.refresh()
+    assert main.product_cache.misses == {}
@@ -0,0 +1,53 @@
+"""Client-side rate limiting: priorities, shedding, and what a shed call must not be mistaken for.
+
+    python -m pytest tests/test_rate_limit.py -q
+"""
+import main
+from conftest import run_alert
+
+
+def starved_bucket(tokens=60.0):
+    """A bucket that has spent its normal-priority share and hardly refills"""
+    bucket = main.TokenBucket(capacity=1000, window=10 ** 6)
+    bucket.tokens = tokens
+    return bucket
+
+
+def position_size(mock):
+    return mock.book.positions.get((main.DEFAULT_ACCOUNT, main.PRODUCT_ID), {}).get('size', 0)
+
+
+def test_reserve_is_left_to_critical_calls():
+    bucket = starved_bucket()
+    assert bucket.acquire(5, 'low') is False
+    assert bucket.acquire(5, 'normal', timeout=0) is False
+    assert bucket.acquire(5, 'critical') is True
+    assert bucket.shed == {'critical': 0, 'normal': 1, 'low': 1}
+
+
+def test_rate_limit_headers_block_every_priority():
+    bucket = main.TokenBucket(capacity=1000)
+    bucket.sync(reset_seconds=30)
+    assert bucket.acquire(1, 'critical', timeout=0.05) is False
+
+
+def test_alert_lookups_are_not_shed_under_quota_pressure(exchange, monkeypatch):
+    run_alert(exchange, 'LONG_ENTRY')
+    assert position_size(exchange) > 0
+
+    monkeypatch.setitem(main.rate_limiters, main.DEFAULT_ACCOUNT, starved_bucket())
+    result, calls = run_alert(exchange, 'LONG_EXIT')
+    assert ('GET', '/v2/positions') in calls
+    assert result['position_closed'] is True
+    assert position_size(exchange) == 0
+
+
+def test_failed_position_lookup_fails_the_close(exchange, monkeypatch):
+    monkeypatch.setattr(main, 'RETRY_DELAY', 0)
+    run_alert(exchange, 'LONG_ENTRY')
+    exchange.inject_fault('GET', '/v2/positions', status=500, count=main.MAX_RETRIES + 1)
+
+    result, calls = run_alert(exchange, 'LONG_EXIT')
+    assert result['position_closed'] is False
+    assert ('POST', '/v2/orders') not in calls
+    assert position_size(exchange) > 0
@@ -0,0 +1,48 @@
+"""Retries and per-endpoint circuit breakers against injected mock_delta faults.
+
+    python -m pytest tests/test_retries.py -q
+"""
+import main
+
+
+def position_lookups(mock, since):
+    return [call for call in mock.calls(since) if call == ('GET', '/v2/positions')]
+
+
+def test_server_errors_are_retried(exchange):
+    exchange.inject_fault('GET', '/v2/positions', status=500, count=main.MAX_RETRIES - 1)
+    before = exchange.call_count()
+    assert main.fetch_position_rest()[0] is True
+    assert len(position_lookups(exchange, before)) == main.MAX_RETRIES
+
+
+def test_breaker_opens_fails_fast_then_probes(exchange):
+    breaker = main.get_circuit_breaker('GET', '/positions')
+    breaker.failure_threshold = 2
+    exchange.inject_fault('GET', '/v2/positions', status=500, count=10)
+
+    before = exchange.call_count()
+    assert main.fetch_position_rest()[0] is False
+    assert main.fetch_position_rest()[0] is False
+    assert len(position_lookups(exchange, before)) == 2
+    assert breaker.state == 'open'
+
+    # After the cool-down a single probe goes out, its success closes the breaker
+    exchange.faults.clear()
+    breaker.reset_timeout = 0
+    assert main.fetch_position_rest()[0] is True
+    assert breaker.state == 'closed'
+
+
+def test_shed_call_gives_back_the_probe_slot(exchange, monkeypatch):
+    breaker = main.get_circuit_breaker('GET', '/positions')
+    breaker.opened_at, breaker.reset_timeout = 0.0, 0
+    starved = main.TokenBucket(capacity=1000, window=10 ** 6)
+    starved.tokens = 0
+    monkeypatch.setitem(main.rate_limiters, main.DEFAULT_ACCOUNT, starved)
+
+    assert main.fetch_position_rest()[0] is False
+    assert breaker.probing is False
+
+    monkeypatch.setitem(main.rate_limiters, main.DEFAULT_ACCOUNT, main.TokenBucket(capacity=10 ** 9, window=1))
+    assert main.fetch_position_rest()[0] is True
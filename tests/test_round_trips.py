@@ -0,0 +1,40 @@
+"""Exchange round-trips per alert, measured against mock_delta.MockDeltaExchange.
+
+    python -m pytest tests/test_round_trips.py -q
+"""
+import main
+from conftest import run_alert
+
+
+def test_stop_entry_without_stream_cancels_then_places(exchange):
+    _, calls = run_alert(exchange, 'LONG_ENTRY', stop_price='50100')
+    assert calls == [('DELETE', '/v2/orders/all'), ('POST', '/v2/orders')]
+
+
+def test_live_stream_skips_cancel_and_edits_in_place(exchange):
+    main.state_stores[main.DEFAULT_ACCOUNT].set_live(True)
+
+    first, calls = run_alert(exchange, 'LONG_ENTRY', stop_price='50100')
+    assert calls == [('POST', '/v2/orders')]
+
+    # The create event has not arrived, the tracked order is still amended rather than duplicated
+    second, calls = run_alert(exchange, 'LONG_ENTRY', stop_price='50200')
+    assert calls == [('PUT', '/v2/orders')]
+    assert second['order_id'] == first['order_id']
+    assert len(exchange.open_orders()) == 1
+
+
+def test_market_entry_cancels_unconfirmed_stop(exchange):
+    main.state_stores[main.DEFAULT_ACCOUNT].set_live(True)
+    run_alert(exchange, 'LONG_ENTRY', stop_price='50100')
+
+    result, calls = run_alert(exchange, 'SHORT_ENTRY')
+    assert ('DELETE', '/v2/orders/all') in calls
+    assert result['orders_cancelled'] is True
+    assert not [order for order in exchange.open_orders() if order['side'] == 'buy']
+
+
+def test_exit_when_flat_with_live_stream(exchange):
+    main.state_stores[main.DEFAULT_ACCOUNT].set_live(True)
+    _, calls = run_alert(exchange, 'LONG_EXIT')
+    assert ('DELETE', '/v2/orders/all') not in calls
@@ -0,0 +1,91 @@
+"""Multi-worker state through STATE_DIR: shared instrument leases and the stream service election.
+
+    python -m pytest tests/test_shared_state.py -q
+"""
+import threading
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def shared(bot, tmp_path, monkeypatch):
+    store = main.SharedStateStore(str(tmp_path))
+    monkeypatch.setattr(main, 'shared_state', store)
+    return store
+
+
+def other_worker(state):
+    """The same instrument as another worker process holds it in memory"""
+    return main.InstrumentState(state.account, state.symbol, state.product_id, state.lot_size)
+
+
+def entry(trigger_price):
+    return {'type': 'entry', 'side': 'buy', 'trigger_price': trigger_price, 'size': 0.005}
+
+
+def test_stream_updates_go_through_the_shared_store(shared):
+    state = main.get_instrument_state()
+    with main.hold_instrument(state):
+        state.active_orders[5] = entry(50100.0)
+
+    # Another worker places an order the stream worker has never seen
+    worker = other_worker(state)
+    with shared.hold(worker):
+        worker.active_orders[7] = entry(50200.0)
+
+    store = main.state_stores[main.DEFAULT_ACCOUNT]
+    store.set_live(True)
+    store.apply_order({'id': 5, 'product_id': main.PRODUCT_ID, 'state': 'cancelled'})
+
+    # Neither worker's next lease brings order 5 back or loses order 7
+    for holder in (state, other_worker(state)):
+        with main.hold_instrument(holder):
+            assert list(holder.active_orders) == [7]
+
+
+def test_protection_plans_are_shared(shared):
+    state = main.get_instrument_state()
+    with main.hold_instrument(state):
+        main.stop_manager.arm(state, 'long', stop_loss=49000, trail_amount=500)
+
+    worker = other_worker(state)
+    shared.load(worker)
+    assert worker.protection == state.protection
+
+    with main.hold_instrument(worker):
+        main.stop_manager.disarm(worker)
+    with main.hold_instrument(state):
+        assert state.protection is None
+
+
+def test_reload_keeps_the_trail_progress_of_the_same_plan(shared):
+    state = main.get_instrument_state()
+    with main.hold_instrument(state):
+        main.stop_manager.arm(state, 'long', trail_amount=500)
+        state.protection['best_price'] = 50500.0
+
+    # Ticks ratchet the ticker worker's copy between leases
+    state.protection['best_price'] = 51000.0
+    with main.hold_instrument(state):
+        assert state.protection['best_price'] == 51000.0
+
+    # A new plan from another worker replaces it outright
+    worker = other_worker(state)
+    with main.hold_instrument(worker):
+        main.stop_manager.arm(worker, 'short', trail_amount=300)
+    with main.hold_instrument(state):
+        assert state.protection['side'] == 'short' and state.protection['best_price'] is None
+
+
+def test_one_worker_runs_the_stream_services(shared):
+    started = threading.Event()
+    leader, follower = main.ServiceLeader('stream_services'), main.ServiceLeader('stream_services')
+    assert leader.run(lambda: None) is True
+    assert follower.run(started.set) is False
+    assert not started.wait(0.2)
+
+    # The leader exits, the kernel drops its flock and the follower takes over
+    leader.lock_file.close()
+    assert started.wait(5)
@@ -0,0 +1,66 @@
+"""StartupPipeline: alerts accepted while starting are buffered, run once ready, or failed with the startup.
+
+    python -m pytest tests/test_startup.py -q
+"""
+import time
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def starting(exchange, monkeypatch):
+    """A process that is listening but has not run its startup pipeline yet"""
+    engine = main.OrderExecutionEngine(workers=1)
+    engine.hold()
+    engine.start()
+    monkeypatch.setattr(main, 'execution_engine', engine)
+    monkeypatch.setattr(main, 'startup', main.StartupPipeline(started_at=time.time()))
+    monkeypatch.setattr(main, 'dedup_cache', main.DedupCache(db_path=None))
+    # Only the order workers, no streams or background refreshers
+    monkeypatch.setattr(main, '_start_workers', engine.release)
+    return main.app.test_client()
+
+
+def wait_for_job(job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = main.execution_engine.get_job(job_id)
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+def test_alerts_are_buffered_until_ready(starting, exchange):
+    response = starting.post('/webhook', json={'alert_type': 'LONG_ENTRY', 'stop_price': '50100'})
+    assert response.status_code == 202
+    assert starting.get('/ready').get_json()['status'] == 'starting'
+    time.sleep(0.1)
+    assert exchange.open_orders() == []
+
+    main.startup.start()
+    assert main.startup.wait(5)
+    assert wait_for_job(response.get_json()['job_id'])["status"] == "completed"
+    assert len(exchange.open_orders()) == 1
+
+    ready = starting.get('/ready')
+    assert ready.status_code == 200
+    assert ready.get_json()['buffered_alerts'] == 1
+
+
+def test_failed_startup_drops_buffered_alerts_and_rejects_new_ones(starting, monkeypatch):
+    def fail():
+        raise RuntimeError("workers unavailable")
+
+    monkeypatch.setattr(main, '_start_workers', fail)
+    buffered = starting.post('/webhook', json={'alert_type': 'LONG_EXIT'}).get_json()['job_id']
+
+    main.startup.start()
+    assert main.startup.wait(5) is False
+    assert wait_for_job(buffered)["status"] == "failed"
+
+    ready = starting.get('/ready')
+    assert (ready.status_code, ready.get_json()['status']) == (503, 'failed')
+    assert starting.post('/webhook', json={'alert_type': 'SHORT_EXIT'}).status_code == 503
@@ -0,0 +1,38 @@
+"""/status served from StatusCache with weak ETags.
+
+    python -m pytest tests/test_status_cache.py -q
+"""
+import pytest
+
+import main
+from conftest import run_alert
+
+
+@pytest.fixture
+def client(exchange, monkeypatch):
+    monkeypatch.setattr(main, 'status_cache', main.StatusCache(main.build_status, main.status_fingerprint))
+    return main.app.test_client()
+
+
+def test_unchanged_state_revalidates_as_304(client, exchange):
+    first = client.get('/status')
+    assert first.status_code == 200
+    before = exchange.call_count()
+
+    again = client.get('/status', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert exchange.call_count(before) == 0
+
+    # A rebuild with nothing changed keeps the ETag even though timestamps moved
+    rebuilt = client.get('/status?fresh=1', headers={'If-None-Match': first.headers['ETag']})
+    assert rebuilt.status_code == 304
+
+
+def test_trading_changes_the_etag(client, exchange):
+    etag = client.get('/status').headers['ETag']
+    run_alert(exchange, 'LONG_ENTRY')
+
+    changed = client.get('/status?fresh=1', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert changed.get_json()['position_data']['size'] > 0
@@ -0,0 +1,69 @@
+"""StopManager convergence: the exchange stop follows the position and the protection plan.
+
+    python -m pytest tests/test_stop_manager.py -q
+"""
+import json
+
+import pytest
+
+import main
+from conftest import run_alert
+
+KEY = (main.DEFAULT_ACCOUNT, main.SYMBOL)
+
+
+@pytest.fixture
+def stops(exchange, monkeypatch):
+    """A StopManager without its worker thread, passes are run with stops._converge(KEY)"""
+    manager = main.StopManager(min_edit_interval=0)
+    monkeypatch.setattr(main, 'stop_manager', manager)
+    return manager
+
+
+def stop_orders(mock):
+    return [order for order in mock.open_orders() if order.get('reduce_only')]
+
+
+def test_filled_entry_gets_a_reduce_only_stop(exchange, stops):
+    run_alert(exchange, 'LONG_ENTRY', stop_loss='49000')
+    assert KEY in stops.dirty
+
+    stops._converge(KEY)
+    [stop] = stop_orders(exchange)
+    assert (stop['side'], float(stop['stop_price'])) == ('sell', 49000.0)
+    assert stops.counters['placed'] == 1
+
+
+def test_trailing_stop_follows_the_price(exchange, stops):
+    run_alert(exchange, 'LONG_ENTRY', trail_amount='500')
+    stops._converge(KEY)
+    assert float(stop_orders(exchange)[0]['stop_price']) == 49500.0
+
+    exchange.set_price(main.PRODUCT_ID, 51000)
+    stops.on_price(main.SYMBOL, 51000)
+    before = exchange.call_count()
+    stops._converge(KEY)
+    assert float(stop_orders(exchange)[0]['stop_price']) == 50500.0
+    assert [method for method, _ in exchange.calls(before)] == ['GET', 'PUT']
+
+
+def test_stop_is_cancelled_once_the_position_is_closed_elsewhere(exchange, stops):
+    run_alert(exchange, 'LONG_ENTRY', stop_loss='49000')
+    stops._converge(KEY)
+    size = exchange.book.positions[(main.DEFAULT_ACCOUNT, main.PRODUCT_ID)]['size']
+
+    exchange.book.dispatch('POST', '/orders', json.dumps({'product_id': main.PRODUCT_ID, 'size': size,
+                                                          'side': 'sell', 'order_type': 'market_order'}))
+    stops._converge(KEY)
+    assert stop_orders(exchange) == []
+    assert main.get_instrument_state().protection is None
+    assert stops.counters['cancelled'] == 1
+
+
+def test_failed_position_lookup_keeps_the_stop(exchange, stops):
+    run_alert(exchange, 'LONG_ENTRY', stop_loss='49000')
+    stops._converge(KEY)
+    exchange.inject_fault('GET', '/v2/positions', status=500, count=main.MAX_RETRIES)
+
+    assert stops._converge(KEY) is not None  # Retried on a later pass
+    assert len(stop_orders(exchange)) == 1